@@ -0,0 +1,200 @@
+# bdfindex.py
+# Kevin Matocha - Copyright (C) 2020
+# Written for CircuitPython
+#
+# Indexed BDF font reader.
+#
+# BDF fonts are text files, and loading a glyph normally means scanning the file line by line until the
+# glyph is found.  An indexedBdfFont builds a seek table once for each BDF file: the byte offset of each
+# STARTCHAR, sorted by codepoint, plus the font-wide properties.  Loading a glyph is then a binary search
+# in the table, one seek and a short read of that glyph's lines.
+#
+# The table is saved next to the font as a small binary sidecar (Hack-Bold-16.bdf -> Hack-Bold-16.bdf.idx)
+# and rebuilt if the size or modification time of the BDF file changes.  If the filesystem is read-only
+# the table is only kept in memory.
+#
+# Sidecar format (little endian):
+#   header: 'BDFI', version (B), BDF size (I), BDF mtime (I), glyph count (I),
+#           FONTBOUNDINGBOX width, height, x offset, y offset (4 h), FONT_ASCENT (h), FONT_DESCENT (h)
+#   codepoints: glyph count x I, sorted
+#   offsets: glyph count x I, byte offset of the STARTCHAR line for each codepoint
+#
+# The font matches the interface of adafruit_bitmap_font: get_glyph, load_glyphs, get_bounding_box.
+
+import os
+import struct
+from array import array
+
+try:
+    from fontio import Glyph
+except ImportError: # not running on CircuitPython
+    from collections import namedtuple
+    Glyph = namedtuple('Glyph', ['bitmap', 'tile_index', 'width', 'height', 'dx', 'dy', 'shift_x', 'shift_y'])
+
+indexSuffix = '.idx'
+indexMagic = b'BDFI'
+indexVersion = 1
+headerFormat = '<4sBIIIhhhhhh'
+
+
+def sourceStat(fileName): # (size, mtime) of the BDF file
+    fileStat = os.stat(fileName)
+    return (fileStat[6], int(fileStat[8]) & 0xFFFFFFFF)
+
+
+def buildIndex(fileName):
+    # Scans the BDF file once.  Returns (properties, codepoints, offsets), properties is
+    # [boundingBox width, height, x offset, y offset, ascent, descent].
+    properties = [0, 0, 0, 0, 0, 0]
+    entries = []
+    offset = 0
+    startOffset = None
+    with open(fileName, 'rb') as bdfFile:
+        for line in bdfFile:
+            if line.startswith(b'STARTCHAR'):
+                startOffset = offset
+            elif line.startswith(b'ENCODING') and startOffset is not None:
+                codePoint = int(line.split()[1])
+                if codePoint >= 0:
+                    entries.append((codePoint, startOffset))
+                startOffset = None
+            elif line.startswith(b'FONTBOUNDINGBOX'):
+                properties[0:4] = [int(value) for value in line.split()[1:5]]
+            elif line.startswith(b'FONT_ASCENT'):
+                properties[4] = int(line.split()[1])
+            elif line.startswith(b'FONT_DESCENT'):
+                properties[5] = int(line.split()[1])
+            offset += len(line)
+    entries.sort()
+    codePoints = array('I', [entry[0] for entry in entries])
+    offsets = array('I', [entry[1] for entry in entries])
+    return (properties, codePoints, offsets)
+
+
+def saveIndex(fileName, properties, codePoints, offsets):
+    (size, mtime) = sourceStat(fileName)
+    try:
+        with open(fileName + indexSuffix, 'wb') as indexFile:
+            indexFile.write(struct.pack(headerFormat, indexMagic, indexVersion, size, mtime, len(codePoints), *properties))
+            indexFile.write(bytes(codePoints))
+            indexFile.write(bytes(offsets))
+    except OSError: # read-only filesystem
+        return False
+    return True
+
+
+def loadIndex(fileName):
+    # Returns (properties, codepoints, offsets) from the sidecar, or None if it is missing or out of date.
+    try:
+        with open(fileName + indexSuffix, 'rb') as indexFile:
+            header = indexFile.read(struct.calcsize(headerFormat))
+            if len(header) != struct.calcsize(headerFormat):
+                return None
+            values = struct.unpack(headerFormat, header)
+            (magic, version, size, mtime, count) = values[0:5]
+            if magic != indexMagic or version != indexVersion or (size, mtime) != sourceStat(fileName):
+                return None
+            codePoints = array('I', indexFile.read(4 * count))
+            offsets = array('I', indexFile.read(4 * count))
+    except (OSError, ValueError):
+        return None
+    if len(codePoints) != count or len(offsets) != count:
+        return None
+    return (list(values[5:11]), codePoints, offsets)
+
+
+class indexedBdfFont:
+    def __init__(self, fileName, bitmapClass):
+        # bitmapClass: class used for the glyph bitmaps, such as displayio.Bitmap
+        self.fileName = fileName
+        self._bitmapClass = bitmapClass
+        self._glyphs = {} # loaded glyphs, codepoint -> glyph (None if the font does not have it)
+        index = loadIndex(fileName)
+        if index is None:
+            index = buildIndex(fileName)
+            saveIndex(fileName, *index)
+        (properties, self._codePoints, self._offsets) = index
+        self._boundingBox = tuple(properties[0:4])
+        self.ascent = properties[4]
+        self.descent = properties[5]
+        self._file = None
+
+    def get_bounding_box(self):
+        return self._boundingBox
+
+    def _findOffset(self, codePoint): # binary search in the seek table, None if not found
+        codePoints = self._codePoints
+        low = 0
+        high = len(codePoints)
+        while low < high:
+            middle = (low + high) // 2
+            if codePoints[middle] < codePoint:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(codePoints) and codePoints[low] == codePoint:
+            return self._offsets[low]
+        return None
+
+    def _readGlyph(self, offset):
+        # Reads the glyph starting at the STARTCHAR line at this offset.
+        if self._file is None:
+            self._file = open(self.fileName, 'rb')
+        bdfFile = self._file
+        bdfFile.seek(offset)
+        shiftX = shiftY = 0
+        width = height = dx = dy = 0
+        bitmap = None
+        y = 0
+        while True:
+            line = bdfFile.readline()
+            if not line or line.startswith(b'ENDCHAR'):
+                break
+            if bitmap is not None: # a row of the glyph bitmap
+                if y < height:
+                    row = line.strip()
+                    bits = int(row, 16)
+                    bitCount = 4 * len(row)
+                    start = y * width
+                    for x in range(width):
+                        bitmap[start + x] = (bits >> (bitCount - 1 - x)) & 1
+                    y += 1
+            elif line.startswith(b'DWIDTH'):
+                (shiftX, shiftY) = [int(value) for value in line.split()[1:3]]
+            elif line.startswith(b'BBX'):
+                (width, height, dx, dy) = [int(value) for value in line.split()[1:5]]
+            elif line.startswith(b'BITMAP'):
+                bitmap = self._bitmapClass(width, height, 2)
+        return Glyph(bitmap, 0, width, height, dx, dy, shiftX, shiftY)
+
+    def get_glyph(self, codePoint):
+        if codePoint in self._glyphs:
+            return self._glyphs[codePoint]
+        offset = self._findOffset(codePoint)
+        if offset is None:
+            glyph = None
+        else:
+            glyph = self._readGlyph(offset)
+        self._glyphs[codePoint] = glyph
+        return glyph
+
+    def load_glyphs(self, codePoints):
+        if isinstance(codePoints, int):
+            codePoints = (codePoints,)
+        for codePoint in codePoints:
+            if isinstance(codePoint, str):
+                codePoint = ord(codePoint)
+            self.get_glyph(codePoint)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def loadIndexedFont(fileName, bitmapClass=None):
+    # Same role as adafruit_bitmap_font.bitmap_font.load_font, for BDF files.
+    if bitmapClass is None:
+        import displayio
+        bitmapClass = displayio.Bitmap
+    return indexedBdfFont(fileName, bitmapClass)
@@ -0,0 +1,48 @@
+# bench_bdfindex.py
+# Host-side benchmark for the indexed BDF reader (bdfindex.py).
+#
+# For each font, measures the time to load one missing glyph near the end of the file by scanning the
+# BDF file (like adafruit_bitmap_font) and with the seek table, plus the one-time cost of building the
+# index and of reading it back from the sidecar file.
+#
+# Usage: python benchmarks/bench_bdfindex.py
+
+import os
+import time
+
+from hostfakes import PixelBitmap, loadBdfFont, repoDirectory
+
+import bdfindex
+
+fontFiles = ['fonts/TerminusTTF-16.bdf', 'fonts/BitstreamVeraSans-Roman-16.bdf',
+             'fonts/BebasNeue-Bold-62.bdf', 'fonts/Hack-Bold-16.bdf']
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return (time.perf_counter() - start, result)
+
+
+def main():
+    for fontFile in fontFiles:
+        fileName = os.path.join(repoDirectory, fontFile)
+        if os.path.exists(fileName + bdfindex.indexSuffix):
+            os.remove(fileName + bdfindex.indexSuffix)
+        (buildTime, font) = timed(bdfindex.loadIndexedFont, fileName, PixelBitmap) # builds and saves the index
+        (reopenTime, font) = timed(bdfindex.loadIndexedFont, fileName, PixelBitmap) # reads the sidecar
+        lastCodePoint = font._codePoints[len(font._codePoints) - 1]
+
+        (indexedTime, glyph) = timed(font.get_glyph, lastCodePoint)
+        scanFont = loadBdfFont(fileName)
+        (scanTime, scanGlyph) = timed(scanFont.get_glyph, lastCodePoint)
+        font.close()
+
+        print('{}: {} glyphs, index build {:.1f} ms, sidecar load {:.2f} ms'.format(
+            os.path.basename(fontFile), len(font._codePoints), buildTime * 1000, reopenTime * 1000))
+        print('    load glyph {}: scan {:.2f} ms, seek table {:.3f} ms  ({:.0f}x)'.format(
+            lastCodePoint, scanTime * 1000, indexedTime * 1000, scanTime / indexedTime))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+# bench_canvas.py
+# Host-side benchmark for the run-length encoded canvas (rlecanvas.py).
+#
+# Renders the pages of a generated document into rleCanvases and into a plain bitmap, and checks that
+# each canvas shows the same pixels.  Reports the RAM taken by the encoded pages on CircuitPython (with
+# the object headers and heap blocks, see rleCanvas.ramBytes) against the 19200 bytes of a 320x240
+# displayio.Bitmap with 3 colors (2 bits per pixel), also for the pages of README.md, and what one
+# object per row would take.  Reports the time to render a page into a canvas and to show it.  The pages
+# are also rendered into a canvas through a renderer with a pageCache, once storing them and once
+# loading them from the cache, and shown.  A tall canvas with the first part of the document is shown
+# at several scroll positions and compared with a tall bitmap.
+#
+# CPython's bytes.join takes any buffer, bytes.join of CircuitPython only takes bytes.  The rows of a
+# canvas are joined from memoryview slices of the encoded rows and bytearrays of the open rows, so a
+# canvas is also closed and read across rows with the pieces checked by a join that works like the one of
+# CircuitPython.
+#
+# Usage: python benchmarks/bench_canvas.py
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+from hostfakes import PixelBitmap, FakeBitmap, fakeArrayblit, repoDirectory
+from corpus import corpora
+
+import rlecanvas
+from rlecanvas import rleCanvas, heapBytes
+from pagecache import pageCache
+
+pageLimit = 20
+tallHeight = 2400
+
+
+def rowObjectBytes(canvas):
+    # RAM the canvas would take with one bytes object per row of text in a list of the rows
+    rows = [canvas._encodedRow(y) for y in range(canvas.height)]
+    return heapBytes(4 * canvas.height) + sum([heapBytes(len(row) + 1) for row in rows if row is not None])
+
+
+def reportRam(name, canvases, displayBytes):
+    encoded = [canvas.encodedBytes() for canvas in canvases]
+    ram = [canvas.ramBytes() for canvas in canvases]
+    rowObjects = [rowObjectBytes(canvas) for canvas in canvases]
+    textRows = sum([len([y for y in range(canvas.height) if canvas._encodedRow(y) is not None]) for canvas in canvases])
+    print('    {}: {} pages, {:.0f} rows with text per page'.format(name, len(canvases), textRows / len(canvases)))
+    print('        encoded rows: mean {:.0f} bytes, RAM: mean {:.0f} bytes, min {}, max {}'.format(
+        sum(encoded) / len(canvases), sum(ram) / len(canvases), min(ram), max(ram)))
+    print('        pages in the RAM of one bitmap: {:.1f} (mean), {:.1f} to {:.1f}, one object per row: {:.1f}'.format(
+        displayBytes * len(canvases) / sum(ram), displayBytes / max(ram), displayBytes / min(ram),
+        displayBytes * len(canvases) / sum(rowObjects)))
+
+
+def strictJoin(separator, pieces):
+    # bytes.join of CircuitPython: every piece must have the type of the separator
+    for piece in pieces:
+        if type(piece) is not type(separator):
+            raise TypeError("join expects a list of {} objects".format(type(separator).__name__))
+    return separator.join(pieces)
+
+
+def mixedRowsCheck(width, height):
+    # Draws into a canvas that already has encoded rows, then closes it and reads a slice across the
+    # open and encoded rows.  Returns the number of errors: a join that failed or a wrong result.
+    joinRows = rlecanvas.joinRows
+    mixed = [0] # joins of pieces that bytes.join of CircuitPython would refuse
+    def checkedJoin(pieces):
+        try:
+            strictJoin(b'', pieces)
+        except TypeError:
+            mixed[0] += 1
+        return joinRows(pieces)
+    rlecanvas.joinRows = checkedJoin
+    errors = 0
+    try:
+        canvas = rleCanvas(width, height)
+        pixels = bytearray(width * height)
+        for y in range(0, height, 3):
+            for x in range(y % 7, width, 5):
+                canvas[x, y] = pixels[y * width + x] = 1 + y % 3
+        canvas.close()
+        for y in range(1, 6): # open a few rows between encoded rows
+            for x in range(10, 20):
+                canvas[x, y] = pixels[y * width + x] = 2
+        if bytes(canvas[0 : 7 * width]) != bytes(pixels[0 : 7 * width]):
+            errors += 1
+        canvas.close()
+        if bytes(canvas[0 : width * height]) != bytes(pixels):
+            errors += 1
+    except TypeError:
+        errors += 1
+    finally:
+        rlecanvas.joinRows = joinRows
+    print('    canvas joins of memoryview and bytearray rows: {}, errors: {}'.format(mixed[0], errors))
+    if not mixed[0]: # the check did not join mixed rows
+        errors += 1
+    return errors
+
+
+def main():
+    os.chdir(repoDirectory) # the font files are opened relative to the repository
+    import smackDown
+
+    lines = []
+    for (name, corpusLines) in corpora():
+        lines.extend(corpusLines)
+    (handle, fileName) = tempfile.mkstemp(suffix='.md')
+    with os.fdopen(handle, 'w') as markdownFile:
+        markdownFile.write('\n'.join(lines) + '\n')
+    cacheDirectory = tempfile.mkdtemp()
+
+    mismatches = 0
+    try:
+        fonts = smackDown.openFonts()
+        (width, height) = (smackDown.displayWidth, smackDown.displayHeight)
+        displayBytes = width * height * 2 // 8 # displayio.Bitmap with 3 colors
+
+        renderer = smackDown.newRenderer(PixelBitmap(width, height, 3), fonts)
+        pages = renderer.openPageIndex(fileName)
+        pageCount = min(len(pages), pageLimit)
+        rendered = []
+        start = time.perf_counter()
+        for pageNumber in range(pageCount):
+            renderer.renderPage(fileName, pages, pageNumber)
+            rendered.append(bytes(renderer.bitmap.buffer))
+        bitmapTime = (time.perf_counter() - start) / pageCount
+
+        displayBitmap = renderer.bitmap
+        canvases = []
+        start = time.perf_counter()
+        for pageNumber in range(pageCount):
+            canvas = rleCanvas(width, height)
+            renderer.bitmap = canvas
+            renderer.renderPage(fileName, pages, pageNumber)
+            canvas.close()
+            canvases.append(canvas)
+        canvasTime = (time.perf_counter() - start) / pageCount
+        renderer.bitmap = displayBitmap
+
+        print('{} pages of {}x{}, a displayio.Bitmap with 3 colors holds {} bytes'.format(pageCount, width, height, displayBytes))
+        reportRam('dense corpus', canvases, displayBytes)
+        readmePages = renderer.openPageIndex('README.md')
+        readmeCanvases = []
+        for pageNumber in range(len(readmePages)):
+            canvas = rleCanvas(width, height)
+            renderer.bitmap = canvas
+            renderer.renderPage('README.md', readmePages, pageNumber)
+            canvas.close()
+            readmeCanvases.append(canvas)
+        renderer.bitmap = displayBitmap
+        reportRam('README.md', readmeCanvases, displayBytes)
+        print('    render into a bitmap:   {:6.2f} ms per page'.format(1000 * bitmapTime))
+        print('    render into a canvas:   {:6.2f} ms per page'.format(1000 * canvasTime))
+
+        canvas = rleCanvas(width, height)
+        cached = smackDown.newRenderer(canvas, fonts, pageCache=pageCache(cacheDirectory, 1000000))
+        bitmap = FakeBitmap(width, height, 3)
+        for passName in ('render and store', 'load from the cache'):
+            start = time.perf_counter()
+            for pageNumber in range(pageCount):
+                cached.renderPage(fileName, pages, pageNumber)
+                canvas.close()
+                canvas.show(bitmap)
+                if bytes(bitmap.buffer) != rendered[pageNumber]:
+                    mismatches += 1
+            passTime = (time.perf_counter() - start) / pageCount
+            print('    canvas with a pageCache, {}: {:6.2f} ms per page (and show)'.format(passName, 1000 * passTime))
+        print('    pageCache hits {}, misses {}'.format(cached.pageCache.hits, cached.pageCache.misses))
+
+        arrayblitModule = types.ModuleType('bitmaptools')
+        arrayblitModule.arrayblit = fakeArrayblit
+        modes = [('PixelBitmap', PixelBitmap, None),
+                 ('PixelBitmap with bitmaptools.arrayblit', PixelBitmap, arrayblitModule),
+                 ('FakeBitmap', FakeBitmap, None)]
+        for (modeName, bitmapType, bitmaptoolsModule) in modes:
+            rlecanvas.bitmaptools = bitmaptoolsModule
+            bitmap = bitmapType(width, height, 3)
+            start = time.perf_counter()
+            for pageNumber in range(pageCount):
+                canvases[pageNumber].show(bitmap)
+                if bytes(bitmap.buffer) != rendered[pageNumber]:
+                    mismatches += 1
+            showTime = (time.perf_counter() - start) / pageCount
+            print('    show, {}: {:6.2f} ms per page'.format(modeName, 1000 * showTime))
+
+        tall = smackDown.newRenderer(PixelBitmap(width, tallHeight, 3), fonts)
+        canvas = rleCanvas(width, tallHeight)
+        tallCanvas = smackDown.newRenderer(canvas, fonts)
+        for myRenderer in (tall, tallCanvas):
+            myRenderer.startDocument()
+            for line in lines[:150]:
+                myRenderer.renderLine(line + '\n')
+        canvas.close()
+        bitmap = FakeBitmap(width, height, 3)
+        for top in range(0, tallHeight - height + 1, 97):
+            canvas.show(bitmap, top)
+            if bytes(bitmap.buffer) != bytes(tall.bitmap.buffer[top * width : (top + height) * width]):
+                mismatches += 1
+        print('    tall canvas of {} rows: {} bytes encoded, {} bytes of RAM, a displayio.Bitmap would hold {} bytes'.format(
+            tallHeight, canvas.encodedBytes(), canvas.ramBytes(), width * tallHeight * 2 // 8))
+        print('    views different from the rendered pixels: {}'.format(mismatches))
+        mismatches += mixedRowsCheck(width, height)
+    finally:
+        os.remove(fileName)
+        if os.path.exists(fileName + '.idx'):
+            os.remove(fileName + '.idx')
+        shutil.rmtree(cacheDirectory, ignore_errors=True)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# bench_fontload.py
+# Host-side time-to-first-pixel comparison: eager font loading (every font opened at startup, with
+# load_glyphs for the common characters) against the lazy fontRegistry.
+#
+# Both cases end when the first line of README.md has been placed in the body font.  The BDF reader in
+# hostfakes.py behaves like adafruit_bitmap_font (a pass over the file per load_glyphs call).
+#
+# With maxGlyphs, README.md is also drawn in the body font, and the glyphs that were evicted but are
+# still held by the cache of glyph row runs (textmap.glyphRuns) are counted: there should be none.  The
+# glyphs left in the cache of the wrapped fonts, outside the limit, are counted too: there should be none.
+#
+# Usage: python benchmarks/bench_fontload.py [maxGlyphs]
+
+import sys
+import time
+
+from hostfakes import FakeBitmap, loadBdfFont, readmeText
+
+import textmap
+from fontregistry import fontRegistry
+
+fontFiles = [
+    'fonts/BitstreamVeraSans-Roman-20.bdf',
+    'fonts/BitstreamVeraSans-Roman-16.bdf',
+    'fonts/BitstreamVeraSans-Bold-16.bdf',
+    'fonts/BitstreamVeraSans-Oblique-16.bdf',
+    'fonts/BitstreamVeraSans-BoldOblique-16.bdf',
+    'fonts/TerminusTTF-16.bdf',
+]
+indexMainBody = 1
+glyphs = b'0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ-,.:?! '
+
+
+def firstLine():
+    return [line for line in readmeText().split('\n') if line.strip()][0]
+
+
+def eager():
+    fontList = []
+    for fontFile in fontFiles:
+        font = loadBdfFont(fontFile)
+        font.load_glyphs(glyphs)
+        fontList.append(font)
+    textmap.placeText(FakeBitmap(320, 240, 3), firstLine(), fontList[indexMainBody], 1.35, 1, 3)
+    opened = len(fontList)
+    loaded = sum([len(font._glyphs) for font in fontList])
+    return (opened, loaded)
+
+
+def lazy(maxGlyphs):
+    registry = fontRegistry(fontFiles, loadBdfFont, maxGlyphs, glyphs)
+    textmap.placeText(FakeBitmap(320, 240, 3), firstLine(), registry[indexMainBody], 1.35, 1, 3)
+    (opened, resident, loads, evictions) = registry.stats()
+    if maxGlyphs is None:
+        loaded = sum([len(font._font._glyphs) for font in registry.fonts if font.isOpen()])
+    else: # the glyphs are only held by the lazyFont
+        loaded = resident
+    return (opened, loaded)
+
+
+def evictedGlyphsKept(maxGlyphs):
+    # Draws README.md with a glyph limit, returns (evictions, evicted glyphs still in the run cache,
+    # glyphs held by the wrapped fonts)
+    registry = fontRegistry(fontFiles, loadBdfFont, maxGlyphs, glyphs)
+    bitmap = FakeBitmap(320, 240, 3)
+    for line in readmeText().split('\n'):
+        textmap.placeText(bitmap, line[:40], registry[indexMainBody], 1.35, 1, 3)
+    resident = set([id(glyph) for font in registry.fonts for glyph in font._glyphs.values()])
+    kept = [glyph for (glyph, runs) in textmap._glyphRunCache.values() if id(glyph) not in resident]
+    held = sum([len(font._font._glyphs) for font in registry.fonts if font.isOpen()])
+    return (registry.stats()[3], len(kept), held)
+
+
+def timeToFirstPixel(function, *args):
+    textmap.clearFontMetrics()
+    textmap.clearGlyphRunCache()
+    start = time.perf_counter()
+    result = function(*args)
+    return (time.perf_counter() - start, result)
+
+
+def main():
+    maxGlyphs = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    (eagerTime, (eagerOpened, eagerLoaded)) = timeToFirstPixel(eager)
+    (lazyTime, (lazyOpened, lazyLoaded)) = timeToFirstPixel(lazy, maxGlyphs)
+    print('eager loading: {:7.1f} ms to first pixel, {} fonts opened, {} glyphs loaded'.format(
+        eagerTime * 1000, eagerOpened, eagerLoaded))
+    print('fontRegistry:  {:7.1f} ms to first pixel, {} fonts opened, {} glyphs loaded  ({:.1f}x)'.format(
+        lazyTime * 1000, lazyOpened, lazyLoaded, eagerTime / lazyTime))
+    if maxGlyphs is not None:
+        textmap.clearFontMetrics()
+        textmap.clearGlyphRunCache()
+        (evictions, kept, held) = evictedGlyphsKept(maxGlyphs)
+        print('README.md with {} glyphs per font: {} glyphs evicted, {} of them kept by the run cache'.format(
+            maxGlyphs, evictions, kept))
+        print('glyphs held by the fonts outside the limit: {}'.format(held))
+        if kept or held:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
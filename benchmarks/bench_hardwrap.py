@@ -0,0 +1,80 @@
+# bench_hardwrap.py
+# Host-side benchmark for hard wrapping of words wider than the display (markdownRenderer.hardWrap).
+#
+# Draws a 300 character URL, with and without left matter, with hardWrap and with the character by
+# character loop it replaced (one measureText and one placeText call per character).  Checks that both
+# give the same bitmap and cursor, and reports the time for each: drawn into a PixelBitmap, and laid
+# out only (nullBitmap, measuring and wrapping without drawing), which shows how much of the time the
+# drawing of the pixels takes.
+#
+# Usage: python benchmarks/bench_hardwrap.py
+
+import os
+import sys
+import time
+
+from hostfakes import PixelBitmap, repoDirectory
+
+from textmap import measureText, nullBitmap
+
+repeats = 50
+
+
+def charByCharWrap(renderer, text, style, leftMatter, lineYChange): # the loop used before hardWrap
+    controller = renderer.controller
+    font = style.font
+    (insertionX, insertionY) = controller.getCursor()
+    for char in text:
+        (boundingBoxWidth, boundingBoxHeight) = measureText(char, font, controller.lineSpacing)
+        if insertionX+boundingBoxWidth > renderer.width:  # Needs a newline
+            controller.setX(controller.startX)
+            controller.setY(insertionY+lineYChange)
+            (insertionX, insertionY) = controller.getCursor()
+        if (controller.getX() == controller.startX) and (leftMatter != ''):
+            (insertionX, insertionY) = renderer.placeOffsetText(leftMatter, style, controller.lineSpacing,
+                                                                insertionX, insertionY)
+            controller.setCursor(insertionX, insertionY)
+        (insertionX, insertionY) = renderer.placeOffsetText(char, style, controller.lineSpacing,
+                                                            insertionX, insertionY)
+        controller.setCursor(insertionX, insertionY)
+
+
+def timed(renderer, wrap, text, style, leftMatter, lineYChange):
+    best = None
+    for i in range(repeats):
+        renderer.bitmap.fill(0)
+        renderer.controller.setCursor(40, 3)
+        start = time.perf_counter()
+        wrap(text, style, leftMatter, lineYChange)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return (best, bytes(getattr(renderer.bitmap, 'buffer', b'')), renderer.controller.getCursor())
+
+
+def main():
+    os.chdir(repoDirectory) # the font files are opened relative to the repository
+    import smackDown
+    renderer = smackDown.newRenderer(PixelBitmap(smackDown.displayWidth, 400, 3), smackDown.openFonts())
+    style = renderer.styles[smackDown.indexMainBody]
+    lineYChange = style.lineHeight(renderer.controller.lineSpacing)
+    url = 'https://github.com/kmatch98/smackdown/blob/main/'
+    url = (url + 'a/very/long/path/to/a_file_name_' * 10)[:300]
+
+    failed = False
+    for (name, bitmap) in (('draw', renderer.bitmap), ('layout only', nullBitmap(smackDown.displayWidth))):
+        renderer.bitmap = bitmap
+        for leftMatter in ('', '> > '):
+            def reference(text, style, leftMatter, lineYChange):
+                charByCharWrap(renderer, text, style, leftMatter, lineYChange)
+            (oldTime, oldBitmap, oldCursor) = timed(renderer, reference, url, style, leftMatter, lineYChange)
+            (newTime, newBitmap, newCursor) = timed(renderer, renderer.hardWrap, url, style, leftMatter, lineYChange)
+            same = (oldBitmap == newBitmap) and (oldCursor == newCursor)
+            failed = failed or not same
+            print('{}, {} characters, left matter \'{}\': character by character {:.2f} ms, hardWrap {:.2f} ms ({:.1f}x), same output: {}'.format(
+                name, len(url), leftMatter, oldTime * 1000, newTime * 1000, oldTime / newTime, same))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
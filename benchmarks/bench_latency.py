@@ -0,0 +1,98 @@
+# bench_latency.py
+# Host-side benchmark for resumable rendering (smackRender.renderJob).
+#
+# Renders each corpus line by line with renderLine, and in steps with a renderJob using a glyph budget
+# and a time budget.  The longest time between two chances to check for input is the worst-case input
+# latency: one whole line with renderLine, one run of a renderJob.  With a time budget, the longest run
+# should be at or below the budget.  The cyclic garbage collector of CPython is turned off while timing
+# (as timeit does), its pauses do not come from the renderer.  Each step is timed as well: a run over the
+# budget that holds one step many times longer than the longest usual step was paused by the host.
+#
+# Usage: python benchmarks/bench_latency.py
+
+import gc
+import os
+import time
+
+from hostfakes import PixelBitmap, repoDirectory
+from corpus import corpora
+
+from smackRender import renderJob
+
+
+def lineSteps(renderer, lines, stepTimes): # renders the lines as one stream of steps, moving to the top when a page is full
+    controller = renderer.controller
+    for line in lines:
+        start = time.perf_counter()
+        for glyphCount in renderer.renderLineSteps(line + '\n'):
+            stepTimes.append(time.perf_counter() - start)
+            yield glyphCount
+            start = time.perf_counter()
+        if controller.getY() > renderer.height:
+            renderer.bitmap.fill(0)
+            controller.setY(controller.startY)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    os.chdir(repoDirectory) # the font files are opened relative to the repository
+    import smackDown
+    renderer = smackDown.newRenderer(PixelBitmap(smackDown.displayWidth, smackDown.displayHeight, 3),
+                                     smackDown.openFonts())
+    lines = []
+    for (name, corpusLines) in corpora():
+        lines.extend(corpusLines)
+
+    results = []
+    gc.disable()
+
+    # whole lines
+    renderer.startDocument()
+    for line in lines: # load the glyphs
+        renderer.renderLine(line + '\n')
+    durations = []
+    renderer.startDocument()
+    for line in lines:
+        start = time.perf_counter()
+        renderer.renderLine(line + '\n')
+        durations.append(time.perf_counter() - start)
+        if renderer.controller.getY() > renderer.height:
+            renderer.bitmap.fill(0)
+            renderer.controller.setY(renderer.controller.startY)
+    results.append(('renderLine, whole lines', durations))
+
+    for (name, glyphBudget, timeBudgetMs) in (('renderJob, 16 glyphs', 16, None),
+                                              ('renderJob, 64 glyphs', 64, None),
+                                              ('renderJob, 5 ms', None, 5)):
+        renderer.startDocument()
+        stepTimes = []
+        job = renderJob(lineSteps(renderer, lines, stepTimes))
+        durations = []
+        longestSteps = [] # the longest step of each run
+        while True:
+            firstStep = len(stepTimes)
+            start = time.perf_counter()
+            more = job.run(glyphBudget, timeBudgetMs)
+            durations.append(time.perf_counter() - start)
+            longestSteps.append(max(stepTimes[firstStep:], default=0))
+            if not more:
+                break
+        results.append((name, durations))
+    gc.enable()
+
+    print('{} lines, time between input checks:'.format(len(lines)))
+    for (name, durations) in results:
+        print('  {:24s} steps {:6d}  total {:7.1f} ms  p99 {:6.2f} ms  max {:6.2f} ms'.format(
+            name, len(durations), 1000 * sum(durations), 1000 * percentile(durations, 0.99), 1000 * max(durations)))
+    over = [(duration, step) for (duration, step) in zip(results[-1][1], longestSteps) if duration > 0.005]
+    print('5 ms job: p99 step {:.2f} ms, runs over the budget: {}{}'.format(
+        1000 * percentile(stepTimes, 0.99), len(over),
+        ''.join(', {:.2f} ms with a {:.2f} ms step'.format(1000 * duration, 1000 * step) for (duration, step) in over)))
+
+
+if __name__ == '__main__':
+    main()
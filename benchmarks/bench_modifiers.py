@@ -0,0 +1,130 @@
+# bench_modifiers.py
+# Host-side benchmark for fontController.fontModifierCheck.
+#
+# Runs every chunk of the markdown corpus through the chunk loop used by printText, once with the
+# precompiled modifier scanner and bitmask style state, and once with the original search (one text.find
+# per key, keys re-sorted on every call) and list scans of the stack.  Checks that the returned chunks,
+# the modifier stack and the font status are identical.
+#
+# Usage: python benchmarks/bench_modifiers.py
+
+import sys
+import time
+
+import hostfakes
+from corpus import markdownLines
+
+from smackParse import fontController
+
+
+class referenceController(fontController):
+    def updateFontStatus(self):
+        # The original implementation, walks the whole stack after every push and pop.
+        self.bold = False
+        self.italic = False
+        self.code = False
+        self.codeBlock = False
+        for item in self.stack:
+            if self.modifierDict[item] in ['bold', 'bolditalic']:
+                self.bold = True
+            if self.modifierDict[item] in ['italic', 'bolditalic']:
+                self.italic = True
+            if self.modifierDict[item] in ['code', 'codeBlock']:
+                self.code = True
+            if self.modifierDict[item] in ['codeBlock']:
+                self.codeBlock = True
+
+    def resetModifier(self):
+        self.stack = []
+        self.updateFontStatus()
+
+    def fontModifierCheck(self, text):
+        # The original implementation, kept here as the reference.
+        foundaKey = False
+        keyIndex = len(text)
+        firstKey = ''
+        for key in sorted(self.modifierDict.keys(), key=len, reverse=True):
+            thisIndex = text.find(key)
+            if thisIndex != -1:
+                if foundaKey == False:
+                    foundaKey = True
+                    keyIndex = thisIndex
+                    firstKey = key
+                elif thisIndex < keyIndex:
+                    keyIndex = thisIndex
+                    firstKey = key
+        if foundaKey:
+            [firstChunk, secondChunk] = text.split(firstKey, 1)
+            if firstChunk == '':
+                returnValue = ['', secondChunk]
+                if len(self.stack) > 0:
+                    if self.stack[-1] == firstKey:
+                        self.stack.pop(-1)
+                        self.updateFontStatus()
+                    else:
+                        if self.code == True:
+                            returnValue = [firstKey, secondChunk]
+                        else:
+                            self.stack.append(firstKey)
+                else:
+                    self.stack.append(firstKey)
+                self.updateFontStatus()
+            else:
+                returnValue = [firstChunk, firstKey + secondChunk]
+        else:
+            returnValue = [text, '']
+        return returnValue
+
+
+def runChunks(controller, lines, record=None):
+    # Same chunk loop as renderLine -> printText
+    calls = 0
+    for line in lines:
+        if line.strip() == '':
+            controller.resetModifier() # a blank line starts a new section
+        for chunk in line.split(' '):
+            secondText = chunk + ' '
+            while True:
+                (firstText, secondText) = controller.fontModifierCheck(secondText)
+                calls += 1
+                if record is not None:
+                    record.append((firstText, secondText, tuple(controller.stack),
+                                   controller.fontStatus(), controller.codeBlock))
+                if firstText == '' and secondText == '':
+                    break
+    return calls
+
+
+def timeChunks(controllerClass, lines, repeats):
+    controller = controllerClass()
+    start = time.perf_counter()
+    calls = 0
+    for i in range(repeats):
+        calls += runChunks(controller, lines)
+    return calls / (time.perf_counter() - start)
+
+
+def main():
+    lines = markdownLines()
+    repeats = 20
+
+    expected = []
+    actual = []
+    runChunks(referenceController(), lines, expected)
+    runChunks(fontController(), lines, actual)
+
+    referenceRate = timeChunks(referenceController, lines, repeats)
+    scannerRate = timeChunks(fontController, lines, repeats)
+
+    print('corpus: {} lines'.format(len(lines)))
+    print('reference fontModifierCheck: {:10.0f} calls/s'.format(referenceRate))
+    print('scanner and style bitmask:   {:10.0f} calls/s  ({:.1f}x)'.format(scannerRate, scannerRate / referenceRate))
+
+    identical = expected == actual
+    print('identical results: {}'.format(identical))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# bench_monospace.py
+# Host-side benchmark for the fixed-advance fast path of code fonts (textmap.fontMetrics.fixedAdvance).
+#
+# Lists the fonts that are found to have a fixed advance, then renders the code block corpus with the
+# fast path of the code font turned on and off: once laid out without drawing (nullBitmap, measuring
+# and wrapping only), once drawn into a FakeBitmap (slice writes) and once into a PixelBitmap (pixel
+# writes only, like displayio.Bitmap).  Checks that both give the same bitmap and cursor, and reports
+# the best time of each.
+#
+# Usage: python benchmarks/bench_monospace.py
+
+import os
+import sys
+import time
+
+from hostfakes import FakeBitmap, PixelBitmap, repoDirectory
+from corpus import codeBlockLines
+
+from textmap import getFontMetrics, nullBitmap, wordWidthCache
+
+repeats = 10
+
+
+def render(renderer, lines): # renders the lines as pages of the bitmap height, returns the final cursor
+    controller = renderer.controller
+    renderer.startDocument()
+    for line in lines:
+        renderer.renderLine(line + '\n')
+        if controller.getY() > renderer.height:
+            renderer.bitmap.fill(0)
+            controller.setY(controller.startY)
+    return controller.getCursor()
+
+
+def timed(renderer, lines):
+    best = None
+    for i in range(repeats):
+        renderer.bitmap.fill(0)
+        wordWidthCache.clear()
+        start = time.perf_counter()
+        cursor = render(renderer, lines)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return (best, bytes(renderer.bitmap.buffer) if hasattr(renderer.bitmap, 'buffer') else b'', cursor)
+
+
+def main():
+    os.chdir(repoDirectory) # the font files are opened relative to the repository
+    import smackDown
+    from smackRender import loadFont
+
+    for fileName in sorted(os.listdir('fonts')):
+        if fileName.endswith('.pkf'):
+            advance = getFontMetrics(loadFont('fonts/' + fileName)).fixedAdvance
+            if advance is not None:
+                print('{}: fixed advance {}'.format(fileName, advance))
+
+    fonts = smackDown.openFonts()
+    lines = codeBlockLines()
+    metrics = fonts.styles[fonts.indexCode].metrics()
+    fixedAdvance = metrics.fixedAdvance
+    if fixedAdvance is None:
+        print('the code font {} does not have a fixed advance'.format(fonts.fontFiles[fonts.indexCode]))
+        sys.exit(1)
+
+    failed = False
+    for (name, bitmap) in (('layout', nullBitmap(smackDown.displayWidth)),
+                           ('draw', FakeBitmap(smackDown.displayWidth, smackDown.displayHeight, 3)),
+                           ('draw, pixel writes', PixelBitmap(smackDown.displayWidth, smackDown.displayHeight, 3))):
+        renderer = smackDown.newRenderer(bitmap, fonts)
+        render(renderer, lines) # loads the glyphs and builds their row runs
+        metrics.fixedAdvance = None
+        (oldTime, oldBitmap, oldCursor) = timed(renderer, lines)
+        metrics.fixedAdvance = fixedAdvance
+        (newTime, newBitmap, newCursor) = timed(renderer, lines)
+        same = (oldBitmap == newBitmap) and (oldCursor == newCursor)
+        failed = failed or not same
+        print('{} {} code block lines: per character {:.2f} ms, fixed advance {:.2f} ms ({:.2f}x), same output: {}'.format(
+            name, len(lines), oldTime * 1000, newTime * 1000, oldTime / newTime, same))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# bench_packedfont.py
+# Host-side benchmark for the packed font format (packedfont.py).
+#
+# For each font, compares the file size, the time to open the font and load the printable ASCII glyphs,
+# and the glyph bitmap storage with the indexed BDF reader (a Bitmap per glyph) and the packed file.
+# The Bitmap storage is estimated like displayio.Bitmap with 1 bit per pixel: each row is rounded up
+# to a 32-bit word.  Also checks that every glyph in the packed file matches the BDF glyph, for every
+# packed font in fonts/ that has a BDF source, and exits with an error if any glyph differs.
+#
+# Packed fonts are loaded both ways: read into RAM as a whole (inMemory=True), and with only the metrics
+# table in RAM and each glyph read from the file (the default).  The resident bytes are the buffers the
+# font holds after loading the glyphs.
+#
+# Usage: python benchmarks/bench_packedfont.py  (convert the fonts first: python packedfont.py fonts/*.bdf)
+
+import glob
+import os
+import sys
+import time
+
+from hostfakes import PixelBitmap, repoDirectory
+
+import bdfindex
+import packedfont
+
+codePoints = range(32, 127)
+
+
+def loadGlyphs(loader, *args):
+    start = time.perf_counter()
+    font = loader(*args)
+    glyphs = [font.get_glyph(codePoint) for codePoint in codePoints]
+    return (time.perf_counter() - start, font, glyphs)
+
+
+def residentBytes(font): # bytes of the buffers held by a packedFont
+    if font._data is not None: # the whole file
+        return len(font._data)
+    return len(font._metrics) + sum(len(glyph.bitmap._data) for glyph in font._glyphs.values() if glyph is not None)
+
+
+def sameGlyph(bdfGlyph, packedGlyph):
+    if bdfGlyph is None or packedGlyph is None:
+        return bdfGlyph is packedGlyph
+    for field in ('width', 'height', 'dx', 'dy', 'shift_x'):
+        if getattr(bdfGlyph, field) != getattr(packedGlyph, field):
+            return False
+    return all(bdfGlyph.bitmap[i] == packedGlyph.bitmap[i] for i in range(bdfGlyph.width * bdfGlyph.height))
+
+
+def fontFiles(): # the packed fonts in fonts/ that have a BDF source, as (bdfName, packedName)
+    pairs = []
+    for packedName in sorted(glob.glob(os.path.join(repoDirectory, 'fonts', '*' + packedfont.packedSuffix))):
+        bdfName = packedName[:-len(packedfont.packedSuffix)] + '.bdf'
+        if os.path.exists(bdfName):
+            pairs.append((bdfName, packedName))
+    return pairs
+
+
+def main():
+    failed = False
+    for (bdfName, packedName) in fontFiles():
+        bdfindex.loadIndexedFont(bdfName, PixelBitmap).close() # builds the sidecar outside of the timing
+
+        (bdfTime, bdfFont, bdfGlyphs) = loadGlyphs(bdfindex.loadIndexedFont, bdfName, PixelBitmap)
+        (memoryTime, memoryFont, memoryGlyphs) = loadGlyphs(packedfont.loadPackedFont, packedName, True)
+        (packedTime, packedFont, packedGlyphs) = loadGlyphs(packedfont.loadPackedFont, packedName, False)
+        bdfFont.close()
+        packedFont.close()
+        mismatches = sum(1 for (a, b) in zip(bdfGlyphs, packedGlyphs) if not sameGlyph(a, b))
+        mismatches += sum(1 for (a, b) in zip(bdfGlyphs, memoryGlyphs) if not sameGlyph(a, b))
+        if mismatches:
+            failed = True
+
+        glyphs = [glyph for glyph in bdfGlyphs if glyph is not None]
+        bitmapBytes = sum(4 * ((glyph.width + 31) // 32) * glyph.height for glyph in glyphs)
+        packedBytes = sum(((glyph.width + 7) // 8) * glyph.height for glyph in glyphs)
+
+        print('{}: bdf {} bytes, packed {} bytes, {} glyphs differ'.format(
+            os.path.basename(bdfName), os.path.getsize(bdfName), os.path.getsize(packedName), mismatches))
+        print('    open + {} glyphs: bdf {:.2f} ms, packed {:.2f} ms ({:.0f}x), packed in memory {:.2f} ms'.format(
+            len(glyphs), bdfTime * 1000, packedTime * 1000, bdfTime / packedTime, memoryTime * 1000))
+        print('    resident: packed {} bytes, packed in memory {} bytes'.format(
+            residentBytes(packedFont), residentBytes(memoryFont)))
+        print('    glyph bitmaps: {} Bitmap objects with {} bytes of rows, packed {} bytes in one buffer'.format(
+            len(glyphs), bitmapBytes, packedBytes))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
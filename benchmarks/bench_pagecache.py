@@ -0,0 +1,141 @@
+# bench_pagecache.py
+# Host-side benchmark for the rendered page cache (pagecache.py).
+#
+# Renders the pages of a generated document without a cache, then with an empty cache (the pages are
+# rendered and stored) and with the filled cache (the pages are decoded from their files).  Checks that
+# the decoded pages are identical to the rendered ones, that a small budget evicts pages to stay within
+# it, that a page is not loaded after a font file changed (a new modification time), and that a page
+# file cut short at any byte (a reset while it was written) is deleted and rendered again.  Reports the
+# size of the page files and the time per page, for a bitmap with pixel writes only (like
+# displayio.Bitmap), the same with bitmaptools.arrayblit, and a bitmap with slice writes.
+#
+# Usage: python benchmarks/bench_pagecache.py
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+from hostfakes import PixelBitmap, FakeBitmap, fakeArrayblit, repoDirectory
+from corpus import corpora
+
+import pagecache
+from pagecache import pageCache
+
+pageLimit = 20
+
+
+def renderPages(renderer, fileName, pages):
+    # returns (seconds per page, page bitmaps)
+    images = []
+    start = time.perf_counter()
+    for pageNumber in range(min(len(pages), pageLimit)):
+        renderer.renderPage(fileName, pages, pageNumber)
+        images.append(bytes(renderer.bitmap.buffer))
+    return ((time.perf_counter() - start) / len(images), images)
+
+
+def loadCutPages(renderer, cache, fileName, pages, image):
+    # Cuts the file of the first page at each byte, returns (cut files loaded, cut files not deleted).
+    # The page is stored again at the end, the renderer has the first page in its bitmap.
+    renderer.pageCache = cache
+    key = renderer.pageCacheKey(fileName, pages, 0)
+    renderer.renderPage(fileName, pages, 0)
+    path = cache._path('{:08x}{}'.format(pagecache.keyHash(key), pagecache.cacheSuffix))
+    with open(path, 'rb') as pageFile:
+        data = pageFile.read()
+    loads = 0
+    kept = 0
+    for length in range(len(data)):
+        with open(path, 'wb') as pageFile:
+            pageFile.write(data[:length])
+        loads += cache.load(key, renderer.bitmap)
+        kept += os.path.exists(path)
+    renderer.renderPage(fileName, pages, 0) # rendered and stored again
+    return (loads, kept)
+
+
+def main():
+    os.chdir(repoDirectory) # the font files are opened relative to the repository
+    import smackDown
+
+    lines = []
+    for (name, corpusLines) in corpora():
+        lines.extend(corpusLines)
+    (handle, fileName) = tempfile.mkstemp(suffix='.md')
+    with os.fdopen(handle, 'w') as markdownFile:
+        markdownFile.write('\n'.join(lines) + '\n')
+    cacheDirectory = tempfile.mkdtemp()
+
+    failed = False
+    try:
+        fonts = smackDown.openFonts()
+        (width, height) = (smackDown.displayWidth, smackDown.displayHeight)
+        arrayblitModule = types.ModuleType('bitmaptools')
+        arrayblitModule.arrayblit = fakeArrayblit
+        modes = [('PixelBitmap', PixelBitmap, None),
+                 ('PixelBitmap with bitmaptools.arrayblit', PixelBitmap, arrayblitModule),
+                 ('FakeBitmap', FakeBitmap, None)]
+        for (modeName, bitmapType, bitmaptoolsModule) in modes:
+            pagecache.bitmaptools = bitmaptoolsModule
+            shutil.rmtree(cacheDirectory, ignore_errors=True)
+            renderer = smackDown.newRenderer(bitmapType(width, height, 3), fonts)
+            pages = renderer.openPageIndex(fileName)
+            (renderTime, rendered) = renderPages(renderer, fileName, pages)
+
+            cache = pageCache(cacheDirectory, 1000000)
+            renderer.pageCache = cache
+            (coldTime, stored) = renderPages(renderer, fileName, pages)
+            (warmTime, loaded) = renderPages(renderer, fileName, pages)
+            mismatches = sum([(rendered[i] != stored[i]) + (rendered[i] != loaded[i]) for i in range(len(rendered))])
+            pageBytes = cache.usedBytes() / len(rendered)
+
+            fontFile = fonts.fontFiles[0]
+            fontStat = os.stat(fontFile)
+            os.utime(fontFile, ns=(fontStat.st_atime_ns, fontStat.st_mtime_ns + 1000000000))
+            try:
+                hits = cache.hits
+                renderer.renderPage(fileName, pages, 0)
+                staleFontHits = cache.hits - hits
+            finally:
+                os.utime(fontFile, ns=(fontStat.st_atime_ns, fontStat.st_mtime_ns))
+
+            budget = int(pageBytes * 5)
+            small = pageCache(cacheDirectory + '/small', budget)
+            renderer.pageCache = small
+            (smallTime, smallImages) = renderPages(renderer, fileName, pages)
+            for pageNumber in range(len(rendered) - 3, len(rendered)): # the last pages used are still there
+                renderer.renderPage(fileName, pages, pageNumber)
+                smallImages[pageNumber] = bytes(renderer.bitmap.buffer)
+            mismatches += sum([rendered[i] != smallImages[i] for i in range(len(rendered))])
+            overBudget = small.usedBytes() > budget
+
+            print('{}: {} pages of {}x{} ({} bytes each as a bytearray)'.format(modeName, len(rendered),
+                  width, height, width * height))
+            print('    page file: mean {:.0f} bytes'.format(pageBytes))
+            print('    render:                 {:6.2f} ms per page'.format(1000 * renderTime))
+            print('    render and store:       {:6.2f} ms per page'.format(1000 * coldTime))
+            print('    load from the cache:    {:6.2f} ms per page  ({:.1f}x faster than rendering)'.format(
+                1000 * warmTime, renderTime / warmTime))
+            print('    budget {} bytes: {} pages evicted, {} bytes used, hits {}, misses {}'.format(
+                budget, small.evictions, small.usedBytes(), small.hits, small.misses))
+            print('    pages different from the rendered page: {}, over budget: {}'.format(mismatches, overBudget))
+            print('    pages loaded after a font file changed: {}'.format(staleFontHits))
+            (cutLoads, cutKept) = loadCutPages(renderer, cache, fileName, pages, rendered[0])
+            print('    page file cut at each of its bytes: {} loaded, {} kept, rendered again: {}'.format(
+                cutLoads, cutKept, renderer.bitmap.buffer == rendered[0]))
+            failed = (failed or mismatches > 0 or overBudget or staleFontHits > 0 or cutLoads > 0 or cutKept > 0 or
+                      renderer.bitmap.buffer != rendered[0])
+    finally:
+        os.remove(fileName)
+        if os.path.exists(fileName + '.idx'):
+            os.remove(fileName + '.idx')
+        shutil.rmtree(cacheDirectory, ignore_errors=True)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
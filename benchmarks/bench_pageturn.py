@@ -0,0 +1,106 @@
+# bench_pageturn.py
+# Host-side benchmark for offscreen rendering of the next page (pageturner.py).
+#
+# Pages through a generated document twice: rendering each page when it is requested, and with a
+# pageTurner that renders the next page in time slices between page turns.  Reports the wait for each
+# page turn and the longest time slice, and checks that every swapped-in page matches the page rendered
+# directly.  Pages through once more with a pageTurner without a session, turning each page after
+# quickGlyphs characters of the next page were rendered offscreen, before it is finished.
+#
+# Usage: python benchmarks/bench_pageturn.py
+
+import os
+import sys
+import tempfile
+import time
+
+from hostfakes import PixelBitmap, FakeDisplay, repoDirectory
+from corpus import corpora
+
+from dirtyrect import renderSession
+from pageturner import pageTurner
+
+sliceMs = 10
+quickGlyphs = 50
+
+
+def main():
+    os.chdir(repoDirectory) # the font files are opened relative to the repository
+    import smackDown
+
+    lines = []
+    for (name, corpusLines) in corpora():
+        lines.extend(corpusLines)
+    (handle, fileName) = tempfile.mkstemp(suffix='.md')
+    with os.fdopen(handle, 'w') as markdownFile:
+        markdownFile.write('\n'.join(lines) + '\n')
+
+    fonts = smackDown.openFonts()
+    display = FakeDisplay(smackDown.displayWidth, smackDown.displayHeight)
+    session = renderSession(display, display.width, display.height)
+    session.begin()
+    (width, height) = (smackDown.displayWidth, smackDown.displayHeight)
+    direct = smackDown.newRenderer(PixelBitmap(width, height, 3), fonts, session)
+    try:
+        pages = direct.openPageIndex(fileName)
+        pageCount = min(len(pages), 30)
+
+        directWaits = []
+        directPages = []
+        for pageNumber in range(pageCount):
+            start = time.perf_counter()
+            direct.renderPage(fileName, pages, pageNumber)
+            directWaits.append(time.perf_counter() - start)
+            directPages.append(bytes(direct.bitmap.buffer))
+
+        shown = []
+        renderers = [smackDown.newRenderer(PixelBitmap(width, height, 3), fonts),
+                     smackDown.newRenderer(PixelBitmap(width, height, 3), fonts)]
+        turner = pageTurner(renderers, session, shown.append, fileName, pages)
+        turnWaits = []
+        slices = []
+        mismatches = 0
+        for pageNumber in range(pageCount):
+            start = time.perf_counter()
+            turner.showPage(pageNumber)
+            turnWaits.append(time.perf_counter() - start)
+            if bytes(turner.renderers[0].bitmap.buffer) != directPages[pageNumber]:
+                mismatches += 1
+            while True: # the reader is reading, render the next page
+                start = time.perf_counter()
+                more = turner.step(sliceMs)
+                slices.append(time.perf_counter() - start)
+                if not more:
+                    break
+
+        quickRenderers = [smackDown.newRenderer(PixelBitmap(width, height, 3), fonts),
+                          smackDown.newRenderer(PixelBitmap(width, height, 3), fonts)]
+        quick = pageTurner(quickRenderers, None, shown.append, fileName, pages)
+        quickWaits = []
+        for pageNumber in range(pageCount):
+            start = time.perf_counter()
+            quick.showPage(pageNumber)
+            quickWaits.append(time.perf_counter() - start)
+            if bytes(quick.renderers[0].bitmap.buffer) != directPages[pageNumber]:
+                mismatches += 1
+            quick.step(None, quickGlyphs) # the reader turns the page right away
+    finally:
+        os.remove(fileName)
+        if os.path.exists(fileName + '.idx'):
+            os.remove(fileName + '.idx')
+
+    print('pages: {}, page turns: {} swapped, {} rendered'.format(pageCount, turner.swaps, turner.renders))
+    print('wait per page turn, rendered on request: mean {:.1f} ms, max {:.1f} ms'.format(
+        1000 * sum(directWaits) / pageCount, 1000 * max(directWaits)))
+    print('wait per page turn, prerendered:         mean {:.1f} ms, max {:.1f} ms'.format(
+        1000 * sum(turnWaits) / pageCount, 1000 * max(turnWaits)))
+    print('offscreen time slices ({} ms budget): {}, longest {:.1f} ms'.format(sliceMs, len(slices), 1000 * max(slices)))
+    print('turned after {} characters offscreen, no session: {} swapped, {} rendered, wait mean {:.1f} ms, max {:.1f} ms'.format(
+        quickGlyphs, quick.swaps, quick.renders, 1000 * sum(quickWaits) / pageCount, 1000 * max(quickWaits)))
+    print('pages different from the direct render: {}'.format(mismatches))
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+# bench_placetext.py
+# Host-side benchmark for textmap.placeText.
+#
+# Renders README.md pages into a 320x240 bitmap with the row-run blitter, through pixel writes (like
+# displayio.Bitmap), pixel writes with bitmaptools.fill_region for the code span backgrounds, and slice
+# writes, and compares the output with the original per-pixel
+# placeText loop to verify the bitmaps are byte-identical.  Reports glyphs per second.
+#
+# Usage: python benchmarks/bench_placetext.py [fontFile]
+
+import sys
+import time
+import types
+
+from hostfakes import FakeBitmap, PixelBitmap, loadBdfFont, readmeText, fakeFillRegion
+
+import textmap
+
+
+def referencePlaceText(bitmap, text, font, lineSpacing, xPosition, yPosition,
+                       textPaletteIndex=1, backgroundPaletteIndex=0, scale=1, printOnlyPixels=True):
+    # The original per-pixel placeText, kept here as the reference for the output comparison.
+    fontHeight = font.get_glyph(ord("M")).height
+    bitmapWidth = bitmap.width
+    bitmapHeight = bitmap.height
+    xStart = xPosition
+    if backgroundPaletteIndex != 0:
+        (ignore, fontLineHeight) = textmap.bounding_box('M g', font, lineSpacing, scale)
+        (boxX, boxY) = textmap.bounding_box(text, font, lineSpacing, scale)
+        boxY = max(fontLineHeight, boxY)
+        for y in range(boxY):
+            for x in range(boxX):
+                # the original did not check the lower bounds, so a negative x wrapped into the previous row.
+                # fillRect clips at zero, which is also done here.
+                if (0 <= xPosition + x < bitmapWidth) and (0 <= yPosition + y < bitmapHeight):
+                    bitmap[(yPosition + y) * bitmapWidth + (xPosition + x)] = backgroundPaletteIndex
+    for char in text:
+        if char == '\n':
+            xPosition = xStart
+            yPosition = yPosition + textmap.lineSpacingY(font, lineSpacing, scale)
+        else:
+            myGlyph = font.get_glyph(ord(char))
+            if myGlyph == None:
+                print('Glyph not found: {}'.format(repr(char)))
+            else:
+                width = myGlyph.width
+                height = myGlyph.height
+                dx = myGlyph.dx
+                dy = myGlyph.dy
+                glyph_offset_x = myGlyph.tile_index * width
+                yOffset = fontHeight - height
+                for y in range(height):
+                    for x in range(width):
+                        xPlacement = x + xPosition + dx
+                        yPlacement = y + yPosition - dy + yOffset
+                        if ((xPlacement >= 0) and (yPlacement >= 0)
+                                and (xPlacement < bitmapWidth) and (yPlacement < bitmapHeight)):
+                            paletteIndexes = (backgroundPaletteIndex, textPaletteIndex)
+                            thisPixelColor = paletteIndexes[myGlyph.bitmap[y * width + x + glyph_offset_x]]
+                            if not printOnlyPixels or thisPixelColor > 0:
+                                bitmap[yPlacement * bitmapWidth + xPlacement] = thisPixelColor
+                        elif (yPlacement > bitmapHeight):
+                            break
+                xPosition = xPosition + myGlyph.shift_x
+    return (xPosition, yPosition)
+
+
+def pageLines(font, text):
+    # keep only characters the font can draw, so the glyph count is exact
+    lines = []
+    for line in text.split('\n'):
+        line = ''.join([char for char in line if font.get_glyph(ord(char)) is not None])
+        if line:
+            lines.append(line)
+    return lines
+
+
+def renderPage(placeFunction, bitmap, lines, font, lineSpacing=1.35):
+    # Places every line, wrapping back to the top when the page is full. Some lines run off the right
+    # and bottom edges on purpose to exercise the clipping.
+    glyphCount = 0
+    y = 3
+    for index, line in enumerate(lines):
+        background = 2 if index % 5 == 4 else 0 # every fifth line looks like a code span
+        placeFunction(bitmap, line, font, lineSpacing, 1 - (index % 3), y, 1, background)
+        glyphCount += len(line)
+        y += textmap.lineSpacingY(font, lineSpacing)
+        if y > bitmap.height + 4:
+            y = -6
+    return glyphCount
+
+
+def timeRender(placeFunction, bitmapClass, lines, font, repeats):
+    bitmap = bitmapClass(320, 240, 3)
+    textmap.clearGlyphRunCache()
+    textmap.clearFontMetrics()
+    start = time.perf_counter()
+    glyphCount = 0
+    for i in range(repeats):
+        glyphCount += renderPage(placeFunction, bitmap, lines, font)
+    duration = time.perf_counter() - start
+    return (bitmap, glyphCount / duration)
+
+
+def main():
+    fontFile = sys.argv[1] if len(sys.argv) > 1 else 'fonts/BitstreamVeraSans-Roman-16.bdf'
+    font = loadBdfFont(fontFile)
+    text = readmeText()
+    font.load_glyphs(text + 'M g') # load everything before timing
+    lines = pageLines(font, text)
+    repeats = 3
+
+    (reference, referenceRate) = timeRender(referencePlaceText, PixelBitmap, lines, font, repeats)
+    textmap.bitmaptools = None
+    (pixelBitmap, pixelRate) = timeRender(textmap.placeText, PixelBitmap, lines, font, repeats)
+    textmap.bitmaptools = types.SimpleNamespace(fill_region=fakeFillRegion)
+    (fillBitmap, fillRate) = timeRender(textmap.placeText, PixelBitmap, lines, font, repeats)
+    (sliceBitmap, sliceRate) = timeRender(textmap.placeText, FakeBitmap, lines, font, repeats)
+
+    print('font: {}'.format(font.name))
+    print('reference placeText:   {:10.0f} glyphs/s'.format(referenceRate))
+    print('row-run, pixel writes: {:10.0f} glyphs/s  ({:.1f}x)'.format(pixelRate, pixelRate / referenceRate))
+    print('row-run, fill_region:  {:10.0f} glyphs/s  ({:.1f}x)'.format(fillRate, fillRate / referenceRate))
+    print('row-run, slice writes: {:10.0f} glyphs/s  ({:.1f}x)'.format(sliceRate, sliceRate / referenceRate))
+
+    identical = ((reference.buffer == pixelBitmap.buffer) and (reference.buffer == fillBitmap.buffer) and
+                 (reference.buffer == sliceBitmap.buffer))
+    print('byte-identical output: {}'.format(identical))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# bench_refresh.py
+# Host-side check of the dirty rectangle refresh (dirtyrect.renderSession) with a fake display.
+#
+# Places the lines of README.md into a 320x240 bitmap inside a renderSession, pushing the dirty region
+# after each line, and checks that every changed pixel was inside the pushed region.  Reports the pixels
+# pushed, compared with a full-frame push per line and per page.
+#
+# Then checks that flush() refreshes a display without refreshRect (display.refresh) when the render took
+# longer than a frame, and after the page was shown for several seconds, where displayio skips or fails
+# a refresh with its default frame rate arguments.  The fake display follows both CircuitPython 6, where
+# target_frames_per_second must be an int, and CircuitPython 7, where it can be None.
+#
+# Usage: python benchmarks/bench_refresh.py
+
+import sys
+
+from hostfakes import FakeBitmap, FakeDisplay, loadBdfFont, readmeText
+
+import textmap
+from dirtyrect import renderSession
+
+
+def slowFlushRefreshes(font, lineSpacing, circuitPythonVersion):
+    # Returns the number of flushes (of 3) that refreshed the display, with time passing in between
+    bitmap = FakeBitmap(320, 240, 3)
+    display = FakeDisplay(320, 240, circuitPythonVersion)
+    now = [0.0]
+    display.clock = lambda: now[0]
+    session = renderSession(display, 320, 240)
+    session.begin()
+    y = 3
+    for seconds in (0.0, 0.5, 5.0): # a fast line, a render slower than a frame, a page shown for a while
+        now[0] += seconds
+        textmap.placeText(bitmap, 'Line after {} s'.format(seconds), font, lineSpacing, 1, y)
+        try:
+            session.flush()
+        except (RuntimeError, TypeError) as error:
+            print('flush after {} s failed: {}'.format(seconds, error))
+        y += textmap.lineSpacingY(font, lineSpacing)
+    session.end()
+    return display.refreshCount
+
+
+def main():
+    font = loadBdfFont('fonts/BitstreamVeraSans-Roman-16.bdf')
+    lineSpacing = 1.35
+    lines = [line for line in readmeText().split('\n') if line.strip()]
+    bitmap = FakeBitmap(320, 240, 3)
+    display = FakeDisplay(320, 240)
+    session = renderSession(display, 320, 240, refreshRect=display.pushRect)
+
+    session.begin()
+    autoRefreshDuringSession = display.auto_refresh
+    missed = 0
+    y = 3
+    for index, line in enumerate(lines):
+        before = bytes(bitmap.buffer)
+        background = 2 if index % 4 == 3 else 0 # some lines look like code spans
+        textmap.placeText(bitmap, line, font, lineSpacing, 1, y, 1, background)
+        session.flush()
+        (x0, y0, x1, y1) = display.rects[-1] if display.rects else (0, 0, 0, 0)
+        for i in range(len(before)):
+            if before[i] != bitmap.buffer[i]:
+                (px, py) = (i % 320, i // 320)
+                if not (x0 <= px < x1 and y0 <= py < y1):
+                    missed += 1
+        y += textmap.lineSpacingY(font, lineSpacing)
+    session.end()
+
+    fullFrame = 320 * 240
+    print('lines: {}, refreshes: {}'.format(len(lines), display.refreshCount))
+    print('pixels pushed:              {:8d}'.format(display.pixelsPushed))
+    print('full frame per line:        {:8d}'.format(fullFrame * len(lines)))
+    print('full frame once per page:   {:8d}'.format(fullFrame))
+    print('auto_refresh off during session: {}, restored: {}'.format(not autoRefreshDuringSession, display.auto_refresh))
+    print('changed pixels outside the pushed regions: {}'.format(missed))
+    slowRefreshes = []
+    for circuitPythonVersion in (6, 7):
+        slowRefreshes.append(slowFlushRefreshes(font, lineSpacing, circuitPythonVersion))
+        print('flushes with slow renders and idle time that refreshed the display (CircuitPython {}): {} of 3'.format(
+            circuitPythonVersion, slowRefreshes[-1]))
+    if missed or autoRefreshDuringSession or slowRefreshes != [3, 3]:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
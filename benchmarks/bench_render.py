@@ -0,0 +1,129 @@
+# bench_render.py
+# Host-side benchmark suite for the full smackDown render path.
+#
+# Builds a markdownRenderer with the settings in smackDown.py, an in-memory bitmap and display
+# (hostfakes) and the real fonts from fonts/, then times renderLine over each corpus in corpus.corpora(): README.md,
+# heavy emphasis, deep quotes, long URLs that force hard wrapping, code blocks and many headers.  When the
+# text reaches the bottom of the display, the bitmap is cleared and drawing continues from the top.
+#
+# Reports lines/s, glyphs/s (characters drawn, excluding spaces and markdown syntax) and the peak Python
+# memory during the render (tracemalloc, host only).  The results are compared with baseline.json, which
+# depends on the computer: save a new baseline before comparing changes on another machine.  A corpus that
+# is slower than regressionLimit times the baseline is measured again (up to confirmRuns times, keeping the
+# best result) before it is reported as a regression, so a busy moment on the computer is not reported.
+#
+# Usage: python benchmarks/bench_render.py          compare with the saved baseline
+#        python benchmarks/bench_render.py --save   save these results as the baseline
+
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from hostfakes import PixelBitmap, FakeDisplay, repoDirectory
+from corpus import corpora
+from bench_tokenizer import newTokenizer
+
+import smackParse
+from dirtyrect import renderSession
+
+baselineFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+repeats = 5
+sampleTime = 0.25 # seconds
+regressionLimit = 0.8 # slower than 80% of the baseline speed is reported as a regression
+confirmRuns = 3 # measurements of a corpus below the limit, before it is reported
+
+
+def loadRenderer():
+    os.chdir(repoDirectory) # the font files are opened relative to the repository
+    import smackDown
+    display = FakeDisplay(smackDown.displayWidth, smackDown.displayHeight)
+    session = renderSession(display, display.width, display.height)
+    session.begin()
+    bitmap = PixelBitmap(smackDown.displayWidth, smackDown.displayHeight, 3)
+    return smackDown.newRenderer(bitmap, smackDown.openFonts(), session)
+
+
+def glyphCount(lines): # characters drawn for these lines
+    count = 0
+    for token in newTokenizer().tokens(io.StringIO(''.join([line + '\n' for line in lines]))):
+        if token[0] in (smackParse.tokenText, smackParse.tokenCode, smackParse.tokenMatter):
+            count += len(token[1]) - token[1].count(' ')
+    return count
+
+
+def renderLines(renderer, lines):
+    controller = renderer.controller
+    renderer.bitmap.fill(0)
+    renderer.startDocument()
+    for line in lines:
+        renderer.renderLine(line + '\n')
+        if renderer.refreshEveryLine:
+            renderer.session.flush()
+        if controller.getY() > renderer.height: # next page
+            renderer.bitmap.fill(0)
+            controller.setY(controller.startY)
+    renderer.session.flush()
+
+
+def measure(renderer, lines):
+    renderLines(renderer, lines) # load the glyphs and fill the caches
+    best = None
+    for i in range(repeats): # best of several samples, each sample renders the corpus for at least sampleTime
+        passes = 0
+        start = time.perf_counter()
+        while True:
+            renderLines(renderer, lines)
+            passes += 1
+            duration = time.perf_counter() - start
+            if duration >= sampleTime:
+                break
+        duration = duration / passes
+        best = duration if best is None else min(best, duration)
+
+    tracemalloc.start()
+    renderLines(renderer, lines)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'linesPerSecond': len(lines) / best, 'glyphsPerSecond': glyphCount(lines) / best, 'peakBytes': peak}
+
+
+def main():
+    renderer = loadRenderer()
+    baseline = None
+    if os.path.exists(baselineFile) and '--save' not in sys.argv:
+        with open(baselineFile, 'r') as baselineData:
+            baseline = json.load(baselineData)
+
+    results = {}
+    for (name, lines) in corpora():
+        result = measure(renderer, lines)
+        if baseline is not None and name in baseline:
+            limit = regressionLimit * baseline[name]['glyphsPerSecond']
+            runs = 1
+            while result['glyphsPerSecond'] < limit and runs < confirmRuns: # measure again
+                again = measure(renderer, lines)
+                if again['glyphsPerSecond'] > result['glyphsPerSecond']:
+                    result = again
+                runs += 1
+        results[name] = result
+
+    print('{:12s} {:>10s} {:>11s} {:>11s}'.format('corpus', 'lines/s', 'glyphs/s', 'peak bytes'))
+    for (name, result) in results.items():
+        line = '{:12s} {:10.0f} {:11.0f} {:11d}'.format(
+            name, result['linesPerSecond'], result['glyphsPerSecond'], result['peakBytes'])
+        if baseline is not None and name in baseline:
+            ratio = result['glyphsPerSecond'] / baseline[name]['glyphsPerSecond']
+            line += '  {:.2f}x baseline{}'.format(ratio, '  REGRESSION' if ratio < regressionLimit else '')
+        print(line)
+
+    if '--save' in sys.argv:
+        with open(baselineFile, 'w') as baselineData:
+            json.dump(results, baselineData, indent=1, sort_keys=True)
+        print('baseline saved: {}'.format(baselineFile))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+# bench_scroll.py
+# Host-side benchmark for scrolling (scroller.py).
+#
+# Scrolls through a generated document one text row at a time, down to the end and back up, and jumps
+# by other distances.  After every scroll the view is compared with the same rows of the document
+# rendered into one tall bitmap.  Reports the time per scroll step, the markdown lines drawn and laid out
+# per step, and the time to render the whole view, which is what scrolling cost before.  The view is a
+# bitmap with Bitmap.blit (displayio of CircuitPython 7), one with pixel writes only and bitmaptools.blit
+# (CircuitPython 8 and later), the same without bitmaptools (pixel by pixel), and one with slice writes.
+#
+# Usage: python benchmarks/bench_scroll.py
+
+import os
+import sys
+import tempfile
+import time
+import types
+
+from hostfakes import PixelBitmap, PixelOnlyBitmap, FakeBitmap, fakeBlit, repoDirectory
+from corpus import corpora
+
+import scroller
+from scroller import scrollView
+
+showCount = 20 # positions where the whole view is rendered, for the time scrolling took before
+
+def renderTall(smackDown, fonts, fileName, height):
+    # the whole document in one bitmap, the reference for the view
+    tall = smackDown.newRenderer(PixelBitmap(smackDown.displayWidth, height, 3), fonts)
+    tall.startDocument()
+    with open(fileName, 'r') as markdownFile:
+        for line in markdownFile:
+            tall.renderLine(line)
+    return tall.bitmap.buffer
+
+
+def checkView(view, tallBuffer):
+    width = view.renderer.bitmap.width
+    start = view.top * width
+    return bytes(view.renderer.bitmap.buffer) == bytes(tallBuffer[start : start + view.height * width])
+
+
+def main():
+    os.chdir(repoDirectory) # the font files are opened relative to the repository
+    import smackDown
+
+    lines = []
+    for (name, corpusLines) in corpora():
+        lines.extend(corpusLines[:120])
+    (handle, fileName) = tempfile.mkstemp(suffix='.md')
+    with os.fdopen(handle, 'w') as markdownFile:
+        markdownFile.write('\n'.join(lines) + '\n')
+
+    failed = False
+    try:
+        fonts = smackDown.openFonts()
+        blitModule = types.ModuleType('bitmaptools')
+        blitModule.blit = fakeBlit
+        modes = [('PixelBitmap with Bitmap.blit', PixelBitmap, None),
+                 ('PixelOnlyBitmap with bitmaptools.blit', PixelOnlyBitmap, blitModule),
+                 ('PixelOnlyBitmap, pixel by pixel', PixelOnlyBitmap, None),
+                 ('FakeBitmap', FakeBitmap, None)]
+        for (modeName, bitmapType, bitmaptoolsModule) in modes:
+            scroller.bitmaptools = bitmaptoolsModule
+            renderer = smackDown.newRenderer(bitmapType(smackDown.displayWidth, smackDown.displayHeight, 3), fonts)
+            start = time.perf_counter()
+            view = scrollView(renderer, fileName)
+            indexTime = time.perf_counter() - start
+            tallBuffer = renderTall(smackDown, fonts, fileName, view.maxTop + view.height)
+
+            showTimes = []
+            mismatches = 0
+            for i in range(showCount):
+                start = time.perf_counter()
+                view.show(view.maxTop * i // (showCount - 1))
+                showTimes.append(time.perf_counter() - start)
+                if not checkView(view, tallBuffer):
+                    mismatches += 1
+            view.show(0)
+
+            steps = []
+            (drawn, skipped) = (view.linesRendered, view.linesSkipped)
+            for direction in (1, -1):
+                while True:
+                    start = time.perf_counter()
+                    rows = view.scrollLines(direction)
+                    if rows == 0:
+                        break
+                    steps.append(time.perf_counter() - start)
+                    if not checkView(view, tallBuffer):
+                        mismatches += 1
+            drawn = view.linesRendered - drawn
+            skipped = view.linesSkipped - skipped
+
+            for rows in (1, 7, 100, -60, 239, -3, 240, 1000, -1000, 333):
+                view.scrollBy(rows)
+                if not checkView(view, tallBuffer):
+                    mismatches += 1
+
+            steps.sort()
+            print('{}: {} markdown lines, line index {:.0f} ms, {} rows to scroll'.format(
+                modeName, len(view.lines), 1000 * indexTime, view.maxTop))
+            print('    render the whole view:  mean {:.2f} ms over {} positions'.format(1000 * sum(showTimes) / showCount, showCount))
+            print('    scroll by one text row: {} steps, mean {:.2f} ms, max {:.2f} ms, {:.2f} lines drawn and {:.2f} laid out per step'.format(
+                len(steps), 1000 * sum(steps) / len(steps), 1000 * steps[-1], drawn / len(steps), skipped / len(steps)))
+            print('    views different from the tall render: {}'.format(mismatches))
+            failed = failed or mismatches > 0
+    finally:
+        os.remove(fileName)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
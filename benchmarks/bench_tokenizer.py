@@ -0,0 +1,54 @@
+# bench_tokenizer.py
+# Host-side benchmark for the markdownTokenizer (smackParse.py), the parsing half of smackDown.
+#
+# Streams the markdown corpus through the tokenizer, without any fonts or display, and reports lines
+# per second and tokens per second, plus the count of each token kind.
+#
+# Usage: python benchmarks/bench_tokenizer.py
+
+import contextlib
+import io
+import time
+
+import hostfakes
+from corpus import markdownLines
+
+import smackParse
+from smackParse import fontController, markdownTokenizer, buildBodyFontIndex
+
+tokenNames = {smackParse.tokenText: 'text', smackParse.tokenCode: 'code', smackParse.tokenBreak: 'break',
+              smackParse.tokenSection: 'section', smackParse.tokenHeader: 'header', smackParse.tokenMatter: 'matter'}
+
+
+def newTokenizer():
+    # same font indexes as smackDown.py
+    bodyFontIndex = buildBodyFontIndex(1, 2, 3, 4, 5)
+    return markdownTokenizer(fontController(startX=1, startY=3, sectionGap=6, lineSpacing=1.35, indexMainBody=1),
+                             [0, 2, 3, 1], 1, bodyFontIndex)
+
+
+def main():
+    lines = [line + '\n' for line in markdownLines()]
+    repeats = 10
+    counts = {}
+
+    with contextlib.redirect_stdout(io.StringIO()): # any debug output enabled in tracelog
+        for token in newTokenizer().tokens(io.StringIO(''.join(lines))):
+            counts[token[0]] = counts.get(token[0], 0) + 1
+
+        tokenizer = newTokenizer()
+        start = time.perf_counter()
+        tokenCount = 0
+        for i in range(repeats):
+            for token in tokenizer.tokens(io.StringIO(''.join(lines))):
+                tokenCount += 1
+        duration = time.perf_counter() - start
+
+    print('corpus: {} lines'.format(len(lines)))
+    print('tokens per pass: {}'.format(', '.join(
+        ['{}: {}'.format(tokenNames[kind], counts[kind]) for kind in sorted(counts)])))
+    print('tokenizer: {:10.0f} lines/s  {:10.0f} tokens/s'.format(len(lines) * repeats / duration, tokenCount / duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# bench_tracing.py
+# Host-side benchmark for the debug output levels (tracelog.py).
+#
+# Renders the pages of the markdown corpus with markdownRenderer.renderPage (through smackDown.newRenderer)
+# at each trace level, with the messages printed to a buffer standing in for the serial console, with trace
+# messages kept in a ring buffer, and with the unconditional print calls that were used before.  Reports the
+# render time per page and the messages written.  Printing to a buffer is much faster than a serial console,
+# so the time to send the printed bytes at serialBaud is also given.
+#
+# Usage: python benchmarks/bench_tracing.py
+
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from hostfakes import PixelBitmap, repoDirectory
+from corpus import markdownLines
+
+import tracelog
+import smackParse
+import smackRender
+import textmap
+
+repeats = 3
+serialBaud = 115200 # 10 bits per byte
+
+
+def printAlways(messageLevel, message, *args): # the old behavior: every message is formatted and printed
+    print(message.format(*args))
+
+
+def setLog(function): # the log function called by the renderer modules
+    smackParse.log = function
+    smackRender.log = function
+    textmap.log = function
+
+
+def timePages(renderer, fileName, pages):
+    # Returns the best time to render all the pages, over the repeats
+    best = None
+    for i in range(repeats):
+        start = time.perf_counter()
+        for pageNumber in range(len(pages)):
+            renderer.renderPage(fileName, pages, pageNumber)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+def main():
+    os.chdir(repoDirectory) # the font files are opened relative to the repository
+    import smackDown
+
+    (handle, fileName) = tempfile.mkstemp(suffix='.md')
+    with os.fdopen(handle, 'w') as markdownFile:
+        markdownFile.write('\n'.join(markdownLines()) + '\n')
+
+    renderer = smackDown.newRenderer(PixelBitmap(smackDown.displayWidth, smackDown.displayHeight, 3),
+                                     smackDown.openFonts())
+    results = []
+    try:
+        tracelog.setLevel(tracelog.levelOff)
+        pages = renderer.openPageIndex(fileName)
+        timePages(renderer, fileName, pages) # loads the fonts and glyphs
+
+        for (name, level) in (('tracing off', tracelog.levelOff),
+                              ('errors', tracelog.levelError),
+                              ('info (default)', tracelog.levelInfo),
+                              ('debug to serial', tracelog.levelDebug),
+                              ('trace to serial', tracelog.levelTrace)):
+            tracelog.setLevel(level)
+            serial = io.StringIO()
+            with contextlib.redirect_stdout(serial):
+                duration = timePages(renderer, fileName, pages)
+            results.append((name, duration, serial.getvalue()))
+
+        tracelog.useRingBuffer(256)
+        duration = timePages(renderer, fileName, pages)
+        results.append(('trace to ring buffer', duration, ''))
+        tracelog.useSerial()
+
+        setLog(printAlways) # print every message, as before tracelog
+        serial = io.StringIO()
+        with contextlib.redirect_stdout(serial):
+            duration = timePages(renderer, fileName, pages)
+        results.append(('print every message', duration, serial.getvalue()))
+        setLog(tracelog.log)
+    finally:
+        tracelog.setLevel(tracelog.levelInfo)
+        os.remove(fileName)
+        if os.path.exists(fileName + '.idx'):
+            os.remove(fileName + '.idx')
+
+    pageCount = len(pages)
+    offTime = results[0][1]
+    print('corpus: {} pages, best of {} renders'.format(pageCount, repeats))
+    for (name, duration, printed) in results:
+        serialMs = 1000 * 10 * len(printed) / repeats / serialBaud / pageCount
+        print('{:22s} {:7.1f} ms per page  ({:.2f}x the time with tracing off), {:5d} lines printed, {:7.1f} ms per page on the serial console'.format(
+            name, 1000 * duration / pageCount, duration / offTime, printed.count('\n') // repeats, serialMs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# corpus.py
+# Markdown lines used by the host-side benchmarks: README.md plus generated lines with heavy use of
+# font modifiers, code spans and code blocks, and the corpora used by bench_render.py.
+
+import random
+
+from hostfakes import readmeText
+
+words = ['the', 'and', 'display', 'bitmap', 'font', 'render', 'memory', 'CircuitPython', 'glyph',
+         'line', 'word', 'wrap', 'page', "don't", 'it\'s', 'snake_case_name', '2*3', 'a_b']
+modifiers = ['*', '_', '**', '__', '***', '___', '`']
+
+
+def emphasisLines(count=200, seed=1):
+    generator = random.Random(seed)
+    lines = []
+    for i in range(count):
+        lineWords = []
+        for j in range(generator.randint(4, 16)):
+            word = generator.choice(words)
+            if generator.random() < 0.3:
+                modifier = generator.choice(modifiers)
+                word = modifier + word + modifier
+            lineWords.append(word)
+        if i % 25 == 0:
+            lines.extend(['```', 'for i in range(10): print(i*2, "**")', '```'])
+        if i % 10 == 0:
+            lines.append('') # new paragraph, resets the modifiers
+        lines.append(' '.join(lineWords))
+    return lines
+
+
+def markdownLines():
+    return readmeText().split('\n') + emphasisLines()
+
+
+def deepQuoteLines(count=120, seed=2):
+    # nested block quotes and indented lists, the left matter is drawn again on every wrapped line
+    generator = random.Random(seed)
+    lines = []
+    for i in range(count):
+        text = ' '.join([generator.choice(words) for j in range(generator.randint(8, 24))])
+        depth = i % 6
+        if i % 3 == 2:
+            lines.append('\t' * (depth % 3) + '- ' + text)
+        else:
+            lines.append('> ' * (depth + 1) + text)
+        if i % 12 == 11:
+            lines.append('')
+    return lines
+
+
+def longUrlLines(count=60, seed=3):
+    # tokens wider than the display, drawn with character by character hard wrapping
+    generator = random.Random(seed)
+    lines = []
+    for i in range(count):
+        path = '/'.join([generator.choice(words) for j in range(generator.randint(6, 14))])
+        url = 'https://github.com/kmatch98/smackdown/blob/main/{}?line={}'.format(path, i)
+        lines.append('See {} for the details'.format(url))
+        if i % 5 == 4:
+            lines.append('')
+    return lines
+
+
+def codeBlockLines(count=30, seed=4):
+    generator = random.Random(seed)
+    lines = []
+    for i in range(count):
+        lines.append('```')
+        for j in range(generator.randint(3, 10)):
+            lines.append('    ' * generator.randint(0, 3) + 'value_{} = bitmap[{} * width + x]  # {}'.format(
+                j, generator.randint(0, 99), generator.choice(words)))
+        lines.append('```')
+        lines.append('Some text with `inline code` after the block.')
+        lines.append('')
+    return lines
+
+
+def headerLines(count=100, seed=5):
+    generator = random.Random(seed)
+    lines = []
+    for i in range(count):
+        lines.append('#' * generator.randint(1, 5) + ' ' + ' '.join(
+            [generator.choice(words) for j in range(generator.randint(1, 5))]))
+        lines.append(' '.join([generator.choice(words) for j in range(generator.randint(3, 12))]))
+        lines.append('')
+    return lines
+
+
+def corpora(): # name -> lines, for the benchmark suite
+    return [('readme', readmeText().split('\n')),
+            ('emphasis', emphasisLines()),
+            ('deepQuotes', deepQuoteLines()),
+            ('longUrls', longUrlLines()),
+            ('codeBlocks', codeBlockLines()),
+            ('headers', headerLines())]
@@ -0,0 +1,345 @@
+# hostfakes.py
+# Host-side stand-ins used by the benchmarks in this directory, so textmap can run on desktop CPython.
+#
+# FakeBitmap: bytearray-backed replacement for displayio.Bitmap, supports pixel and slice writes
+# PixelBitmap: same, but only supports pixel writes and blit (like displayio.Bitmap of CircuitPython 7)
+# PixelOnlyBitmap: only supports pixel writes (like displayio.Bitmap of CircuitPython 8 and later, where
+#   blit moved to bitmaptools.blit)
+# loadBdfFont: minimal BDF reader with the same get_glyph interface as adafruit_bitmap_font
+# fakeArrayblit, fakeFillRegion, fakeBlit: the bitmaptools functions, for PixelBitmaps
+# installFakeHardware: in-memory board, displayio, bitmaptools and adafruit_ili9341 modules, so
+#   smackDown.main() can run on a desktop computer
+
+import gc
+import os
+import sys
+import time
+import types
+
+repoDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if repoDirectory not in sys.path:
+    sys.path.insert(0, repoDirectory)
+
+fontDirectory = os.path.join(repoDirectory, 'fonts')
+
+
+class PixelOnlyBitmap:
+    def __init__(self, width, height, value_count=2):
+        self.width = width
+        self.height = height
+        self.value_count = value_count
+        self.buffer = bytearray(width * height)
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            (x, y) = index
+            index = y * self.width + x
+        elif not isinstance(index, int):
+            raise TypeError('{} only supports pixel indexes'.format(type(self).__name__))
+        return self.buffer[index]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, tuple):
+            (x, y) = index
+            index = y * self.width + x
+        elif not isinstance(index, int):
+            raise TypeError('{} only supports pixel indexes'.format(type(self).__name__))
+        self.buffer[index] = value
+
+    def fill(self, value):
+        self.buffer[:] = bytes((value,)) * len(self.buffer)
+
+
+class PixelBitmap(PixelOnlyBitmap):
+    def blit(self, x, y, source_bitmap, x1=0, y1=0, x2=None, y2=None):
+        # copies the region (x1, y1)-(x2, y2) of source_bitmap to (x, y), the source may be this bitmap
+        fakeBlit(self, source_bitmap, x, y, x1=x1, y1=y1, x2=x2, y2=y2)
+
+
+class FakeBitmap(PixelBitmap):
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.buffer[index]
+        return PixelBitmap.__getitem__(self, index)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            self.buffer[index] = value
+        else:
+            PixelBitmap.__setitem__(self, index, value)
+
+
+class Glyph:
+    # matches the fields of adafruit_bitmap_font Glyph
+    __slots__ = ('bitmap', 'tile_index', 'width', 'height', 'dx', 'dy', 'shift_x', 'shift_y')
+
+    def __init__(self, bitmap, tile_index, width, height, dx, dy, shift_x, shift_y):
+        self.bitmap = bitmap
+        self.tile_index = tile_index
+        self.width = width
+        self.height = height
+        self.dx = dx
+        self.dy = dy
+        self.shift_x = shift_x
+        self.shift_y = shift_y
+
+
+class BdfFont:
+    # Behaves like adafruit_bitmap_font's BDF font: opening reads only the header, load_glyphs scans the
+    # file once for a set of codepoints and get_glyph loads a missing glyph with another scan.
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.name = os.path.basename(fileName)
+        self._glyphs = {}
+        self.scans = 0 # number of passes over the file
+        with open(fileName, 'r') as bdfFile:
+            for line in bdfFile:
+                if line.startswith('FONTBOUNDINGBOX'):
+                    self._boundingBox = tuple([int(value) for value in line.split()[1:5]])
+                elif line.startswith('CHARS '):
+                    break
+
+    def get_bounding_box(self):
+        return self._boundingBox
+
+    def get_glyph(self, code_point):
+        if code_point not in self._glyphs:
+            self.load_glyphs(code_point)
+        return self._glyphs.get(code_point)
+
+    def load_glyphs(self, code_points):
+        if isinstance(code_points, int):
+            remaining = {code_points}
+        elif isinstance(code_points, str):
+            remaining = {ord(char) for char in code_points}
+        else:
+            remaining = set(code_points)
+        remaining = {codePoint for codePoint in remaining if codePoint not in self._glyphs}
+        if not remaining:
+            return
+        self.scans += 1
+        with open(self.fileName, 'r') as bdfFile:
+            for (codePoint, glyph) in readBdfGlyphs(bdfFile, remaining):
+                self._glyphs[codePoint] = glyph
+                remaining.discard(codePoint)
+                if not remaining:
+                    break
+        for codePoint in remaining: # not in this font
+            self._glyphs[codePoint] = None
+
+
+def readBdfGlyphs(bdfFile, codePoints=None):
+    # Yields (codePoint, Glyph) for the glyphs in codePoints (all glyphs if None) from an open BDF file.
+    codePoint = None
+    y = None # row counter, only set inside a BITMAP section
+    for line in bdfFile:
+        if line.startswith('ENCODING'):
+            codePoint = int(line.split()[1])
+            if codePoints is not None and codePoint not in codePoints:
+                codePoint = None
+        elif codePoint is None:
+            continue
+        elif line.startswith('DWIDTH'):
+            (shiftX, shiftY) = [int(value) for value in line.split()[1:3]]
+        elif line.startswith('BBX'):
+            (width, height, dx, dy) = [int(value) for value in line.split()[1:5]]
+        elif line.startswith('BITMAP'):
+            bitmap = PixelBitmap(width, height, 2)
+            y = 0
+        elif line.startswith('ENDCHAR'):
+            yield (codePoint, Glyph(bitmap, 0, width, height, dx, dy, shiftX, shiftY))
+            codePoint = None
+            y = None
+        elif y is not None:
+            if y < height:
+                bits = int(line.strip(), 16)
+                bitCount = 4 * len(line.strip())
+                for x in range(width):
+                    bitmap[y * width + x] = (bits >> (bitCount - 1 - x)) & 1
+                y += 1
+
+
+def loadBdfFont(fileName):
+    # Same role as adafruit_bitmap_font.bitmap_font.load_font
+    if not os.path.isabs(fileName):
+        fileName = os.path.join(repoDirectory, fileName)
+    return BdfFont(fileName)
+
+
+def readmeText():
+    with open(os.path.join(repoDirectory, 'README.md'), 'r') as readme:
+        return readme.read()
+
+
+class FakeDisplay:
+    # Counts refreshes and pushed pixels instead of driving a display.
+    # refresh() pushes the full frame, pushRect(x0, y0, x1, y1) pushes a window (see dirtyrect.renderSession)
+    #
+    # refresh() follows displayio.Display.refresh of CircuitPython 6: with auto_refresh off, the first call
+    # always refreshes.  After that a call is skipped (returns False) if it comes later than
+    # 1/target_frames_per_second after the previous call, and raises RuntimeError if the last refresh was
+    # more than 1/minimum_frames_per_second ago.  minimum_frames_per_second=0 turns off the second check.
+    # target_frames_per_second must be an int in CircuitPython 6 (None raises TypeError), with
+    # circuitPythonVersion=7 None turns off the first check.  clock returns the time in seconds, a test
+    # can replace it to let time pass.
+    def __init__(self, width=320, height=240, circuitPythonVersion=6):
+        self.width = width
+        self.height = height
+        self.circuitPythonVersion = circuitPythonVersion
+        self._autoRefresh = True
+        self._firstManualRefresh = False
+        self.refreshCount = 0
+        self.skippedRefreshes = 0
+        self.pixelsPushed = 0
+        self.rects = []
+        self.clock = time.monotonic
+        self._lastRefresh = self._lastRefreshCall = self.clock()
+
+    @property
+    def auto_refresh(self):
+        return self._autoRefresh
+
+    @auto_refresh.setter
+    def auto_refresh(self, value):
+        self._autoRefresh = value
+        self._firstManualRefresh = not value
+
+    def refresh(self, target_frames_per_second=60, minimum_frames_per_second=1):
+        if target_frames_per_second is None and self.circuitPythonVersion < 7:
+            raise TypeError("can't convert NoneType to int")
+        now = self.clock()
+        if not self._autoRefresh and not self._firstManualRefresh:
+            if minimum_frames_per_second > 0 and now - self._lastRefresh > 1 / minimum_frames_per_second:
+                raise RuntimeError('Below minimum frame rate')
+            sinceLastCall = now - self._lastRefreshCall
+            self._lastRefreshCall = now
+            if target_frames_per_second is not None and sinceLastCall > 1 / target_frames_per_second:
+                self.skippedRefreshes += 1
+                return False # skipped to catch up
+        self._firstManualRefresh = False
+        self._lastRefresh = self._lastRefreshCall = now
+        self.refreshCount += 1
+        self.pixelsPushed += self.width * self.height
+        return True
+
+    def pushRect(self, x0, y0, x1, y1):
+        self.refreshCount += 1
+        self.pixelsPushed += (x1 - x0) * (y1 - y0)
+        self.rects.append((x0, y0, x1, y1))
+
+
+class FakePalette:
+    def __init__(self, color_count):
+        self.colors = [0] * color_count
+
+    def __len__(self):
+        return len(self.colors)
+
+    def __getitem__(self, index):
+        return self.colors[index]
+
+    def __setitem__(self, index, color):
+        self.colors[index] = color
+
+
+class FakeILI9341(FakeDisplay):
+    def __init__(self, display_bus, width=320, height=240, rotation=0, auto_refresh=True, **kwargs):
+        FakeDisplay.__init__(self, width, height)
+        self.auto_refresh = auto_refresh
+        self.root_group = None
+
+    def show(self, group):
+        self.root_group = group
+
+
+class FakeSPI:
+    frequency = 32000000
+
+    def try_lock(self):
+        return True
+
+    def configure(self, **kwargs):
+        pass
+
+    def unlock(self):
+        pass
+
+
+class FakeGroup(list):
+    def __init__(self, max_size=None, **kwargs):
+        list.__init__(self)
+
+
+def _fakeObject(*args, **kwargs):
+    return types.SimpleNamespace(args=args, kwargs=kwargs)
+
+
+def _hostMemFree():
+    # gc.mem_free is CircuitPython only.  On the host, report the memory below a nominal heap size that is
+    # not traced by tracemalloc (0 if tracemalloc is not running).
+    import tracemalloc
+    if not tracemalloc.is_tracing():
+        return 0
+    return 8000000 - tracemalloc.get_traced_memory()[0]
+
+
+def fakeArrayblit(bitmap, data, x1=0, y1=0, x2=None, y2=None, skip_index=None):
+    # bitmaptools.arrayblit: writes the pixel values in data into the rectangle (x1, y1)-(x2, y2), row by row
+    if x2 is None:
+        x2 = bitmap.width
+    if y2 is None:
+        y2 = bitmap.height
+    rowWidth = x2 - x1
+    for y in range(y1, y2):
+        rowData = data[(y - y1) * rowWidth : (y - y1 + 1) * rowWidth]
+        start = y * bitmap.width + x1
+        if skip_index is None:
+            bitmap.buffer[start : start + rowWidth] = rowData
+        else:
+            for x in range(rowWidth):
+                if rowData[x] != skip_index:
+                    bitmap.buffer[start + x] = rowData[x]
+
+
+def fakeBlit(dest_bitmap, source_bitmap, x, y, x1=0, y1=0, x2=None, y2=None, skip_source_index=None,
+             skip_dest_index=None):
+    # bitmaptools.blit: copies the region (x1, y1)-(x2, y2) of source_bitmap to (x, y), the source may be
+    # the destination bitmap (skip indexes are not used by smackDown)
+    if x2 is None:
+        x2 = source_bitmap.width
+    if y2 is None:
+        y2 = source_bitmap.height
+    rows = [bytes(source_bitmap.buffer[row * source_bitmap.width + x1 : row * source_bitmap.width + x2])
+            for row in range(y1, y2)]
+    for i in range(len(rows)):
+        start = (y + i) * dest_bitmap.width + x
+        dest_bitmap.buffer[start : start + len(rows[i])] = rows[i]
+
+
+def fakeFillRegion(bitmap, x1, y1, x2, y2, value):
+    # bitmaptools.fill_region: fills the rectangle (x1, y1) up to, but not including, (x2, y2) with value
+    for y in range(y1, y2):
+        start = y * bitmap.width
+        bitmap.buffer[start + x1 : start + x2] = bytes((value,)) * (x2 - x1)
+
+
+def installFakeHardware():
+    # Registers stand-ins for the CircuitPython hardware modules used by smackDown.py.  Bitmaps are
+    # PixelBitmaps (pixel writes only, like displayio.Bitmap) and the display counts pushed pixels.
+    def module(name, **attributes):
+        fake = types.ModuleType(name)
+        fake.__dict__.update(attributes)
+        sys.modules[name] = fake
+        return fake
+
+    module('board', SPI=FakeSPI, D9=9, D10=10, D11=11, D12=12)
+    module('displayio', Bitmap=PixelBitmap, Palette=FakePalette, Group=FakeGroup, TileGrid=_fakeObject,
+           FourWire=_fakeObject, release_displays=lambda: None)
+    module('adafruit_ili9341', ILI9341=FakeILI9341)
+    module('bitmaptools', arrayblit=fakeArrayblit, fill_region=fakeFillRegion, blit=fakeBlit)
+    for name in ('busio', 'terminalio', 'fontio'):
+        module(name)
+    labelModule = module('adafruit_display_text.label')
+    module('adafruit_display_text', label=labelModule)
+    if not hasattr(gc, 'mem_free'):
+        gc.mem_free = _hostMemFree
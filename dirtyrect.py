@@ -0,0 +1,90 @@
+# dirtyrect.py
+# Kevin Matocha - Copyright (C) 2020
+# Written for CircuitPython
+#
+# Dirty rectangle tracking for rendering a page of text.
+#
+# With display.auto_refresh=True the display can refresh in the middle of a page, while the bitmap is
+# only partly drawn, and pushes the display again and again.  A renderSession turns off auto_refresh,
+# collects the union of the rectangles written by placeText (see textmap.setDirtyTracker) and by any
+# background fills, and pushes the display once when flush() is called, at the end of a line or a page.
+#
+# Rectangles are (x0, y0, x1, y1) with x1 and y1 exclusive.
+
+import textmap
+
+
+class renderSession:
+    def __init__(self, display, width, height, refreshRect=None):
+        # display: the display to refresh, its auto_refresh is turned off while the session is active
+        # width, height: size of the bitmap shown on the display, dirty rectangles are clipped to it
+        # refreshRect: optional function called with (x0, y0, x1, y1) instead of display.refresh(), for
+        #     displays that can push a window of the screen (and for testing on a host)
+        self.display = display
+        self.width = width
+        self.height = height
+        self.refreshRect = refreshRect
+        self.dirty = None # union of the dirty rectangles since the last flush
+        self.refreshCount = 0
+        self.pixelsPushed = 0
+        self._autoRefresh = None
+
+    def begin(self):
+        # start collecting dirty rectangles from placeText, and stop automatic refreshes
+        self._autoRefresh = self.display.auto_refresh
+        self.display.auto_refresh = False
+        textmap.setDirtyTracker(self)
+
+    def end(self):
+        self.flush()
+        textmap.setDirtyTracker(None)
+        if self._autoRefresh is not None:
+            self.display.auto_refresh = self._autoRefresh
+
+    def markDirty(self, x0, y0, x1, y1):
+        # add a rectangle to the dirty region, clipped to the bitmap
+        x0 = max(x0, 0)
+        y0 = max(y0, 0)
+        x1 = min(x1, self.width)
+        y1 = min(y1, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        dirty = self.dirty
+        if dirty is None:
+            self.dirty = [x0, y0, x1, y1]
+        else:
+            if x0 < dirty[0]:
+                dirty[0] = x0
+            if y0 < dirty[1]:
+                dirty[1] = y0
+            if x1 > dirty[2]:
+                dirty[2] = x1
+            if y1 > dirty[3]:
+                dirty[3] = y1
+
+    def markAll(self): # the whole bitmap changed, such as after bitmap.fill
+        self.markDirty(0, 0, self.width, self.height)
+
+    def flush(self):
+        # push the dirty region to the display, if anything changed
+        dirty = self.dirty
+        if dirty is None:
+            return
+        self.dirty = None
+        self.refreshCount += 1
+        self.pixelsPushed += (dirty[2] - dirty[0]) * (dirty[3] - dirty[1])
+        if self.refreshRect is not None:
+            self.refreshRect(dirty[0], dirty[1], dirty[2], dirty[3])
+        else:
+            # displayio only pushes the areas of the bitmap that changed.  With the default arguments,
+            # displayio skips a refresh that comes late for its 60 frames per second target, and raises
+            # "Below minimum frame rate" more than one second after the last refresh (after a slow render
+            # or while a page is shown).  A flush always refreshes.
+            self._refreshDisplay()
+
+    def _refreshDisplay(self):
+        try: # CircuitPython 7 and later: target_frames_per_second=None never skips a refresh
+            self.display.refresh(target_frames_per_second=None, minimum_frames_per_second=0)
+        except TypeError: # CircuitPython 6 only takes an int, a late refresh is skipped and returns False
+            if not self.display.refresh(target_frames_per_second=60, minimum_frames_per_second=0):
+                self.display.refresh(target_frames_per_second=60, minimum_frames_per_second=0)
@@ -0,0 +1,139 @@
+# fontregistry.py
+# Kevin Matocha - Copyright (C) 2020
+# Written for CircuitPython
+#
+# Lazy font loading for smackDown.
+#
+# Loading every font and calling load_glyphs for a fixed set of characters at startup is slow and uses
+# RAM for fonts that a document may never use (such as italic or code fonts).  The fontRegistry holds a
+# lazyFont for each font file.  A lazyFont only opens its file on the first real use, and loads each
+# glyph the first time it is requested.
+#
+# preload: codepoints loaded in a single pass over the file when a font is opened.  Fonts such as
+# adafruit_bitmap_font's BDF reader scan the file for every missing glyph, so the common characters are
+# loaded together and the rest one by one as they are found.  There is no preload with maxGlyphs.
+#
+# maxGlyphs: limits the number of glyphs held in memory for each font.  When the limit is reached, the
+# least recently used glyph is dropped and is loaded again from the file if it is needed later.  Its
+# row runs are dropped from the cache of textmap.glyphRuns too, so nothing keeps the glyph alive.
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    OrderedDict = dict
+
+from textmap import dropGlyphRuns
+
+
+class lazyFont:
+    def __init__(self, fileName, loader, maxGlyphs=None, preload=None):
+        # fileName: the font file, it is not opened until the first glyph is requested
+        # loader: opens the font file, for example adafruit_bitmap_font.bitmap_font.load_font
+        # maxGlyphs: maximum number of resident glyphs, None for no limit
+        # preload: codepoints to load when the font is opened (bytes, str or a list of codepoints)
+        self.fileName = fileName
+        self._loader = loader
+        self._preload = preload
+        self._font = None
+        self._glyphs = OrderedDict() # codepoint -> glyph, least recently used first
+        self._missing = set() # codepoints that are not in the font
+        self.maxGlyphs = maxGlyphs
+        self.glyphLoads = 0
+        self.evictions = 0
+
+    def isOpen(self):
+        return self._font is not None
+
+    def _open(self):
+        if self._font is None:
+            self._font = self._loader(self.fileName)
+            if self._preload and self.maxGlyphs is None:
+                # one pass over the file.  With maxGlyphs the glyphs are loaded one by one instead, a
+                # preload would stay in the font's own cache without counting against the limit.
+                self._font.load_glyphs(self._preload)
+        return self._font
+
+    def get_glyph(self, codePoint):
+        glyph = self._glyphs.pop(codePoint, None)
+        if glyph is None:
+            if codePoint in self._missing:
+                return None
+            glyph = self._loadGlyph(codePoint)
+            if glyph is None:
+                self._missing.add(codePoint)
+                return None
+        self._glyphs[codePoint] = glyph # (re)insert as the most recently used
+        return glyph
+
+    def _loadGlyph(self, codePoint):
+        font = self._open()
+        glyph = font.get_glyph(codePoint) # the font loads the glyph from its file on a miss
+        self.glyphLoads += 1
+        if self.maxGlyphs is not None:
+            # The font keeps its own cache of loaded glyphs (adafruit_bitmap_font uses the _glyphs
+            # dictionary).  The glyph is removed from it, so dropping it here frees the memory.
+            fontGlyphs = getattr(font, '_glyphs', None)
+            if isinstance(fontGlyphs, dict):
+                fontGlyphs.pop(codePoint, None)
+            while len(self._glyphs) >= self.maxGlyphs > 0:
+                dropGlyphRuns(self._glyphs.pop(next(iter(self._glyphs)))) # evict the least recently used
+                self.evictions += 1
+        return glyph
+
+    def load_glyphs(self, codePoints):
+        # Prefetch glyphs, for example the characters of the first page.  A single pass over the file
+        # is used if the underlying font supports it.
+        if isinstance(codePoints, int):
+            codePoints = (codePoints,)
+        wanted = []
+        for codePoint in codePoints:
+            if isinstance(codePoint, str):
+                codePoint = ord(codePoint)
+            if codePoint not in self._glyphs and codePoint not in self._missing:
+                wanted.append(codePoint)
+        if wanted:
+            if self.maxGlyphs is None:
+                self._open().load_glyphs(wanted)
+            for codePoint in wanted:
+                self.get_glyph(codePoint)
+
+    def get_bounding_box(self):
+        return self._open().get_bounding_box()
+
+    def residentGlyphs(self):
+        return len(self._glyphs)
+
+
+class fontRegistry:
+    # The fonts used by a document, by index (same order as the list of font files).  Fonts are only
+    # opened when first used.
+
+    def __init__(self, fileNames, loader, maxGlyphs=None, preload=None):
+        self._loader = loader
+        self._maxGlyphs = maxGlyphs
+        self._preload = preload
+        self.fonts = []
+        for fileName in fileNames:
+            self.addFont(fileName)
+
+    def addFont(self, fileName): # adds a font (not opened yet), returns its index
+        self.fonts.append(lazyFont(fileName, self._loader, self._maxGlyphs, self._preload))
+        return len(self.fonts) - 1
+
+    def __getitem__(self, index):
+        return self.fonts[index]
+
+    def __len__(self):
+        return len(self.fonts)
+
+    def index(self, font):
+        return self.fonts.index(font)
+
+    def stats(self): # returns (fonts opened, glyphs resident, glyphs loaded, glyphs evicted)
+        opened = resident = loads = evictions = 0
+        for font in self.fonts:
+            opened += font.isOpen()
+            resident += font.residentGlyphs()
+            loads += font.glyphLoads
+            evictions += font.evictions
+        return (opened, resident, loads, evictions)
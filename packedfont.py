@@ -0,0 +1,204 @@
+# packedfont.py
+# Kevin Matocha - Copyright (C) 2020
+# Written for CircuitPython
+#
+# Packed binary font format, with a converter from BDF.
+#
+# A BDF font is text and each loaded glyph gets its own Bitmap object.  A packed font file holds a
+# header, a metrics table and the 1-bit glyph bitmaps.  By default only the header and the metrics table
+# are read into RAM, and the packed rows of each glyph are read from the file when the glyph is loaded,
+# so the glyphs that a document never uses (most of a font with accents and symbols) take no RAM.  With
+# inMemory=True the whole file is read into one buffer.  Glyph bitmaps are views on the packed bytes, so
+# no Bitmap is allocated per glyph.
+#
+# File format (little endian):
+#   header: 'PKF1', glyph count (H), FONTBOUNDINGBOX width, height, x offset, y offset (4 h),
+#           FONT_ASCENT (h), FONT_DESCENT (h)
+#   metrics: glyph count records, sorted by codepoint:
+#           codepoint (I), shift_x (h), width (h), height (h), dx (h), dy (h), bitmap offset (I)
+#   bitmaps: for each glyph, height rows of (width + 7) // 8 bytes, most significant bit on the left.
+#           The bitmap offset is counted from the start of the file.
+#
+# The loader matches the get_glyph interface of adafruit_bitmap_font, so packed fonts can be used
+# anywhere a BDF font is used.
+#
+# Converting fonts (on a computer): python packedfont.py fonts/*.bdf
+#   writes fonts/<name>.pkf next to each BDF file
+
+import struct
+
+try:
+    from fontio import Glyph
+except ImportError: # not running on CircuitPython
+    from collections import namedtuple
+    Glyph = namedtuple('Glyph', ['bitmap', 'tile_index', 'width', 'height', 'dx', 'dy', 'shift_x', 'shift_y'])
+
+packedSuffix = '.pkf'
+packedMagic = b'PKF1'
+headerFormat = '<4sHhhhhhh'
+metricsFormat = '<IhhhhhI'
+headerSize = struct.calcsize(headerFormat)
+metricsSize = struct.calcsize(metricsFormat)
+
+
+class packedGlyphBitmap:
+    # Read-only view of one packed glyph bitmap, indexed like a Bitmap: bitmap[y * width + x] or bitmap[x, y]
+    def __init__(self, data, offset, width, height):
+        self._data = data
+        self._offset = offset
+        self.width = width
+        self.height = height
+        self._rowBytes = (width + 7) // 8
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            (x, y) = index
+        else:
+            y = index // self.width
+            x = index - y * self.width
+        byte = self._data[self._offset + y * self._rowBytes + (x >> 3)]
+        return (byte >> (7 - (x & 7))) & 1
+
+    def row(self, y): # the packed bytes of one row
+        start = self._offset + y * self._rowBytes
+        return self._data[start : start + self._rowBytes]
+
+
+class packedFont:
+    def __init__(self, fileName, inMemory=False):
+        # inMemory: read the whole file into RAM, glyphs load without reading the file but every glyph of
+        # the font is resident.  If False, only the header and the metrics table are held in RAM and each
+        # glyph bitmap is read from the file when the glyph is loaded.
+        self.fileName = fileName
+        self._glyphs = {} # loaded glyphs, codepoint -> glyph (None if the font does not have it)
+        self._file = None
+        with open(fileName, 'rb') as fontFile:
+            if inMemory:
+                self._data = memoryview(bytearray(fontFile.read()))
+                header = self._data[0:headerSize]
+            else:
+                self._data = None
+                header = fontFile.read(headerSize)
+            values = struct.unpack(headerFormat, header)
+            if values[0] != packedMagic:
+                raise ValueError('Not a packed font file: {}'.format(fileName))
+            self._count = values[1]
+            if inMemory:
+                self._metrics = self._data[headerSize : headerSize + self._count * metricsSize]
+            else:
+                self._metrics = memoryview(bytearray(fontFile.read(self._count * metricsSize)))
+        self._boundingBox = tuple(values[2:6])
+        self.ascent = values[6]
+        self.descent = values[7]
+
+    def get_bounding_box(self):
+        return self._boundingBox
+
+    def _findRecord(self, codePoint): # binary search in the metrics table, None if not found
+        metrics = self._metrics
+        low = 0
+        high = self._count
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from('<I', metrics, middle * metricsSize)[0] < codePoint:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count:
+            record = struct.unpack_from(metricsFormat, metrics, low * metricsSize)
+            if record[0] == codePoint:
+                return record
+        return None
+
+    def get_glyph(self, codePoint):
+        if codePoint in self._glyphs:
+            return self._glyphs[codePoint]
+        record = self._findRecord(codePoint)
+        if record is None:
+            glyph = None
+        else:
+            (codePoint, shiftX, width, height, dx, dy, offset) = record
+            if self._data is not None:
+                bitmap = packedGlyphBitmap(self._data, offset, width, height)
+            else: # read only this glyph's bytes
+                if self._file is None:
+                    self._file = open(self.fileName, 'rb')
+                self._file.seek(offset)
+                bitmap = packedGlyphBitmap(self._file.read(((width + 7) // 8) * height), 0, width, height)
+            glyph = Glyph(bitmap, 0, width, height, dx, dy, shiftX, 0)
+        self._glyphs[codePoint] = glyph
+        return glyph
+
+    def load_glyphs(self, codePoints):
+        if isinstance(codePoints, int):
+            codePoints = (codePoints,)
+        for codePoint in codePoints:
+            if isinstance(codePoint, str):
+                codePoint = ord(codePoint)
+            self.get_glyph(codePoint)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def loadPackedFont(fileName, inMemory=False):
+    return packedFont(fileName, inMemory)
+
+
+# Converter
+# =========
+
+class _byteBitmap: # holds the glyph pixels while converting, one byte per pixel
+    def __init__(self, width, height, valueCount):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(width * height)
+
+    def __setitem__(self, index, value):
+        self.pixels[index] = value
+
+    def __getitem__(self, index):
+        return self.pixels[index]
+
+
+def convertBdf(bdfFileName, packedFileName=None):
+    # Converts a BDF file to the packed format.  Returns the name of the packed file.
+    from bdfindex import indexedBdfFont
+
+    if packedFileName is None:
+        packedFileName = bdfFileName.rsplit('.', 1)[0] + packedSuffix
+    bdfFont = indexedBdfFont(bdfFileName, _byteBitmap)
+    codePoints = sorted(set(bdfFont._codePoints))
+    (width, height, xOffset, yOffset) = bdfFont.get_bounding_box()
+
+    offset = headerSize + len(codePoints) * metricsSize # the bitmaps follow the metrics table
+    records = []
+    bitmaps = bytearray()
+    for codePoint in codePoints:
+        glyph = bdfFont.get_glyph(codePoint)
+        rowBytes = (glyph.width + 7) // 8
+        records.append(struct.pack(metricsFormat, codePoint, glyph.shift_x, glyph.width, glyph.height,
+                                   glyph.dx, glyph.dy, offset + len(bitmaps)))
+        for y in range(glyph.height):
+            row = bytearray(rowBytes)
+            for x in range(glyph.width):
+                if glyph.bitmap[y * glyph.width + x]:
+                    row[x >> 3] |= 0x80 >> (x & 7)
+            bitmaps.extend(row)
+    bdfFont.close()
+
+    with open(packedFileName, 'wb') as packedFile:
+        packedFile.write(struct.pack(headerFormat, packedMagic, len(records), width, height, xOffset, yOffset,
+                                     bdfFont.ascent, bdfFont.descent))
+        for record in records:
+            packedFile.write(record)
+        packedFile.write(bitmaps)
+    return packedFileName
+
+
+if __name__ == '__main__':
+    import sys
+    for bdfFileName in sys.argv[1:]:
+        print('{} -> {}'.format(bdfFileName, convertBdf(bdfFileName)))
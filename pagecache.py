@@ -0,0 +1,326 @@
+# pagecache.py
+# Kevin Matocha - Copyright (C) 2020
+# Written for CircuitPython
+#
+# Cache of rendered pages for smackDown.
+#
+# The same few documents are opened over and over.  A pageCache keeps the rendered bitmap of each page in
+# a file, so showing the page again skips the parsing and the glyph drawing: the file is decoded
+# straight into the bitmap.
+#
+# Pages are run-length encoded.  The bitmap holds only a few colors and is mostly background, so a page
+# is about 10 kB instead of the 76800 pixels of a 320x240 bitmap.  The rows are encoded one by one, so a
+# row is decoded into a bytes object and written to the bitmap in one step:
+#   a byte with the top bit set: (byte & 0x7f) + 1 rows of background
+#   otherwise: two bytes (most significant first) give the number of run bytes of the next row, followed
+#       by the run bytes.  Each run byte holds the color in the top 2 bits and the length (1 to 63) in the
+#       low 6 bits, the lengths of a row add up to the width of the bitmap.
+# The rows of background at the end of the page are not saved.
+#
+# A run byte always stands for the same pixels, so a row is decoded by joining the bytes objects for its
+# run bytes from a table (about 8 kB, built on the first decode).  Bitmaps that accept slice writes get
+# each row in one assignment.  A displayio.Bitmap only takes single pixel writes from Python, if
+# bitmaptools.arrayblit is available each row is written with one call, otherwise pixel by pixel.
+#
+# Each page is saved as <cache directory>/<key hash>.pgc with a header: the magic bytes, the width and
+# height of the bitmap, the length of the key and of the run data, followed by the full key.  The key
+# holds the size and modification time of the markdown file, the layout settings of the renderer (font
+# files, width, height, margins, spacing), the size and modification time of each font file, the font
+# offsets and the page number (see markdownRenderer.pageCacheKey).  A page that was rendered with
+# different settings has a different key, and the key is checked when the page is loaded.
+#
+# A page is written to a temporary file that is then renamed, so a reset while writing does not leave
+# a partial page under its name.  A page file that is shorter or longer than its header says, or whose
+# rows do not decode to the size of the bitmap, is deleted and counted as a miss.
+#
+# maxBytes: the budget for all the page files.  When it is full, the least recently used pages are
+# deleted.  The order of use is saved in <cache directory>/pages.json when a page is stored, the use of
+# pages that were loaded since then is lost at a restart.
+
+import json
+import os
+import struct
+
+from textmap import supportsSliceRead, supportsSliceWrite
+
+try:
+    import bitmaptools # CircuitPython, writes a row of pixels in one call
+except ImportError:
+    bitmaptools = None
+
+cacheMagic = b'PGC2'
+headerFormat = '<4sHHHI' # magic, width, height, key length, run data length
+headerSize = struct.calcsize(headerFormat)
+cacheSuffix = '.pgc'
+tempFileName = 'page.tmp' # a page being written
+listFileName = 'pages.json'
+maxColor = 3 # colors held in 2 bits
+
+
+def keyHash(key):
+    # FNV-1a hash of the key text, the same on every run (unlike hash() on CPython)
+    value = 0x811c9dc5
+    for byte in key.encode('utf-8'):
+        value = ((value ^ byte) * 0x01000193) & 0xffffffff
+    return value
+
+
+def encodeRuns(bitmap):
+    # Returns the run-length encoding of the bitmap
+    runs = bytearray()
+    for step in encodeRunSteps(bitmap, runs):
+        pass
+    return runs
+
+def encodeRunSteps(bitmap, runs, stepRows=None):
+    # Generator version of encodeRuns, appends the encoding to the bytearray runs and yields after every
+    # stepRows rows, so a page can be encoded in time slices (see markdownRenderer.renderPageSteps).
+    width = bitmap.width
+    sliceRead = supportsSliceRead(bitmap)
+    blankRows = 0
+    for y in range(bitmap.height):
+        rowBase = y * width
+        if sliceRead:
+            row = bitmap[rowBase : rowBase + width]
+        else:
+            row = [bitmap[i] for i in range(rowBase, rowBase + width)]
+        if not any(row):
+            blankRows += 1
+        else:
+            while blankRows > 0:
+                count = min(blankRows, 128)
+                runs.append(0x80 | (count - 1))
+                blankRows -= count
+            rowRuns = encodeRow(row)
+            runs.extend((len(rowRuns) >> 8, len(rowRuns) & 0xff))
+            runs.extend(rowRuns)
+        if stepRows and (y + 1) % stepRows == 0:
+            yield
+
+def encodeRow(row):
+    # Returns the run bytes for one row of pixels
+    rowRuns = bytearray()
+    runValue = row[0]
+    runStart = 0
+    for x in range(1, len(row)):
+        value = row[x]
+        if value != runValue:
+            _appendRun(rowRuns, runValue, x - runStart)
+            runValue = value
+            runStart = x
+    _appendRun(rowRuns, runValue, len(row) - runStart)
+    return rowRuns
+
+def _appendRun(runs, value, length):
+    if value > maxColor:
+        raise ValueError('pagecache only stores colors 0 to {}'.format(maxColor))
+    while length > 63:
+        runs.append((value << 6) | 63)
+        length -= 63
+    runs.append((value << 6) | length)
+
+
+_runPixels = None # run byte -> bytes of its pixels
+
+def _runTable():
+    global _runPixels
+    if _runPixels is None:
+        _runPixels = [bytes((byte >> 6,)) * (byte & 0x3f) for byte in range(256)]
+    return _runPixels
+
+
+def decodeRow(rowRuns):
+    # Returns the pixels of one row from its run bytes
+    table = _runTable()
+    return b''.join([table[byte] for byte in rowRuns])
+
+
+def decodeRuns(runs, bitmap, start=0):
+    # Writes the pixels of the encoded rows into the bitmap, starting at runs[start].  The bitmap is
+    # filled with the background (color 0) first, so the rows of background are skipped.  Raises
+    # ValueError if a row runs past the end of the data or the bitmap, or is not as wide as the bitmap.
+    bitmap.fill(0)
+    width = bitmap.width
+    height = bitmap.height
+    sliceWrite = supportsSliceWrite(bitmap)
+    arrayblit = None
+    if (not sliceWrite) and bitmaptools is not None:
+        arrayblit = getattr(bitmaptools, 'arrayblit', None)
+    table = _runTable()
+    runs = memoryview(runs)
+    y = 0
+    i = start
+    count = len(runs)
+    while i < count:
+        header = runs[i]
+        if header & 0x80:
+            y += (header & 0x7f) + 1
+            i += 1
+            continue
+        if i + 2 > count:
+            raise ValueError('page row header past the end of the data')
+        end = i + 2 + ((header << 8) | runs[i + 1])
+        if end > count or y >= height:
+            raise ValueError('page row {} past the end of the data or the bitmap'.format(y))
+        rowRuns = runs[i + 2 : end]
+        i = end
+        if sliceWrite or arrayblit is not None:
+            row = b''.join([table[byte] for byte in rowRuns])
+            if len(row) != width:
+                raise ValueError('page row {} is {} pixels wide'.format(y, len(row)))
+            if sliceWrite:
+                bitmap[y * width : (y + 1) * width] = row
+            else:
+                arrayblit(bitmap, row, 0, y, width, y + 1)
+        else:
+            if sum([byte & 0x3f for byte in rowRuns]) != width:
+                raise ValueError('page row {} is not {} pixels wide'.format(y, width))
+            index = y * width
+            for byte in rowRuns:
+                value = byte >> 6
+                if value:
+                    for pixel in range(index, index + (byte & 0x3f)):
+                        bitmap[pixel] = value
+                index += byte & 0x3f
+        y += 1
+
+
+class pageCache:
+    def __init__(self, directory, maxBytes):
+        # directory: where the page files are kept, created if it does not exist
+        # maxBytes: budget for all the page files
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writable = True
+        self.lastStored = False # result of the last store
+        try:
+            os.mkdir(directory)
+        except OSError:
+            pass # already there, or a read-only filesystem
+        self._pages = self._readList() # [[file name, size], ...] least recently used first
+
+    def _path(self, name):
+        return self.directory + '/' + name
+
+    def _readList(self):
+        try:
+            with open(self._path(listFileName), 'r') as listFile:
+                return json.load(listFile)
+        except (OSError, ValueError):
+            return []
+
+    def _saveList(self):
+        try:
+            with open(self._path(listFileName), 'w') as listFile:
+                json.dump(self._pages, listFile)
+        except OSError:
+            self.writable = False
+
+    def _find(self, name):
+        for i in range(len(self._pages)):
+            if self._pages[i][0] == name:
+                return i
+        return -1
+
+    def usedBytes(self):
+        return sum([size for (name, size) in self._pages])
+
+    def load(self, key, bitmap):
+        # Decodes the page saved for this key into the bitmap, returns False if it is not in the cache.
+        name = '{:08x}{}'.format(keyHash(key), cacheSuffix)
+        try:
+            with open(self._path(name), 'rb') as pageFile:
+                data = pageFile.read()
+        except OSError:
+            self.misses += 1
+            return False
+        keyBytes = key.encode('utf-8')
+        if len(data) < headerSize:
+            self._discard(name) # cut short while it was written
+            return False
+        (magic, width, height, keyLength, runLength) = struct.unpack_from(headerFormat, data)
+        if magic != cacheMagic or len(data) != headerSize + keyLength + runLength:
+            self._discard(name) # cut short, or written by another version
+            return False
+        if (width != bitmap.width or height != bitmap.height or
+                data[headerSize : headerSize + keyLength] != keyBytes): # another page with the same hash
+            self.misses += 1
+            return False
+        try:
+            decodeRuns(data, bitmap, headerSize + keyLength)
+        except ValueError:
+            self._discard(name)
+            return False
+        i = self._find(name)
+        if i >= 0: # now the most recently used
+            self._pages.append(self._pages.pop(i))
+        self.hits += 1
+        return True
+
+    def store(self, key, bitmap):
+        # Saves the bitmap for this key, deleting the least recently used pages to stay within maxBytes.
+        # Returns False if the page is not saved (read-only filesystem, or larger than the budget).
+        for step in self.storeSteps(key, bitmap):
+            pass
+        return self.lastStored
+
+    def storeSteps(self, key, bitmap, stepRows=16):
+        # Generator version of store, encodes stepRows rows of the bitmap in each step.  The result is
+        # in lastStored when the generator is exhausted.
+        self.lastStored = False
+        if not self.writable:
+            return
+        runs = bytearray()
+        for step in encodeRunSteps(bitmap, runs, stepRows):
+            yield
+        self.lastStored = self._write(key, bitmap, runs)
+
+    def _write(self, key, bitmap, runs):
+        keyBytes = key.encode('utf-8')
+        size = headerSize + len(keyBytes) + len(runs)
+        if size > self.maxBytes:
+            return False
+        name = '{:08x}{}'.format(keyHash(key), cacheSuffix)
+        i = self._find(name)
+        if i >= 0:
+            self._pages.pop(i)
+        while self._pages and self.usedBytes() + size > self.maxBytes:
+            self._remove(self._pages.pop(0)[0])
+            self.evictions += 1
+        try:
+            with open(self._path(tempFileName), 'wb') as pageFile:
+                pageFile.write(struct.pack(headerFormat, cacheMagic, bitmap.width, bitmap.height, len(keyBytes),
+                                           len(runs)))
+                pageFile.write(keyBytes)
+                pageFile.write(runs)
+            self._remove(name) # os.rename does not replace a file on CircuitPython
+            os.rename(self._path(tempFileName), self._path(name))
+        except OSError:
+            self.writable = False
+            return False
+        self._pages.append([name, size])
+        self._saveList()
+        return True
+
+    def _discard(self, name): # deletes a damaged page file, counted as a miss
+        self.misses += 1
+        self._remove(name)
+        i = self._find(name)
+        if i >= 0:
+            self._pages.pop(i)
+            self._saveList()
+
+    def _remove(self, name):
+        try:
+            os.remove(self._path(name))
+        except OSError:
+            pass
+
+    def clear(self): # deletes all the page files
+        for (name, size) in self._pages:
+            self._remove(name)
+        self._pages = []
+        self._saveList()
@@ -0,0 +1,183 @@
+# pageindex.py
+# Kevin Matocha - Copyright (C) 2020
+# Written for CircuitPython
+#
+# Page index for smackDown: records where each screen page starts, so any page can be rendered
+# directly instead of rendering the whole file from the top.
+#
+# A layout pass runs the renderer over the file once, without drawing, and records for the start of
+# each page:
+#   offset: byte offset of the first markdown line on the page
+#   state: the fontController snapshot at that point (cursor, modifier stack, quoteDepth, freshSection,
+#          lastFontIndex, leftMatter), with the cursor moved to the top of the page
+#
+# A page holds the lines from its offset up to the offset of the next page.  A line that does not fit
+# at the bottom of a page starts the next page.  A single line that is taller than a page continues on
+# the next page: that page starts at the same offset, with the cursor shifted above the top of the
+# screen so the part already shown is clipped.
+#
+# The index is saved next to the markdown file (README.md -> README.md.idx) as JSON, together with the
+# file size, modification time and the layout settings.  It is rebuilt if any of these change.
+#
+# Scrolling (see scroller.py) uses a lineIndex instead: the byte offset and the rows covered by every
+# markdown line of the document, laid out as one tall page.  The fontController state is kept only at
+# the start of every checkpointEvery lines, to save RAM.  The lineIndex is kept in memory.
+
+from array import array
+import json
+import os
+
+indexSuffix = '.idx'
+
+
+def indexFileName(fileName):
+    return fileName + indexSuffix
+
+
+def sourceKey(fileName, settings):
+    # Identifies the file version and the layout settings the index was built with.
+    fileStat = os.stat(fileName)
+    return [fileStat[6], fileStat[8], settings] # size, mtime
+
+
+def readLines(fileName, offset=0):
+    # Yields (offset, line) for each line of the file, starting at the byte offset.
+    with open(fileName, 'rb') as myFile:
+        myFile.seek(offset)
+        while True:
+            rawLine = myFile.readline()
+            if not rawLine:
+                break
+            yield (offset, rawLine.decode('utf-8'))
+            offset += len(rawLine)
+
+
+def contentBottom(controller, rowHeight):
+    # Bottom of the text printed so far.  If the cursor is at the start of a line, nothing is printed on
+    # this row yet.
+    if controller.getX() == controller.startX:
+        return controller.getY()
+    return controller.getY() + rowHeight()
+
+
+def buildPageIndex(fileName, controller, renderLine, rowHeight, pageHeight):
+    # Layout pass over the whole file.  Returns the list of pages as [offset, state].
+    #
+    # controller: the fontController used by renderLine, reset to the start of the document
+    # renderLine: lays out one line (the caller makes sure nothing is drawn)
+    # rowHeight: function returning the height of the current text row, used to check for overflow
+    # pageHeight: height of the screen in pixels
+    startY = controller.startY
+    pages = [[0, controller.snapshot()]]
+    for (offset, line) in readLines(fileName):
+        lineState = controller.snapshot()
+        renderLine(line)
+        while contentBottom(controller, rowHeight) > pageHeight: # this line runs past the bottom of the page
+            if lineState[1] > startY: # move the whole line to the next page
+                shift = lineState[1] - startY
+            else: # the line does not fit on one page, continue it on the next page
+                shift = pageHeight - startY
+            lineState[1] -= shift
+            controller.setY(controller.getY() - shift)
+            pages.append([offset, list(lineState)])
+    return pages
+
+
+class lineIndex:
+    def __init__(self, checkpointEvery=4):
+        self.checkpointEvery = checkpointEvery
+        self.offsets = array('l') # byte offset of each line
+        self.tops = array('l') # cursor Y at the start of each line
+        self.bottoms = array('l') # bottom of the text printed up to the end of each line, never decreases
+        self.states = [] # fontController snapshot at the start of lines 0, checkpointEvery, 2*checkpointEvery, ...
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def bottom(self): # bottom of the document
+        if len(self.bottoms) == 0:
+            return 0
+        return self.bottoms[-1]
+
+    def linesBetween(self, y0, y1):
+        # Returns (first, end): the lines from first up to, but not including, end may print on the rows
+        # from y0 up to y1.
+        bottoms = self.bottoms
+        tops = self.tops
+        low = 0
+        high = len(bottoms)
+        while low < high: # first line that ends below y0
+            middle = (low + high) // 2
+            if bottoms[middle] <= y0:
+                low = middle + 1
+            else:
+                high = middle
+        first = low
+        high = len(tops)
+        while low < high: # first line that starts at or below y1
+            middle = (low + high) // 2
+            if tops[middle] < y1:
+                low = middle + 1
+            else:
+                high = middle
+        return (first, low)
+
+    def checkpoint(self, lineNumber):
+        # Returns (checkpointLine, state) for the closest line at or before lineNumber with a saved state.
+        number = lineNumber // self.checkpointEvery
+        return (number * self.checkpointEvery, self.states[number])
+
+
+def buildLineIndex(fileName, controller, renderLine, rowHeight, checkpointEvery=4):
+    # Layout pass over the whole file as one page, returns a lineIndex.
+    #
+    # controller: the fontController used by renderLine, reset to the start of the document
+    # renderLine: lays out one line (the caller makes sure nothing is drawn)
+    # rowHeight: function returning the height of the current text row
+    lines = lineIndex(checkpointEvery)
+    bottom = 0
+    for (offset, line) in readLines(fileName):
+        if len(lines.offsets) % checkpointEvery == 0:
+            lines.states.append(controller.snapshot())
+        lines.offsets.append(offset)
+        lines.tops.append(controller.getY())
+        renderLine(line)
+        bottom = max(bottom, contentBottom(controller, rowHeight))
+        lines.bottoms.append(bottom)
+    return lines
+
+
+def savePageIndex(fileName, pages, settings):
+    # Saves the index next to the markdown file.  Returns False if the filesystem is read-only.
+    try:
+        with open(indexFileName(fileName), 'w') as indexFile:
+            json.dump({'source': sourceKey(fileName, settings), 'pages': pages}, indexFile)
+    except OSError:
+        return False
+    return True
+
+
+def loadPageIndex(fileName, settings):
+    # Returns the saved pages, or None if there is no index or it is out of date.
+    try:
+        with open(indexFileName(fileName), 'r') as indexFile:
+            saved = json.load(indexFile)
+    except (OSError, ValueError):
+        return None
+    if saved.get('source') != sourceKey(fileName, settings):
+        return None
+    return saved['pages']
+
+
+def pageLines(fileName, pages, pageNumber):
+    # Yields the lines of one page.
+    if pageNumber + 1 < len(pages):
+        nextOffset = pages[pageNumber + 1][0]
+    else:
+        nextOffset = None
+    firstLine = True
+    for (offset, line) in readLines(fileName, pages[pageNumber][0]):
+        if (not firstLine) and (nextOffset is not None) and (offset >= nextOffset):
+            break
+        yield line
+        firstLine = False
@@ -0,0 +1,83 @@
+# pageturner.py
+# Kevin Matocha - Copyright (C) 2020
+# Written for CircuitPython
+#
+# Offscreen rendering of the next page for smackDown.
+#
+# Readers page through a document in order.  While page N is on the display, a pageTurner renders page
+# N+1 into a second bitmap, a little at a time: call step() from the main loop whenever there is nothing
+# else to do, each call renders words until its time budget is used.  When the reader turns to page N+1,
+# the bitmaps are swapped and the display is pushed once, instead of rendering the page while the reader
+# waits.  If page N+1 is not finished yet, the rest of it is rendered offscreen first, so the work done
+# is kept.  Turning to any other page renders it directly, then starts on the page after it.
+#
+# Two markdownRenderers (see smackRender.py) share one fontSet, one draws into each bitmap.  The renderer
+# of the displayed bitmap uses the display's renderSession, the offscreen renderer has no session.  The
+# second bitmap costs another full screen of RAM (about 19 kB for 320x240 with 3 colors).
+
+from smackRender import renderJob
+
+
+class pageTurner:
+    def __init__(self, renderers, session, showBitmap, fileName, pages):
+        # renderers: two markdownRenderers, each with its own bitmap, the first one is on the display
+        # session: the renderSession of the display (see dirtyrect.py), or None
+        # showBitmap: function that puts a bitmap on the display, such as replacing the TileGrid in the
+        #     display group
+        # fileName, pages: the document and its page index (see pageindex.py)
+        self.renderers = list(renderers) # [displayed, offscreen]
+        self.session = session
+        self.showBitmap = showBitmap
+        self.fileName = fileName
+        self.pages = pages
+        self.pageNumber = None # the page on the display
+        self.nextPage = None # the page being rendered offscreen
+        self.nextReady = False
+        self._job = None # renderJob for the offscreen page
+        self.swaps = 0 # page turns served from the offscreen bitmap
+        self.renders = 0 # page turns rendered while waiting
+        self.renderers[0].session = session
+        self.renderers[1].session = None
+
+    def showPage(self, pageNumber):
+        # Shows a page: swaps in the offscreen bitmap if it holds this page, else renders the page.
+        if pageNumber == self.nextPage and not self.nextReady and self._job is not None:
+            self.step(None) # finish the offscreen page
+        if pageNumber == self.nextPage and self.nextReady:
+            self.renderers.reverse()
+            self.renderers[0].session = self.session
+            self.renderers[1].session = None
+            self.showBitmap(self.renderers[0].bitmap)
+            if self.session is not None:
+                self.session.markAll()
+                self.session.flush() # one push for the whole page
+            self.swaps += 1
+        else:
+            if self._job is not None: # stop any offscreen rendering, the renderers may be swapped next time
+                self._job.cancel()
+                self._job = None
+            self.renderers[0].renderPage(self.fileName, self.pages, pageNumber)
+            self.renders += 1
+        self.pageNumber = pageNumber
+        self._startNext(pageNumber + 1)
+
+    def _startNext(self, pageNumber):
+        self.nextReady = False
+        if pageNumber < len(self.pages):
+            self.nextPage = pageNumber
+            self._job = renderJob(self.renderers[1].renderPageSteps(self.fileName, self.pages, pageNumber))
+        else: # last page
+            self.nextPage = None
+            self._job = None
+
+    def step(self, budgetMs=10, glyphBudget=None):
+        # Renders the offscreen page for up to budgetMs milliseconds or glyphBudget characters (see
+        # smackRender.renderJob), to the end if both are None.  Returns True while there is more to render.
+        job = self._job
+        if job is None:
+            return False
+        if job.run(glyphBudget, budgetMs):
+            return True
+        self._job = None
+        self.nextReady = True
+        return False
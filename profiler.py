@@ -0,0 +1,104 @@
+# profiler.py
+# Kevin Matocha - Copyright (C) 2020
+# Written for CircuitPython
+#
+# Per-stage timing counters for the smackDown render path.
+#
+# Each rendering stage records its call count and total time (time.monotonic_ns), and optionally the
+# memory allocated during the stage (the drop in gc.mem_free).  The report after a page or a document
+# shows whether the time goes to parsing, measuring or drawing.
+#
+# The call sites check profiler.enabled first, so the counters cost one comparison when profiling is off:
+#
+#     if profiler.enabled:
+#         profiler.begin(stagePlaceText)
+#
+# Times are inclusive: a stage includes the stages it calls.  renderTokens includes the parsing of the
+# line, since the tokenizer runs as the tokens are drawn.  If a stage is entered again before it ends,
+# only the outermost call is timed.  The stages of the renderer (renderLine down to layoutWords) end in a
+# finally clause, so an exception does not leave them open.  An exception in one of the inner stages
+# (placeText, bounding_box, glyph lookups) can leave it open until the next reset(), which closes all
+# the stages (the renderer resets after each page).
+#
+# Memory tracking is off by default because gc.mem_free is slow on CircuitPython.  An allocation is only
+# counted if no garbage collection ran during the stage, and the profiler's own timestamps are included.
+
+import time
+
+try:
+    from gc import mem_free
+except ImportError: # not available on CPython
+    mem_free = None
+
+stageNames = ('renderLine', 'renderTokens', 'fontModifierCheck',
+              'bounding_box', 'placeText', 'glyphLookup', 'layoutWords')
+stageRenderLine = 0
+stageRenderTokens = 1 # the token loop, formerly printText
+stageModifierCheck = 2
+stageBoundingBox = 3
+stagePlaceText = 4
+stageGlyphLookup = 5 # loading a glyph or its metrics from the font
+stageLayout = 6 # line layout of the words between other tokens, including the wrapping of long words
+
+enabled = False
+trackMemory = False
+
+calls = [0] * len(stageNames)
+times = [0] * len(stageNames) # nanoseconds
+allocated = [0] * len(stageNames) # bytes
+_depth = [0] * len(stageNames)
+_startTimes = [0] * len(stageNames)
+_startFree = [0] * len(stageNames)
+
+
+def enable(memory=False):
+    # memory: also track the memory allocated in each stage (CircuitPython only)
+    global enabled, trackMemory
+    enabled = True
+    trackMemory = memory and (mem_free is not None)
+    for stage in range(len(stageNames)):
+        _depth[stage] = 0
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    # clears the counters, and closes any stage left open by an exception or a closed step generator
+    for stage in range(len(stageNames)):
+        calls[stage] = 0
+        times[stage] = 0
+        allocated[stage] = 0
+        _depth[stage] = 0
+
+
+def begin(stage):
+    if _depth[stage] == 0:
+        if trackMemory:
+            _startFree[stage] = mem_free()
+        _startTimes[stage] = time.monotonic_ns()
+    _depth[stage] += 1
+
+
+def end(stage):
+    _depth[stage] -= 1
+    calls[stage] += 1
+    if _depth[stage] == 0:
+        times[stage] += time.monotonic_ns() - _startTimes[stage]
+        if trackMemory:
+            used = _startFree[stage] - mem_free()
+            if used > 0:
+                allocated[stage] += used
+
+
+def report(title):
+    # prints the counters for each stage that was called
+    print('profile: {}'.format(title))
+    print('  {:18s} {:>7s} {:>9s} {:>8s} {:>8s}'.format('stage', 'calls', 'total ms', 'us/call', 'bytes'))
+    for stage in range(len(stageNames)):
+        if calls[stage]:
+            print('  {:18s} {:7d} {:9.1f} {:8.1f} {:>8s}'.format(
+                stageNames[stage], calls[stage], times[stage] / 1000000, times[stage] / calls[stage] / 1000,
+                str(allocated[stage]) if trackMemory else '-'))
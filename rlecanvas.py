@@ -0,0 +1,289 @@
+# rlecanvas.py
+# Kevin Matocha - Copyright (C) 2020
+# Written for CircuitPython
+#
+# Run-length encoded canvas for smackDown.
+#
+# A displayio.Bitmap(320, 240, 3) uses 19200 bytes of RAM (2 bits per pixel).  A page of text is mostly
+# background, so several rendered pages, or a tall canvas holding a whole document for scrolling, fit in
+# the same RAM when their rows are run-length encoded.  An rleCanvas has the width, height, pixel and
+# slice access (reads and writes) of a bitmap, so a markdownRenderer (placeText, fillRect) draws into it
+# directly, and a pageCache stores and loads its pages:
+#
+#     canvas = rleCanvas(320, 240)
+#     myRenderer.bitmap = canvas
+#     myRenderer.renderPage(fileName, pages, pageNumber)
+#     canvas.close() # encodes the rows that are still decoded
+#     canvas.show(displayBitmap) # decodes the rows into the bitmap on the display
+#
+# RAM for a 320x240 page, with the object headers and the 16-byte heap blocks of CircuitPython (see
+# ramBytes): 2.5 kB and 5.6 kB for the two pages of README.md, 5.6 to 9.6 kB (7.6 kB on average) for
+# dense text with a lot of emphasis.  That is 7.6 and 3.4 pages of README.md in the RAM of one bitmap,
+# but only 2 to 3.4 pages of dense text.
+#
+# Each row is encoded as bytes, with no bytes for a row of background.  A row with one color besides the
+# background (most rows of text) starts with that color, followed by one byte per pair of runs:
+# the length of the background run in the top 4 bits and the length of the following run of the color
+# in the low 4 bits (0 to 15 each).  Other rows start with 0, followed by the run bytes of pagecache.py.
+# A pair byte always stands for the same pixels, so a row is decoded by joining bytes objects from a
+# table (about 4 kB for each color, built on first use).
+#
+# The encoded rows of a canvas are held in one buffer, with an array of the offset of each row (array
+# 'H', or 'I' for a tall canvas over 64 kB), so a page takes a few heap objects instead of one per row.
+# Drawing into an encoded row would mean decoding and encoding it for every pixel.  The rows being
+# drawn are kept decoded instead, in a bytearray each.  Text is drawn one line at a time, so these are a
+# few neighbouring rows.  When more than openRows rows are decoded, the least recently used row is
+# encoded into a table of changed rows.  close() encodes the rows that are still decoded and joins the
+# changed rows into the buffer.  The decoded rows take openRows times the width in bytes (7680 bytes for
+# 24 rows of 320 pixels) until close() is called.
+
+from array import array
+
+from textmap import supportsSliceWrite
+from pagecache import encodeRow, decodeRow
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    OrderedDict = dict
+
+try:
+    import bitmaptools # CircuitPython, writes a row of pixels in one call
+except ImportError:
+    bitmaptools = None
+
+gcBlockSize = 16 # CircuitPython allocates the heap in blocks of 16 bytes
+
+_pairPixels = {} # color -> list of the pixels for each pair byte
+
+def _pairTable(color):
+    table = _pairPixels.get(color)
+    if table is None:
+        table = [bytes(byte >> 4) + bytes((color,)) * (byte & 0x0f) for byte in range(256)]
+        _pairPixels[color] = table
+    return table
+
+
+def heapBytes(bufferBytes):
+    # RAM taken by a bytes, bytearray or array object with a buffer of bufferBytes on CircuitPython: the
+    # object (one block) and its buffer, rounded up to whole blocks
+    return gcBlockSize + (bufferBytes + gcBlockSize - 1) // gcBlockSize * gcBlockSize
+
+
+def encodeCanvasRow(row):
+    # Returns the encoding of a row of pixels (bytearray), None if it is all background
+    if not any(row):
+        return None
+    color = 0
+    for value in (1, 2, 3):
+        if row.find(bytes((value,))) >= 0:
+            if color:
+                return b'\x00' + encodeRow(row) # more than one color
+            color = value
+    zero = b'\x00'
+    ink = bytes((color,))
+    width = len(row)
+    pairs = bytearray((color,))
+    x = 0
+    while x < width:
+        inkStart = row.find(ink, x)
+        if inkStart < 0: # the rest of the row is background, it is not saved
+            break
+        inkEnd = row.find(zero, inkStart)
+        if inkEnd < 0:
+            inkEnd = width
+        background = inkStart - x
+        while background > 15:
+            pairs.append(0xf0)
+            background -= 15
+        inkLength = inkEnd - inkStart
+        first = min(inkLength, 15)
+        pairs.append((background << 4) | first)
+        inkLength -= first
+        while inkLength > 0:
+            first = min(inkLength, 15)
+            pairs.append(first)
+            inkLength -= first
+        x = inkEnd
+    return bytes(pairs)
+
+def decodeCanvasRow(encoded, width):
+    # Returns the pixels of a row (bytes of the full width) from its encoding
+    if encoded is None:
+        return bytes(width)
+    color = encoded[0]
+    if color == 0:
+        return decodeRow(memoryview(encoded)[1:])
+    table = _pairTable(color)
+    pixels = b''.join([table[byte] for byte in memoryview(encoded)[1:]])
+    return pixels + bytes(width - len(pixels))
+
+
+def joinRows(pieces):
+    # Joins memoryview and bytearray slices of rows.  bytes.join of CircuitPython only takes pieces of the
+    # same type as the separator, bytearray.extend takes any buffer.
+    data = bytearray()
+    for piece in pieces:
+        data.extend(piece)
+    return data
+
+
+class rleCanvas:
+    def __init__(self, width, height, openRows=24):
+        # openRows: number of rows kept decoded while drawing, about the height of a line of text
+        self.width = width
+        self.height = height
+        self.openRows = openRows
+        self._data = b'' # the encoded rows, row y is _data[_offsets[y] : _offsets[y + 1]]
+        self._offsets = array('H', bytes(2 * (height + 1)))
+        self._changed = {} # row number -> encoded row (None for background), rows encoded since close()
+        self._open = OrderedDict() # row number -> bytearray, least recently used first
+        self._lastY = -1 # the row used by the last pixel access
+        self._lastRow = None
+
+    def _encodedRow(self, y): # the encoding of row y, None for a row of background
+        if y in self._changed:
+            return self._changed[y]
+        start = self._offsets[y]
+        end = self._offsets[y + 1]
+        if start == end:
+            return None
+        return memoryview(self._data)[start:end]
+
+    def _openRow(self, y):
+        # Returns the decoded pixels of row y for drawing
+        if y == self._lastY:
+            return self._lastRow
+        if not (0 <= y < self.height):
+            raise IndexError('rleCanvas row {} out of range'.format(y))
+        row = self._open.pop(y, None)
+        if row is None:
+            row = bytearray(decodeCanvasRow(self._encodedRow(y), self.width))
+            if len(self._open) >= self.openRows: # encode the least recently used row
+                oldY = next(iter(self._open))
+                self._changed[oldY] = encodeCanvasRow(self._open.pop(oldY))
+        self._open[y] = row # (re)insert as the most recently used
+        self._lastY = y
+        self._lastRow = row
+        return row
+
+    def _readRow(self, y): # the pixels of row y, without opening it for drawing
+        row = self._open.get(y)
+        if row is None:
+            row = decodeCanvasRow(self._encodedRow(y), self.width)
+        return row
+
+    def __getitem__(self, index):
+        width = self.width
+        if isinstance(index, tuple):
+            return self._readRow(index[1])[index[0]]
+        if isinstance(index, slice): # a slice may cover several rows (pagecache, scroller)
+            start = index.start
+            stop = index.stop
+            pieces = []
+            while start < stop:
+                (y, x) = divmod(start, width)
+                count = min(stop - start, width - x)
+                pieces.append(self._readRow(y)[x : x + count])
+                start += count
+            if len(pieces) == 1:
+                return pieces[0]
+            return joinRows(pieces)
+        (y, x) = divmod(index, width)
+        return self._readRow(y)[x]
+
+    def __setitem__(self, index, value):
+        width = self.width
+        if isinstance(index, tuple):
+            self._openRow(index[1])[index[0]] = value
+        elif isinstance(index, slice): # a slice may cover several rows (fillRect)
+            start = index.start
+            stop = index.stop
+            done = 0
+            while start < stop:
+                (y, x) = divmod(start, width)
+                count = min(stop - start, width - x)
+                self._openRow(y)[x : x + count] = value[done : done + count]
+                done += count
+                start += count
+        else:
+            (y, x) = divmod(index, width)
+            self._openRow(y)[x] = value
+
+    def fill(self, value):
+        if value == 0:
+            self._setRows(b'', [0] * (self.height + 1))
+        else:
+            row = encodeCanvasRow(bytearray((value,)) * self.width)
+            self._setRows(row * self.height, [y * len(row) for y in range(self.height + 1)])
+        self._changed = {}
+        self._open = OrderedDict()
+        self._lastY = -1
+        self._lastRow = None
+
+    def _setRows(self, data, offsets):
+        self._data = data
+        self._offsets = array('H' if len(data) < 0x10000 else 'I', offsets)
+
+    def close(self):
+        # Encodes the rows that are still decoded, to free their RAM, and joins the changed rows into the
+        # buffer of encoded rows
+        for (y, row) in self._open.items():
+            self._changed[y] = encodeCanvasRow(row)
+        self._open = OrderedDict()
+        self._lastY = -1
+        self._lastRow = None
+        if not self._changed:
+            return
+        rows = []
+        offsets = [0]
+        size = 0
+        for y in range(self.height):
+            row = self._encodedRow(y)
+            if row is not None:
+                rows.append(row)
+                size += len(row)
+            offsets.append(size)
+        self._changed = {}
+        self._setRows(joinRows(rows), offsets)
+
+    def encodedBytes(self): # bytes of the encoded rows, without the object headers
+        return len(self._data) + sum([len(row) for row in self._changed.values() if row is not None])
+
+    def ramBytes(self):
+        # Estimated RAM of the rows on CircuitPython, with the object headers and the rounding to heap
+        # blocks: the buffer and the offsets, and the changed and decoded rows until close() is called.
+        # The canvas object itself (about 100 bytes) is not counted.
+        total = heapBytes(len(self._data)) + heapBytes(self._offsets.itemsize * len(self._offsets))
+        if self._changed:
+            total += heapBytes(8 * len(self._changed)) # the table
+            total += sum([heapBytes(len(row)) for row in self._changed.values() if row is not None])
+        if self._open:
+            total += heapBytes(8 * len(self._open)) + len(self._open) * heapBytes(self.width)
+        return total
+
+    def show(self, bitmap, top=0):
+        # Decodes the rows from top down into the bitmap, the rows below the canvas are background.
+        # The bitmap is filled with the background first, so the rows of background are skipped.
+        bitmap.fill(0)
+        width = self.width
+        sliceWrite = supportsSliceWrite(bitmap)
+        arrayblit = None
+        if (not sliceWrite) and bitmaptools is not None:
+            arrayblit = getattr(bitmaptools, 'arrayblit', None)
+        for y in range(min(bitmap.height, self.height - top)):
+            row = self._open.get(top + y)
+            if row is None:
+                encoded = self._encodedRow(top + y)
+                if encoded is None:
+                    continue
+                row = decodeCanvasRow(encoded, width)
+            if sliceWrite:
+                bitmap[y * width : (y + 1) * width] = row
+            elif arrayblit is not None:
+                arrayblit(bitmap, row, 0, y, width, y + 1)
+            else:
+                rowBase = y * width
+                for x in range(width):
+                    if row[x]:
+                        bitmap[rowBase + x] = row[x]
@@ -0,0 +1,198 @@
+# scroller.py
+# Kevin Matocha - Copyright (C) 2020
+# Written for CircuitPython
+#
+# Scrolling for smackDown.
+#
+# A scrollView shows the document laid out as one tall page, through a window the size of the display.
+# To scroll, the pixels already in the bitmap are shifted up or down by the number of rows scrolled, and
+# only the strip of rows that comes into view is rendered.  The lineIndex (see pageindex.py) gives the
+# markdown lines that print on the strip, and the fontController state at a checkpoint line before them.
+# The lines from the checkpoint up to the strip are laid out without drawing, then the lines on the strip
+# are drawn into a bitmapWindow that covers only the strip, so nothing outside the strip is changed.
+# Scrolling by one text row costs about one markdown line of rendering.
+#
+#     view = scrollView(myRenderer, fileName)
+#     view.show(0) # top of the document
+#     view.scrollLines(1) # one text row down, negative to scroll up
+#
+# Document rows are numbered as in the layout: the first line starts at startY, and row top of the
+# document is on the first row of the bitmap.
+
+import textmap
+from textmap import nullBitmap, fillRect, supportsSliceRead, supportsSliceWrite
+from pageindex import readLines
+
+try:
+    import bitmaptools # CircuitPython 8 and later, copies a region of a bitmap in one call
+except ImportError:
+    bitmaptools = None
+
+
+def shiftRows(bitmap, rows):
+    # Moves the pixels of the bitmap up by rows (down if rows is negative).  The rows that are uncovered
+    # keep their old pixels.  A displayio.Bitmap takes neither slice reads nor slice writes, it is copied
+    # with Bitmap.blit (CircuitPython 7) or bitmaptools.blit (later versions, Bitmap.blit was moved
+    # there), which copy in the right order when a bitmap blits into itself.  Pixel by pixel copying is
+    # the last resort, 76800 reads and writes for 320x240.  bitmaptools.arrayblit does not help: the rows
+    # would still be read pixel by pixel.
+    width = bitmap.width
+    height = bitmap.height
+    if rows == 0 or abs(rows) >= height:
+        return
+    if hasattr(bitmap, 'blit'): # displayio.Bitmap of CircuitPython 7
+        if rows > 0:
+            bitmap.blit(0, 0, bitmap, x1=0, y1=rows, x2=width, y2=height)
+        else:
+            bitmap.blit(0, -rows, bitmap, x1=0, y1=0, x2=width, y2=height+rows)
+    elif bitmaptools is not None and hasattr(bitmaptools, 'blit'):
+        if rows > 0:
+            bitmaptools.blit(bitmap, bitmap, 0, 0, x1=0, y1=rows, x2=width, y2=height)
+        else:
+            bitmaptools.blit(bitmap, bitmap, 0, -rows, x1=0, y1=0, x2=width, y2=height+rows)
+    elif supportsSliceRead(bitmap) and supportsSliceWrite(bitmap):
+        if rows > 0: # copy from the top down, so a row is read before it is written
+            destinations = range(0, height - rows)
+        else:
+            destinations = range(height - 1, -rows - 1, -1)
+        for y in destinations:
+            source = (y + rows) * width
+            bitmap[y * width : (y + 1) * width] = bitmap[source : source + width]
+    else:
+        if rows > 0:
+            destinations = range(0, height - rows)
+        else:
+            destinations = range(height - 1, -rows - 1, -1)
+        for y in destinations:
+            rowBase = y * width
+            source = (y + rows) * width
+            for x in range(width):
+                bitmap[rowBase + x] = bitmap[source + x]
+
+
+class bitmapWindow:
+    # The rows of a bitmap from y0 up to y0+height, used as a bitmap of its own.  placeText clips to the
+    # window, so the rows outside it are not changed.  Slice writes are passed on to the bitmap if it
+    # accepts them, and written pixel by pixel if not.
+    def __init__(self, bitmap, y0, height):
+        self.bitmap = bitmap
+        self.width = bitmap.width
+        self.height = height
+        self.y0 = y0
+        self._offset = y0 * bitmap.width
+        self._sliceWrite = supportsSliceWrite(bitmap)
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            return self.bitmap[index[0], index[1] + self.y0]
+        return self.bitmap[index + self._offset]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, tuple):
+            self.bitmap[index[0], index[1] + self.y0] = value
+        elif isinstance(index, slice):
+            start = index.start + self._offset
+            if self._sliceWrite:
+                self.bitmap[start : index.stop + self._offset] = value
+            else:
+                bitmap = self.bitmap
+                for i in range(index.stop - index.start):
+                    bitmap[start + i] = value[i]
+        else:
+            self.bitmap[index + self._offset] = value
+
+    def fill(self, value):
+        fillRect(self.bitmap, 0, self.y0, self.width, self.y0 + self.height, value)
+
+
+class scrollView:
+    def __init__(self, renderer, fileName, lines=None, checkpointEvery=4):
+        # renderer: the markdownRenderer of the displayed bitmap, its height is the height of the view
+        # fileName: the markdown document
+        # lines: the lineIndex of the document, built with renderer.openLineIndex if None
+        # checkpointEvery: lines between the saved fontController states (more RAM for smaller values)
+        self.renderer = renderer
+        self.fileName = fileName
+        if lines is None:
+            lines = renderer.openLineIndex(fileName, checkpointEvery)
+        self.lines = lines
+        self.height = renderer.height
+        controller = renderer.controller
+        self.maxTop = max(0, lines.bottom() + controller.startY - self.height) # same margin at the bottom as the top
+        self.top = 0 # document row on the first row of the bitmap
+        self.overlap = 4 # rows above and below the strip where glyphs of a line may reach
+        self.rowsRendered = 0
+        self.linesRendered = 0 # markdown lines drawn into a strip
+        self.linesSkipped = 0 # markdown lines laid out without drawing, from a checkpoint to the strip
+
+    def lineStep(self): # scroll distance for one row of body text
+        renderer = self.renderer
+        return renderer.styles[renderer.fonts.indexMainBody].lineHeight(renderer.controller.lineSpacing)
+
+    def show(self, top):
+        # Renders the whole view with the document row top at the top of the bitmap.
+        self.top = min(max(top, 0), self.maxTop)
+        self._renderRows(0, self.height)
+        self._refresh()
+
+    def scrollBy(self, rows):
+        # Scrolls down by rows (up if negative), returns the number of rows actually scrolled.
+        top = min(max(self.top + rows, 0), self.maxTop)
+        rows = top - self.top
+        if rows == 0:
+            return 0
+        if abs(rows) >= self.height:
+            self.show(top)
+            return rows
+        shiftRows(self.renderer.bitmap, rows)
+        self.top = top
+        if rows > 0:
+            self._renderRows(self.height - rows, self.height)
+        else:
+            self._renderRows(0, -rows)
+        self._refresh()
+        return rows
+
+    def scrollLines(self, count=1): # scrolls by count rows of body text
+        return self.scrollBy(count * self.lineStep())
+
+    def _renderRows(self, y0, y1):
+        # Clears the bitmap rows from y0 up to y1 and draws the lines that print on them.
+        renderer = self.renderer
+        controller = renderer.controller
+        bitmap = renderer.bitmap
+        fillRect(bitmap, 0, y0, bitmap.width, y1, 0)
+        self.rowsRendered += y1 - y0
+        stripTop = self.top + y0 # document row on the first row of the strip
+        (first, end) = self.lines.linesBetween(stripTop - self.overlap, self.top + y1 + self.overlap)
+        if first >= end:
+            return
+        (lineNumber, state) = self.lines.checkpoint(first)
+        window = bitmapWindow(bitmap, y0, y1 - y0)
+        layoutBitmap = nullBitmap(bitmap.width)
+        session = renderer.session
+        renderer.session = None # the whole view is pushed after the scroll
+        controller.restore(state)
+        controller.setY(controller.getY() - stripTop) # document rows to window rows
+        try:
+            for (offset, line) in readLines(self.fileName, self.lines.offsets[lineNumber]):
+                if lineNumber >= end:
+                    break
+                if lineNumber < first:
+                    renderer.bitmap = layoutBitmap
+                    self.linesSkipped += 1
+                else:
+                    renderer.bitmap = window
+                    self.linesRendered += 1
+                renderer.renderLine(line)
+                lineNumber += 1
+        finally:
+            renderer.bitmap = bitmap
+            renderer.session = session
+            textmap.setDirtyTracker(session)
+
+    def _refresh(self):
+        session = self.renderer.session
+        if session is not None:
+            session.markAll() # the shifted rows changed as well
+            session.flush()
@@ -0,0 +1,518 @@
+# smackParse.py
+# Kevin Matocha - Copyright (C) 2020
+# Written for CircuitPython
+#
+# Markdown parsing for smackDown.  This module has no display or font dependencies, so the parser can
+# also be run and measured on a desktop computer.
+#
+# The markdownTokenizer reads text lines and yields a stream of layout tokens that are drawn by the
+# renderer in smackDown.py.  Only one line is held in memory at a time.
+#
+
+# Font Modifiers
+# ==============
+# Checks for bold and italics
+# Contains dictionary of text indicator for bold, italic and bolditalic
+# Houses a stack that indicates the current Font Modifiers
+#
+# functions:
+# Search a string for a modifier.  Add modifier to the sttack and split into two halves by the modifier, return both parts to be processed.
+# Check if a modifier string matches the last item of the stack and pop it from the stack.
+# Parse the stack and identify the current font to be used (normal, bold, italic, bold-italic)
+# Reset the stack modifier to empty.
+
+# Modifier scanner
+# ================
+# fontModifierCheck runs on every chunk of every line.  Rather than searching the text once per modifier
+# key (and re-sorting the keys on every call), the keys are compiled once into a regular expression when
+# the fontController is created.  The alternatives are listed longest first, so a single search over
+# the text finds the leftmost modifier and takes the longest key at that position, the same result as
+# the original search order.
+#
+# Example: \*\*\*|___|'''|```|\*\*|__|\*|_|`
+
+import re
+import tracelog
+from tracelog import log, levelTrace
+import profiler
+from profiler import stageModifierCheck
+
+regexSpecialCharacters = '\\^$.|?*+()[]{}'
+
+def buildModifierScanner(modifierDict):
+    alternatives = []
+    for key in sorted(modifierDict.keys(), key=len, reverse=True):
+        escapedKey = ''
+        for char in key:
+            if char in regexSpecialCharacters:
+                escapedKey = escapedKey + '\\'
+            escapedKey = escapedKey + char
+        alternatives.append(escapedKey)
+    return re.compile('|'.join(alternatives))
+
+
+# Style bits
+# ==========
+# Bits of fontController.styleMask. The bitmask can be used directly as an index into a table of fonts
+# (see getBodyFont in smackDown.py), a table of 1 << styleBitCount entries covers every combination.
+
+styleBold = 1
+styleItalic = 2
+styleCode = 4 # inline code or code block
+styleCodeBlock = 8
+styleBitCount = 4
+
+
+class fontController:
+
+    def __init__(self, startX=0, startY=0, sectionGap=4, lineSpacing=1.2, indexMainBody=0):
+        self.stack = []
+        self.modifierDict = {  #These will be checked for effect from longest to shortest (see buildModifierScanner)
+            '___': 'bolditalic',
+            '***': 'bolditalic',
+            '**' : 'bold',
+            '__' : 'bold',
+            '*'  : 'italic',
+            '_'  : 'italic',
+            '\'\'\'' : 'codeBlock',
+            '```' : 'codeBlock',
+            '`': 'code',
+
+            }
+        self.modifierBits = { # style bits set by each modifier type
+            'bold': styleBold,
+            'italic': styleItalic,
+            'bolditalic': styleBold | styleItalic,
+            'code': styleCode,
+            'codeBlock': styleCode | styleCodeBlock,
+            }
+        self.styleMask = 0 # bitmask of the active styles
+        self.styleCounts = [0] * styleBitCount # number of stacked modifiers holding each style bit
+        self._updateStyleFlags() # bold, italic, code, codeBlock
+        self.startX=startX # where to set cursor upon newline
+        self.startY=startY # where to set cursor upon new screen
+        self.X=startX # X insertion point
+        self.Y=startY # Y insertion point
+        self.sectionGap=sectionGap # amount of extra spaces for creating a new section
+        self.freshSection=True
+        self.lineSpacing=lineSpacing 
+        self.quoteDepth=0 
+        self.lastFontIndex=indexMainBody # this is the index of the last font that was printed
+        self.leftMatter='' # printed at the start of each wrapped line (set by tokenMatter)
+        self.modifierScanner=buildModifierScanner(self.modifierDict)
+
+# Getters and setters for insertion point
+    def setCursor(self, x, y):
+        self.X=x
+        self.Y=y
+
+    def setX(self, x):
+        self.X=x
+
+    def setY(self, y):
+        self.Y=y
+
+    def getCursor(self):
+        returnValue = (self.X, self.Y)
+        return returnValue
+
+    def getX(self):
+        return self.X
+
+    def getY(self):
+        return self.Y
+
+    def newSection(self):    # move down the insertionPoint by a sectionGap
+        insertionY=self.getY()
+        self.setCursor( self.startX, insertionY+self.sectionGap )
+
+    def endSection(self):    # parser state for a new section
+        self.resetModifier() # since this is a new section, reset the font
+        self.quoteDepth=0
+        self.freshSection=True # this is a new section
+
+
+# Snapshots
+# =========
+# snapshot returns the full formatting state as a flat list of numbers and strings, so it can be saved to a
+# file (see pageindex.py) and restored later to continue rendering from the middle of a document:
+#   [X, Y, lastFontIndex, quoteDepth, freshSection, leftMatter, modifier keys of the stack...]
+
+    def snapshot(self):
+        return [self.X, self.Y, self.lastFontIndex, self.quoteDepth, int(self.freshSection), self.leftMatter] + self.stack
+
+    def restore(self, state):
+        (self.X, self.Y, self.lastFontIndex, self.quoteDepth) = state[0:4]
+        self.freshSection = bool(state[4])
+        self.leftMatter = state[5]
+        self.stack = list(state[6:])
+        self.updateFontStatus()
+
+
+# Modifier state
+# ==============
+# The current style is kept as an integer bitmask (styleMask) with a reference count per style bit, so
+# pushing or popping a modifier updates the state in O(1) instead of walking the whole stack.
+# The booleans bold, italic, code and codeBlock are kept in step with the bitmask.
+
+    def _addStyle(self, key, step):
+        styleBits = self.modifierBits[self.modifierDict[key]]
+        counts = self.styleCounts
+        for bit in range(styleBitCount):
+            if styleBits & (1 << bit):
+                counts[bit] += step
+                if counts[bit] > 0:
+                    self.styleMask |= (1 << bit)
+                else:
+                    self.styleMask &= ~(1 << bit)
+        self._updateStyleFlags()
+
+    def _updateStyleFlags(self):
+        mask = self.styleMask
+        self.bold = (mask & styleBold) != 0
+        self.italic = (mask & styleItalic) != 0
+        self.code = (mask & styleCode) != 0 # for inline code or codeBlock
+        self.codeBlock = (mask & styleCodeBlock) != 0 # use line breaks for each line
+
+    def pushModifier(self, key):
+        self.stack.append(key)
+        self._addStyle(key, 1)
+
+    def popModifier(self):
+        key = self.stack.pop(-1)
+        self._addStyle(key, -1)
+        return key
+
+# updateFontStatus: rebuilds the style state from the whole fontModifier stack.
+# Only needed if the stack is replaced directly, pushModifier and popModifier keep the state updated.
+    def updateFontStatus(self):
+        self.styleMask = 0
+        self.styleCounts = [0] * styleBitCount
+        for item in self.stack:
+            self._addStyle(item, 1)
+        self._updateStyleFlags()
+
+
+# fontModifierCheck:
+# This checks for a key value in a string.  If the key is the leftmost item, it updates the fontModifier stack and return
+# the text in two chunks.  The first chunk is ready to print, the remaining chunk needs to be further processed.
+#
+    # fontModifierCheck: How to use this function
+        # run this function on the string and it returns: [firstChunk, key+secondChunk]
+        # get the current Font and print the first chunk
+        # if key+secondChunk !='': then further process the key+secondChunk
+        # else: nothing to do
+
+    def fontModifierCheck(self, text):
+        # Single pass over the text with the modifierScanner (built once in __init__): find the leftmost
+        # modifier, taking the longest key at that position.
+        if profiler.enabled:
+            profiler.begin(stageModifierCheck)
+        match = self.modifierScanner.search(text)
+
+        if match is not None: # found a key
+            firstKey = match.group(0)
+            keyIndex = match.start()
+            secondChunk=text[keyIndex+len(firstKey):]
+            if keyIndex == 0: # the key was at the first of the text, check if push or pop
+                returnValue=['', secondChunk] # the firstChunk was empty, so we update the font status and return one string.
+                if len(self.stack) > 0: # the stack is not empty
+                    if self.stack[-1] == firstKey: # This key matches the last key, so pop it off
+                        self.popModifier() # It's ok to pop modifiers if in code mode, since it should be a code modifier.
+                    else: # add this key to the stack.
+                        if self.code == True:
+                            returnValue=[firstKey, secondChunk] # this was a code block so send back the key for printing raw
+                            pass # If in code mode, can never add modifiers.  But send all the text back!
+
+                        else:
+                            self.pushModifier(firstKey)
+                else: # it's the first item, so go ahead and add this key to the stack
+                    self.pushModifier(firstKey)
+
+            else: # the key was not at the beginning of the line, break it into chunks and return for further processing
+                returnValue=[text[:keyIndex], text[keyIndex:]]
+
+        else: # No key was found
+            returnValue=[text, '']    # No key was found the full line should be sent back to be processed after the text is printed
+        if profiler.enabled:
+            profiler.end(stageModifierCheck)
+        return returnValue
+
+
+    def fontStatus(self): # returns the font status (bold, italic, code) with three Booleans
+        returnValue=(self.bold, self.italic, self.code)
+        return returnValue
+
+# resetModifier: clears back to the base font.
+    def resetModifier(self):
+        self.stack = []
+        self.styleMask = 0
+        self.styleCounts = [0] * styleBitCount
+        self._updateStyleFlags()
+
+
+# Line helpers
+# ============
+
+def isNewline(textLine):
+    # Accepts a textline and determines if it is only whitespace and a newlines
+    # Can use this to check whether to start a new section.
+    if len( textLine.strip() )==0:
+        return True
+    else:
+        return False
+
+def findTabLevel(textLine):
+    spaceCount=0
+    tabLevel=0
+    spacesPerTab = 4 # how many spaces equals a tab. should be defined at higher level ****
+    for character in textLine:
+        if character == '\t': # increase the tab level counter
+            spaceCount=0 # reset the space counter to zero
+            tabLevel += 1
+        elif character == ' ':
+            spaceCount += 1 # increase space counter
+            if spaceCount >= spacesPerTab: # enough spaces were encountered to equal one tab
+                spaceCount=0 # reset the space counter to zero
+                tabLevel += 1
+        else: # found a character other than a tab or whitespace
+            break
+    return tabLevel
+
+def blockQuoteLevel(textLine):
+    # strip out all the whitespaces
+#    print(textLine)
+    shrunkText="".join( textLine.split() )
+#    print(shrunkText)
+#    print(shrunkText.lstrip('>'))
+    quoteDepth=len(shrunkText) - len( shrunkText.lstrip('>') )
+    return quoteDepth
+
+# Headers
+# =======
+# This decides what font to used based on the number of Header hashes
+#
+def isHeader(thisText): # Returns the header depth (0: no Header) and remaining text on the line
+    trimmedLine=thisText.lstrip() # trim off any leading whitespace
+    noHashLine=trimmedLine.lstrip('#') # trim of any leading hashes ('#' designates a header in Markdown)
+    headerDepth=len(trimmedLine)-len(noHashLine) # equals 0 if there are no hashes (use baseline text)
+    returnValue=[headerDepth, noHashLine.lstrip()]
+    return returnValue
+
+# Unordered List
+# ==============
+# Determines if an unordered list is found, returns the remaining text, returns a line with leading whitespace trimmed.
+
+bulletStarters = {'* ', '*\t', '- ', '-\t', '+ ', '+\t'} # set of items that indicate the start of a bulleted list
+
+def isUnorderedList(textLine):
+    # determines if this line is an unordered list, based on bulletStarters
+    # if this isn't a list, return ''
+    # if this is a list, just return the remaining text to display
+    #
+    # Note: Be sure to count the tab level before running this, since leading whitespace is removed.
+    #
+    trimmedLine=textLine.lstrip()
+
+    if trimmedLine[0:2] in bulletStarters: # this is an unordered list
+        returnValue=(True, trimmedLine[2:].lstrip())
+
+    else: # not an unordered list
+        returnValue=(False, trimmedLine)
+    return returnValue
+
+# Ordered List
+# ==============
+# Determines if an Ordered list is found, reformats the line with the starting item number.
+
+def isOrderedList(textLine):
+    # determines if this list is an ordered list, with a starting number and period.
+    #
+    # Note: Be sure to count the tab level before running this, since leading whitespace is removed.
+    #
+    trimmedLine=textLine.lstrip()
+    subItems=trimmedLine.split('.', 1) # split off the first number, if present
+    if subItems[0].isdigit():
+        subItems[0]=subItems[0]+'. ' # add back the period and space to the first element of the list
+        subItems[1]=subItems[1].lstrip() # strip any excess whitespace from the first list.
+        returnValue=( True, ''.join(subItems) )  # if the first list item is a number, then this must be an ordered list
+    else:
+        returnValue=( False, trimmedLine )
+    return returnValue
+
+
+def checkLineBreak(textLine):
+    # Returns True if a line break is found on this line.
+    # In Markdown a line break is defined as two blank spaces before the end of line.
+    # This function accepts a single line of text and assumes that newlines are stripped from the textLine.
+    # Note: This ignores any tabs at the end of the line.
+    textLine=textLine.replace('\t', '') # delete all tabs on this line
+    if ( len(textLine) - len(textLine.rstrip(' ')) ) >= 2: # check if 2 spaces are found at the end of the line
+        return True
+    else:
+        return False
+
+
+# This returns a string with the tab level, quote level and the string.
+def getLeftMatter(tabLevel, quoteLevel):
+    leftMatter=''
+    for i in range(tabLevel):
+        leftMatter=leftMatter+'   ' # Add tabbing *** tabSpaces
+    for i in range(quoteLevel):
+        leftMatter=leftMatter+'>' # add quote level *** consider adding a grey box surrounding text line
+    return leftMatter
+
+
+# Body fonts
+# ==========
+# buildBodyFontIndex: returns the font index for each combination of style bits (fontController.styleMask)
+
+def buildBodyFontIndex(indexMainBody, indexBold, indexItalic, indexBoldItalic, indexCode):
+    bodyFontIndex = []
+    for styleMask in range(1 << styleBitCount):
+        if styleMask & styleCode:
+            bodyFontIndex.append(indexCode)
+        elif (styleMask & styleBold) and (styleMask & styleItalic):
+            bodyFontIndex.append(indexBoldItalic)
+        elif styleMask & styleBold:
+            bodyFontIndex.append(indexBold)
+        elif styleMask & styleItalic:
+            bodyFontIndex.append(indexItalic)
+        else:
+            bodyFontIndex.append(indexMainBody)
+    return bodyFontIndex
+
+
+# Layout tokens
+# =============
+# Each token is a tuple (kind, text, fontIndex).  text and fontIndex are only used by some kinds:
+#
+#   tokenText: (tokenText, text, fontIndex) print a run of text with word wrapping
+#   tokenCode: (tokenCode, text, fontIndex) same, with the code background color
+#   tokenBreak: (tokenBreak, '', None) line break, only if the cursor is not at the start of a line
+#   tokenSection: (tokenSection, '', None) end of a section: line break plus the sectionGap
+#   tokenHeader: (tokenHeader, '', fontIndex) line break plus the extra gap above a header in this font
+#   tokenMatter: (tokenMatter, leftMatter, None) leftMatter printed at the start of each wrapped line
+
+tokenText = 0
+tokenCode = 1
+tokenBreak = 2
+tokenSection = 3
+tokenHeader = 4
+tokenMatter = 5
+
+breakToken = (tokenBreak, '', None)
+sectionToken = (tokenSection, '', None)
+
+
+class markdownTokenizer:
+    # Converts markdown lines into layout tokens.  The parse state (modifier stack, quoteDepth,
+    # freshSection) is kept in the fontController.
+
+    def __init__(self, fontController, indexHeaders, indexMainBody, bodyFontIndex):
+        self.fontController = fontController
+        self.indexHeaders = indexHeaders # font index of each header level
+        self.indexMainBody = indexMainBody
+        self.bodyFontIndex = bodyFontIndex # font index by styleMask, see buildBodyFontIndex
+
+    def tokens(self, fileObject): # yields the tokens for every line of a file
+        for line in fileObject:
+            yield from self.tokenizeLine(line)
+
+    def tokenizeLine(self, myString):
+        controller = self.fontController
+        myString=myString.rstrip('\n\r')
+
+        thisFontIndex=None # if no change, then print with the mainBody font (with modifiers)
+
+        # Handle a blank newline
+        # if it's a newline, and freshSection=True, don't do anything.
+        # if it's a newline, and freshSection=False, we just finished up a section, move insertion point down by section distance
+        if isNewline(myString):
+            if (controller.freshSection == False):
+                controller.endSection()
+                yield sectionToken
+            # else ignore this repeated newline, no need to create a new section.
+            return
+
+        controller.freshSection=False
+
+        quoteLevel=blockQuoteLevel(myString) # get the quote level
+        if quoteLevel > 1: # only using tabbing if there isn't a quote Block
+            tabLevel=findTabLevel(myString) # get the tabbing level
+        else: 
+            tabLevel=0
+        if (quoteLevel != 0) and (quoteLevel != controller.quoteDepth): # update the quote Depth if a nonzero level is found.
+            controller.quoteDepth=quoteLevel
+            yield breakToken # new quote level found, add a line break
+        leftMatter=getLeftMatter(tabLevel, controller.quoteDepth)
+        if tracelog.level >= levelTrace:
+            log(levelTrace, 'leftMatter: {}, myString: {}', leftMatter, myString)
+
+        # strip any leading spaces, tabs and any quotes '>' for further processing
+        baseString=myString.lstrip(' \t>')
+
+        # Check header
+        [headerDepth, trimmedString]=isHeader(baseString)
+        if headerDepth > 0: # Just a header, print it
+            controller.quoteDepth=0 # reset the quote depth
+            controller.freshSection = True # define this as a new section after a header
+            if headerDepth > len(self.indexHeaders):
+                thisFontIndex=self.indexMainBody # Header is deeper than number of fonts available, use body text
+            else:
+                thisFontIndex=self.indexHeaders[headerDepth-1] 
+            yield (tokenHeader, '', thisFontIndex) # make room for the Header
+            leftMatter='' # no left matter is printed with a header
+
+        else: # it wasn't a header
+            [orderedList, trimmedString]=isOrderedList(baseString)
+            if orderedList:
+                if tracelog.level >= levelTrace:
+                    log(levelTrace, 'Ordered List found, text: \'{}\'', trimmedString)
+                yield breakToken # each list item starts on a new line
+            else:
+                [unOrderedList, trimmedString]=isUnorderedList(baseString)
+                if unOrderedList:
+                    yield breakToken # each list item starts on a new line
+                else:
+                    trimmedString=baseString
+
+        yield (tokenMatter, leftMatter, None)
+
+        # Go through each chunk, looking for any fontModifiers
+        for chunk in trimmedString.split(' '):
+            chunk=chunk+' '
+            if tracelog.level >= levelTrace:
+                log(levelTrace, 'chunk: \'{}\'', chunk)
+            yield from self.tokenizeChunk(chunk, thisFontIndex)
+
+        if (headerDepth > 0) or (controller.codeBlock):
+            # add make a lineBreak if it is a header or code block.
+            yield breakToken
+
+        elif checkLineBreak(myString): # it is body text, check if the end of string specifies a linebreak
+            yield breakToken
+
+    def tokenizeChunk(self, thisText, fontIndex):
+        # Breaks a chunk into text runs at any font modifiers.
+        # fontIndex: the header font, or None for body text (uses the font for the current modifiers)
+        controller = self.fontController
+        if (thisText.strip() == '```') or (thisText.strip() == '\'\'\''): # blank code sections are not printed
+            controller.fontModifierCheck(thisText)
+            return
+
+        secondText = thisText
+        while True:
+            (firstText, secondText) = controller.fontModifierCheck(secondText) # check for font modifiers.
+            if firstText == '' and secondText == '': # nothing left to print
+                break
+            if firstText != '':
+                if fontIndex == None: # this is some body text, not a header
+                    thisFontIndex = self.bodyFontIndex[controller.styleMask]
+                else:
+                    thisFontIndex = fontIndex
+                if controller.code:
+                    if (firstText.strip() != '```') and (firstText.strip() != '\'\'\''):
+                        yield (tokenCode, firstText, thisFontIndex)
+                else:
+                    yield (tokenText, firstText, thisFontIndex)
@@ -0,0 +1,663 @@
+# smackRender.py
+# Kevin Matocha - Copyright (C) 2020
+# Written for CircuitPython
+#
+# Markdown rendering for smackDown: draws the layout tokens from the markdownTokenizer (smackParse.py)
+# into a bitmap.
+#
+# A markdownRenderer holds everything needed to render one document: the target bitmap, the font set,
+# the page size and the formatting state (its fontController).  Several renderers can be used at the
+# same time, for example for two panes or for drawing a page offscreen, and renderers can share one
+# fontSet so the fonts are loaded once.  This module does not touch the display or open any font files
+# when it is imported.
+#
+# Text Processing Hierarchy
+# renderLine - Tokenizes one line and draws the tokens.
+#  -> markdownTokenizer.tokenizeLine (smackParse) - Deals with any line-related features, newlines, etc.
+#       -> tokenizeChunk - Breaks line into chunks, including processing any font modifiers.
+#  -> renderTokens - Draws the layout tokens (text runs, line breaks, section gaps, left matter)
+#       -> layoutWords - Manages word-wrapping, and draws the words of a line together
+#          -> writeAndWrapTextSteps - Hard wrapping by line segment for words wider than the display
+#          -> placeText (from textMap library) - Displays the text on the screen
+
+import json
+import os
+import time
+
+import textmap
+from textmap import placeText, measureText, getFontMetrics, nullBitmap, isPrintableAscii
+from smackParse import fontController, markdownTokenizer, buildBodyFontIndex
+from smackParse import tokenText, tokenCode, tokenBreak, tokenSection, tokenHeader, tokenMatter
+from fontregistry import fontRegistry
+from pageindex import buildPageIndex, loadPageIndex, savePageIndex, pageLines, buildLineIndex, sourceKey
+import tracelog
+from tracelog import log, levelInfo, levelDebug, levelTrace
+import profiler
+from profiler import stageRenderLine, stageRenderTokens, stageLayout
+
+
+def loadFont(fileName, inMemory=False):
+    # Opens a packed font (.pkf, see packedfont.py) or a BDF file through its seek table (see bdfindex.py)
+    # inMemory: read the whole packed font into RAM, instead of reading each glyph when it is loaded
+    from packedfont import loadPackedFont, packedSuffix
+    if fileName.endswith(packedSuffix):
+        return loadPackedFont(fileName, inMemory)
+    from bdfindex import loadIndexedFont
+    return loadIndexedFont(fileName)
+
+
+class fontStyle:
+    # A font as it is used by the renderer: its index in the fontSet, its baseline offset, its metrics and
+    # its line height.  The renderer passes these handles down to placeText, so drawing a word does not
+    # search the font list or look up the metrics again.  The metrics are found on the first use, so
+    # creating a fontStyle does not open the font file.
+    def __init__(self, index, font, offsetY=0):
+        self.index = index
+        self.font = font
+        self.offsetY = offsetY # moves the baseline down by this many pixels
+        self._metrics = None
+        self._lineSpacing = None
+        self._lineHeight = 0
+
+    def metrics(self): # the textmap.fontMetrics of the font
+        if self._metrics is None:
+            self._metrics = getFontMetrics(self.font)
+        return self._metrics
+
+    def lineHeight(self, lineSpacing): # distance between lines, same as textmap.lineSpacingY
+        if lineSpacing != self._lineSpacing:
+            self._lineHeight = int(lineSpacing * self.metrics().fontHeight)
+            self._lineSpacing = lineSpacing
+        return self._lineHeight
+
+
+class fontSet:
+    # The fonts for rendering markdown, and which font is used for each kind of text.
+    # Fonts are opened on their first use, and each glyph is loaded the first time it is needed (see
+    # fontregistry.py), so creating a fontSet does not open any files.  Each font has a fontStyle in
+    # styles, with the same index.
+    def __init__(self, fontFiles, indexHeaders, indexMainBody, indexBold, indexItalic, indexBoldItalic, indexCode,
+                 fontOffsetY=None, loader=loadFont, maxGlyphs=None, preload=None):
+        # indexHeaders: font index for each header level, deeper headers use indexMainBody
+        # fontOffsetY: moves the baseline of each font down by this many pixels (None: no offsets)
+        # maxGlyphs, preload: see fontregistry.lazyFont
+        self.fontFiles = list(fontFiles)
+        self.registry = fontRegistry(fontFiles, loader, maxGlyphs, preload)
+        self.fonts = self.registry.fonts
+        self.indexHeaders = indexHeaders
+        self.indexMainBody = indexMainBody
+        self.indexCode = indexCode
+        self.bodyFontIndex = buildBodyFontIndex(indexMainBody, indexBold, indexItalic, indexBoldItalic, indexCode)
+        if fontOffsetY is None:
+            fontOffsetY = [0] * len(fontFiles)
+        self.fontOffsetY = list(fontOffsetY)
+        self.styles = []
+        for index in range(len(self.fonts)):
+            self.styles.append(fontStyle(index, self.fonts[index], self.fontOffsetY[index]))
+
+    def addFont(self, fileName, offsetY=0):
+        # Adds a font after the ones given to the constructor, returns its fontStyle.  The font file is
+        # not opened until it is used.
+        index = self.registry.addFont(fileName)
+        self.fontFiles.append(fileName)
+        self.fontOffsetY.append(offsetY)
+        style = fontStyle(index, self.fonts[index], offsetY)
+        self.styles.append(style)
+        return style
+
+    def fontHeight(self, fontIndex): # height of the 'M' glyph, the metrics table is built on the first use of the font
+        return self.styles[fontIndex].metrics().fontHeight
+
+    def bodyFont(self, styleMask): # the body text font for the style bitmask (fontController.styleMask)
+        return self.fonts[self.bodyFontIndex[styleMask]]
+
+
+class markdownRenderer:
+    def __init__(self, bitmap, fonts, width, height, startX=1, startY=3, sectionGap=6, lineSpacing=1.35,
+                 session=None, refreshEveryLine=True, pageCache=None):
+        # bitmap: the bitmap to draw into, palette index 0 is the background, 1 the text and 2 the code background
+        # fonts: a fontSet, can be shared with other renderers
+        # width: right edge for word wrapping, height: page height, used for the page index
+        # session: optional dirtyrect.renderSession that collects the regions drawn by this renderer
+        # refreshEveryLine: with a session, push the changed region after each line (False: once per page)
+        # pageCache: optional pagecache.pageCache, pages are loaded from it and stored after they are rendered
+        self.bitmap = bitmap
+        self.fonts = fonts
+        self.styles = fonts.styles # fontStyle for each font index
+        self.width = width
+        self.height = height
+        self.session = session
+        self.refreshEveryLine = refreshEveryLine
+        self.pageCache = pageCache
+        self.stepGlyphs = 16 # characters drawn in each step of renderLineSteps
+        self.controller = fontController(startX=startX, startY=startY,
+                                         sectionGap=sectionGap,
+                                         lineSpacing=lineSpacing,
+                                         indexMainBody=fonts.indexMainBody,
+                                         )
+        self.documentStartState = self.controller.snapshot() # formatting state at the top of a document
+        self.tokenizer = markdownTokenizer(self.controller, fonts.indexHeaders, fonts.indexMainBody, fonts.bodyFontIndex)
+        # the page index is rebuilt if any of these change, together with the fonts (see indexSettings)
+        self.layoutSettings = [fonts.fontFiles, width, height, startX, startY, sectionGap, lineSpacing]
+
+    def startDocument(self): # reset the formatting state to the top of a document
+        self.controller.restore(self.documentStartState)
+
+    def fontHeight(self, fontIndex):
+        return self.fonts.fontHeight(fontIndex)
+
+    def placeOffsetText(self, text, style, lineSpacing,
+                        xPosition, yPosition,
+                        textPaletteIndex=1,
+                        backgroundPaletteIndex=0,
+                        scale=1,
+                        ):
+        # style: the fontStyle of the font to use
+
+        thisFontYOffset = style.offsetY # the baseline offset for this font
+        offsetInsertionY = yPosition + thisFontYOffset # offsets the baseline position for this font
+        (tempInsertionX, tempInsertionY) = placeText(self.bitmap, text, # Write the character
+                                                    style.font, lineSpacing,
+                                                    xPosition, offsetInsertionY,
+                                                    textPaletteIndex, backgroundPaletteIndex,
+                                                    scale)
+
+        self.controller.setCursor(tempInsertionX, tempInsertionY-thisFontYOffset)
+        returnValue = (tempInsertionX, tempInsertionY-thisFontYOffset) # adjust the baseline back
+        return returnValue
+
+    def writeMatter(self, text, style): #print something exactly where the cursor is
+        controller = self.controller
+        (insertionX, insertionY)=controller.getCursor()
+
+        (insertionX, insertionY) = self.placeOffsetText(text,
+                                        style, controller.lineSpacing,
+                                        insertionX, insertionY)
+
+        if tracelog.level >= levelTrace:
+            log(levelTrace, 'writing left Matter: {}', text)
+
+        controller.setCursor(insertionX, insertionY)
+        controller.lastFontIndex=style.index
+
+    def writeAndWrapTextSteps(self, text, style, leftMatter, matterStyle, code=False): # Handles any word wrapping.
+        # style, matterStyle: the fontStyle of the text and of the leftMatter
+        # code: print with the alternate background color for code
+        # Yields the number of characters drawn after each line of a hard wrapped word and after the text.
+        controller = self.controller
+        displayWidth = self.width
+
+        (insertionX, insertionY)=controller.getCursor()
+
+        controller.lastFontIndex=style.index # update the lastFont that was used
+
+        # Check the bounding box of the proposed text
+        (boundingBoxWidth, boundingBoxHeight)=measureText(text, style.font, controller.lineSpacing)
+
+        ###### Any newline needs to start with leftMatter *****  Add print of LeftMatter, be sure to avoid infinite loop.
+        if insertionX+boundingBoxWidth > displayWidth:  # This box printed off the right of the screen, move to new line
+            lineYChange=style.lineHeight(controller.lineSpacing)
+
+            if boundingBoxWidth > displayWidth-controller.startX: # This is a super long line, perform hard wrapping by character
+                # Note: if there are font formatting elements in a super long string, it will be broken into "chunks", so the character
+                # wrapping will get interrupted by newlines.  This is left as "feature" for now.
+                for count in self.hardWrapSteps(text, style, leftMatter, lineYChange):
+                    yield count
+                (insertionX, insertionY)=controller.getCursor()
+                text='' # clear the text buffer, since it was super-wrapped and printed
+
+            else:
+                ##### *** left matter should always be in the indexMainBody font - Need to be printed as a separate group!
+                controller.setX(controller.startX) # start a new line, x position
+                controller.setY(insertionY+lineYChange) # update the new line, y position
+                if tracelog.level >= levelTrace:
+                    log(levelTrace, 'else section Newline')
+        if (controller.getX() == controller.startX): #first of the ine
+            if tracelog.level >= levelTrace:
+                log(levelTrace, 'WandWT leftMatter: {}, text: {}', leftMatter, text)
+            if (leftMatter != ''):
+                self.writeMatter(leftMatter, matterStyle) # wrapped, do not include listMatter
+            (insertionX, insertionY)=controller.getCursor() # get the updated cursor position
+
+        # Updated to use background color for code
+        if code:
+            if tracelog.level >= levelTrace:
+                log(levelTrace, 'Code printing: \'{}\'', text)
+            (insertionX, insertionY) = self.placeOffsetText(text,
+                                            style, controller.lineSpacing,
+                                            insertionX, insertionY, backgroundPaletteIndex=2)
+            # use the alternate background color for code
+        else:
+            (insertionX, insertionY) = self.placeOffsetText(text,
+                                            style, controller.lineSpacing,
+                                            insertionX, insertionY)
+
+        controller.setCursor(insertionX, insertionY)
+        if text:
+            yield len(text)
+
+    def hardWrap(self, text, style, leftMatter, lineYChange):
+        # Hard wrapping of a word that is wider than the display (such as a URL), starting at the cursor.
+        # The advance widths of the characters are summed in one pass to find where each line segment
+        # ends, then each segment is drawn with one placeText call, instead of measuring and placing every
+        # character separately.  The leftMatter is written at the start of each new line (in the font of
+        # the word, as the character by character version did).
+        for count in self.hardWrapSteps(text, style, leftMatter, lineYChange):
+            pass
+
+    def hardWrapSteps(self, text, style, leftMatter, lineYChange):
+        # Generator version of hardWrap, yields the number of characters drawn after each line segment, so a
+        # long word is not drawn in one step.  The cursor is set when the generator is exhausted.
+        controller = self.controller
+        lineSpacing = controller.lineSpacing
+        displayWidth = self.width
+        startX = controller.startX
+        metrics = style.metrics()
+        slots = metrics._slots
+        advance = metrics.advance
+        fixedAdvance = metrics.fixedAdvance # every character has this width (code fonts, ASCII text)
+        if fixedAdvance is not None and not isPrintableAscii(text):
+            fixedAdvance = None
+
+        (x, y) = controller.getCursor()
+        segmentStart = 0 # index of the first character of the segment that is not drawn yet
+        segmentX = x
+        for i in range(len(text)):
+            if fixedAdvance is not None:
+                width = fixedAdvance
+            else:
+                codePoint = ord(text[i])
+                slot = slots.get(codePoint)
+                if slot is None:
+                    slot = metrics.slot(codePoint)
+                width = advance[slot] if slot >= 0 else 0
+            if x + width > displayWidth: # Needs a newline
+                if tracelog.level >= levelTrace:
+                    log(levelTrace, 'char: {} making a newline', text[i])
+                if segmentStart < i:
+                    self.placeOffsetText(text[segmentStart:i], style, lineSpacing, segmentX, y)
+                    yield i - segmentStart
+                x = startX
+                y = y + lineYChange
+                segmentStart = i
+                segmentX = x
+            if (x == startX) and (leftMatter != ''): # first of a line: write leftMatter in newline
+                if segmentStart < i:
+                    self.placeOffsetText(text[segmentStart:i], style, lineSpacing, segmentX, y)
+                    yield i - segmentStart
+                (x, y) = self.placeOffsetText(leftMatter, style, lineSpacing, x, y)
+                segmentStart = i
+                segmentX = x
+            x = x + width
+        count = len(text) - segmentStart
+        if count > 0:
+            self.placeOffsetText(text[segmentStart:], style, lineSpacing, segmentX, y)
+        controller.setCursor(x, y)
+        if count > 0:
+            yield count
+
+    def lineBreak(self, fontIndex):
+        controller = self.controller
+        (insertionX,insertionY)=controller.getCursor()
+        if insertionX != controller.startX:
+            controller.setCursor( controller.startX, insertionY+self.styles[fontIndex].lineHeight(controller.lineSpacing) )
+
+    def layoutWords(self, words):
+        # Line layout for a run of words, words: list of (text, fontIndex, code).
+        #
+        # The break points are found in one pass: each word is measured once (measureText) and the x
+        # positions are the running sum of the widths.  Printable ASCII words in a fixed-advance font
+        # (code) are measured from their length instead.  A word that does not fit starts a new line, and the
+        # leftMatter is drawn at the start of each line.  Neighboring words on the same line with the same
+        # font and style are joined and drawn with a single placeText call.  A word that is wider than the
+        # display is hard wrapped by writeAndWrapTextSteps.
+        profiling = profiler.enabled
+        if profiling:
+            profiler.begin(stageLayout)
+        try:
+            for count in self.layoutWordsSteps(words):
+                pass
+        finally:
+            if profiling:
+                profiler.end(stageLayout)
+
+    def layoutWordsSteps(self, words):
+        # Generator version of layoutWords, yields the number of characters drawn after each placeText call
+        # for a group of words, and after each line of a hard wrapped word.  The cursor is set when the
+        # generator is exhausted.
+        controller = self.controller
+        styles = self.styles
+        lineSpacing = controller.lineSpacing
+        displayWidth = self.width
+        startX = controller.startX
+        leftMatter = controller.leftMatter
+        matterIndex = self.fonts.indexMainBody # leftMatter is always printed in the base font
+        matterStyle = styles[matterIndex]
+
+        (x, y) = controller.getCursor()
+        lastFontIndex = controller.lastFontIndex
+        group = [] # words joined for one placeText call
+        groupX = groupY = groupFont = groupCode = None
+
+        for (text, fontIndex, code) in words:
+            style = styles[fontIndex]
+            lastFontIndex = fontIndex
+            fixedAdvance = style.metrics().fixedAdvance
+            if fixedAdvance is not None and isPrintableAscii(text):
+                wordWidth = len(text) * fixedAdvance
+            else:
+                wordWidth = measureText(text, style.font, lineSpacing)[0]
+            if x + wordWidth > displayWidth: # This word does not fit, move to a new line
+                if wordWidth > displayWidth-startX: # wider than the display, perform hard wrapping by character
+                    if group:
+                        yield self._placeGroup(group, groupFont, groupCode, groupX, groupY)
+                        group = []
+                    controller.setCursor(x, y)
+                    for count in self.writeAndWrapTextSteps(text, style, leftMatter, matterStyle, code):
+                        yield count
+                    (x, y) = controller.getCursor()
+                    lastFontIndex = controller.lastFontIndex
+                    continue
+                if group:
+                    yield self._placeGroup(group, groupFont, groupCode, groupX, groupY)
+                    group = []
+                x = startX
+                y = y + style.lineHeight(lineSpacing)
+            if (x == startX) and (leftMatter != ''): # first word of a line: write the leftMatter
+                if group:
+                    yield self._placeGroup(group, groupFont, groupCode, groupX, groupY)
+                    group = []
+                (x, y) = self.placeOffsetText(leftMatter, matterStyle, lineSpacing, x, y)
+                lastFontIndex = matterIndex
+            if group and ((fontIndex != groupFont) or (code != groupCode)):
+                yield self._placeGroup(group, groupFont, groupCode, groupX, groupY)
+                group = []
+            if not group:
+                (groupX, groupY, groupFont, groupCode) = (x, y, fontIndex, code)
+            group.append(text)
+            x = x + wordWidth
+
+        if group:
+            count = self._placeGroup(group, groupFont, groupCode, groupX, groupY)
+        else:
+            count = 0
+        controller.setCursor(x, y)
+        controller.lastFontIndex = lastFontIndex
+        if count:
+            yield count
+
+    def _placeGroup(self, group, fontIndex, code, x, y): # draws words joined by layoutWords, returns the character count
+        text = ''.join(group)
+        if code: # use the alternate background color for code
+            self.placeOffsetText(text, self.styles[fontIndex], self.controller.lineSpacing,
+                                 x, y, backgroundPaletteIndex=2)
+        else:
+            self.placeOffsetText(text, self.styles[fontIndex], self.controller.lineSpacing, x, y)
+        return len(text)
+
+    def drawToken(self, kind, text, fontIndex):
+        # Draws one layout token from the markdownTokenizer (see smackParse.py), returns the number of
+        # characters drawn.  A line of text is best drawn with renderTokens, which lays out the words of a
+        # line together.
+        controller = self.controller
+        if kind == tokenText:
+            self.layoutWords([(text, fontIndex, False)])
+            return len(text)
+        elif kind == tokenCode:
+            self.layoutWords([(text, fontIndex, True)])
+            return len(text)
+        elif kind == tokenBreak:
+            self.lineBreak(controller.lastFontIndex)
+        elif kind == tokenMatter:
+            controller.leftMatter=text
+        elif kind == tokenSection:
+            self.lineBreak(controller.lastFontIndex) # finish the current line
+            controller.newSection() # update the insertion point for a new sectionGap
+        elif kind == tokenHeader:
+            # Adjust the offset of the y-insertion point to make room for the Header
+            self.lineBreak(controller.lastFontIndex) # add a line break
+            yOffset = int( self.fontHeight(fontIndex) * controller.lineSpacing*1/3 )  # is this right?
+            controller.setY(controller.getY()+yOffset)
+        return 0
+
+    def renderTokens(self, tokens):
+        # Draws a stream of layout tokens from the markdownTokenizer.  The words between other tokens are
+        # collected and laid out together (see layoutWords).
+        profiling = profiler.enabled
+        if profiling:
+            profiler.begin(stageRenderTokens)
+        try:
+            words = []
+            for (kind, text, fontIndex) in tokens:
+                if kind == tokenText or kind == tokenCode:
+                    words.append((text, fontIndex, kind == tokenCode))
+                else:
+                    if words:
+                        self.layoutWords(words)
+                        words = []
+                    self.drawToken(kind, text, fontIndex)
+            if words:
+                self.layoutWords(words)
+        finally:
+            if profiling:
+                profiler.end(stageRenderTokens)
+
+    def renderLine(self, myString):
+        profiling = profiler.enabled
+        if profiling:
+            profiler.begin(stageRenderLine)
+        try:
+            textmap.setDirtyTracker(self.session) # placeText reports the drawn regions to this renderer's session
+            self.renderTokens(self.tokenizer.tokenizeLine(myString))
+        finally:
+            if profiling:
+                profiler.end(stageRenderLine)
+
+    def renderLineSteps(self, myString):
+        # Generator version of renderLine, yields the number of characters drawn.  The words are laid out in
+        # groups of about stepGlyphs characters, with a step after each placeText call (see layoutWordsSteps),
+        # so a word that is hard wrapped takes one step per line.  Other tokens take a step each.  The position
+        # within the line is held by the generators and the formatting state by the fontController, so
+        # rendering can stop after any step and resume later.  The profiler stages are not timed here, they
+        # would include the time between the steps.
+        session = self.session
+        stepGlyphs = self.stepGlyphs
+        words = []
+        glyphs = 0
+        for (kind, text, fontIndex) in self.tokenizer.tokenizeLine(myString):
+            if kind == tokenText or kind == tokenCode:
+                words.append((text, fontIndex, kind == tokenCode))
+                glyphs += len(text)
+                if glyphs < stepGlyphs:
+                    continue
+            textmap.setDirtyTracker(session) # another renderer may have drawn since the last step
+            if words:
+                for count in self.layoutWordsSteps(words):
+                    yield count
+                    textmap.setDirtyTracker(session)
+                words = []
+            if kind != tokenText and kind != tokenCode:
+                self.drawToken(kind, text, fontIndex)
+                yield 0
+            glyphs = 0
+        if words:
+            textmap.setDirtyTracker(session)
+            for count in self.layoutWordsSteps(words):
+                yield count
+                textmap.setDirtyTracker(session)
+
+    # Page index
+    # ==========
+    # The page index (see pageindex.py) records the file offset and the fontController state at the start
+    # of each screen page, so a page can be rendered without rendering everything above it.
+
+    def layoutRowHeight(self): # height of the current text row
+        return self.styles[self.controller.lastFontIndex].lineHeight(self.controller.lineSpacing)
+
+    def openPageIndex(self, fileName): # loads the page index, or runs a layout pass to build it
+        pages=loadPageIndex(fileName, self.indexSettings())
+        if pages is None:
+            log(levelInfo, 'Building page index: {}', fileName)
+            (drawBitmap, drawSession)=(self.bitmap, self.session)
+            self.bitmap=nullBitmap(self.width) # layout only, nothing is drawn
+            self.session=None
+            self.startDocument()
+            try:
+                pages=buildPageIndex(fileName, self.controller, self.renderLine, self.layoutRowHeight, self.height)
+            finally:
+                (self.bitmap, self.session)=(drawBitmap, drawSession)
+            if profiler.enabled:
+                profiler.report('page index layout: {}'.format(fileName))
+                profiler.reset()
+            if not savePageIndex(fileName, pages, self.indexSettings()):
+                log(levelInfo, 'Page index not saved (read-only filesystem)')
+        return pages
+
+    def openLineIndex(self, fileName, checkpointEvery=4):
+        # Runs a layout pass to build the lineIndex used for scrolling (see pageindex.py and scroller.py)
+        log(levelInfo, 'Building line index: {}', fileName)
+        (drawBitmap, drawSession)=(self.bitmap, self.session)
+        self.bitmap=nullBitmap(self.width) # layout only, nothing is drawn
+        self.session=None
+        self.startDocument()
+        try:
+            lines=buildLineIndex(fileName, self.controller, self.renderLine, self.layoutRowHeight, checkpointEvery)
+        finally:
+            (self.bitmap, self.session)=(drawBitmap, drawSession)
+        return lines
+
+    def renderPage(self, fileName, pages, pageNumber): # clears the bitmap and renders one page
+        if self._loadCachedPage(fileName, pages, pageNumber):
+            return
+        session = self._startPage(pages, pageNumber)
+        lineCount=0
+        for line in pageLines(fileName, pages, pageNumber):
+            if tracelog.level >= levelDebug:
+                log(levelDebug, 'lineCount: {}, line: \'{}\'', lineCount, line.rstrip('\n\r'))
+            self.renderLine(line)
+            if self.refreshEveryLine and (session is not None):
+                session.flush() # push the region changed by this line
+            lineCount += 1
+        self._endPage(pageNumber)
+        if self.pageCache is not None:
+            self.pageCache.store(self.pageCacheKey(fileName, pages, pageNumber), self.bitmap)
+
+    def renderPageSteps(self, fileName, pages, pageNumber):
+        # Generator version of renderPage, yields the number of characters drawn after each token so the
+        # caller can spread the work over time slices (see renderJob).  The page is complete when the
+        # generator is exhausted.  Storing the page in the pageCache is done in steps of a few rows.
+        if self._loadCachedPage(fileName, pages, pageNumber):
+            return
+        session = self._startPage(pages, pageNumber)
+        lineCount=0
+        for line in pageLines(fileName, pages, pageNumber):
+            if tracelog.level >= levelDebug:
+                log(levelDebug, 'lineCount: {}, line: \'{}\'', lineCount, line.rstrip('\n\r'))
+            for glyphCount in self.renderLineSteps(line):
+                yield glyphCount
+            if self.refreshEveryLine and (session is not None):
+                session.flush() # push the region changed by this line
+            lineCount += 1
+        self._endPage(pageNumber)
+        if self.pageCache is not None:
+            for step in self.pageCache.storeSteps(self.pageCacheKey(fileName, pages, pageNumber), self.bitmap):
+                yield 0
+
+    def indexSettings(self):
+        # Everything that moves the page breaks: the layout settings, the font file versions and the
+        # mapping of headers and styles to fonts
+        return self.layoutSettings + [self.fontFilesKey(), self.fonts.fontOffsetY, list(self.fonts.indexHeaders),
+                                      self.fonts.bodyFontIndex]
+
+    def pageCacheKey(self, fileName, pages, pageNumber):
+        # Identifies a rendered page: the file version, the layout settings, the fonts and the page
+        return json.dumps([sourceKey(fileName, self.indexSettings()), pageNumber, pages[pageNumber]])
+
+    def fontFilesKey(self):
+        # The size and mtime of each font file, a font that is replaced under the same name changes the key
+        versions = []
+        for fontFile in self.fonts.fontFiles:
+            try:
+                fileStat = os.stat(fontFile)
+                versions.append([fileStat[6], fileStat[8]])
+            except OSError: # not on the filesystem
+                versions.append(None)
+        return versions
+
+    def _loadCachedPage(self, fileName, pages, pageNumber): # returns True if the page was loaded from the pageCache
+        if self.pageCache is None:
+            return False
+        if not self.pageCache.load(self.pageCacheKey(fileName, pages, pageNumber), self.bitmap):
+            return False
+        if tracelog.level >= levelDebug:
+            log(levelDebug, 'page {} loaded from the page cache', pageNumber)
+        if self.session is not None:
+            self.session.markAll()
+            self.session.flush()
+        return True
+
+    def _startPage(self, pages, pageNumber): # clears the bitmap and restores the state at the top of the page
+        session = self.session
+        self.bitmap.fill(0)
+        if session is not None:
+            session.markAll()
+        self.controller.restore(pages[pageNumber][1])
+        return session
+
+    def _endPage(self, pageNumber):
+        if self.session is not None:
+            self.session.flush()
+        if profiler.enabled:
+            profiler.report('page {}'.format(pageNumber))
+            profiler.reset()
+
+class renderJob:
+    # Runs a rendering generator (such as markdownRenderer.renderPageSteps) a little at a time, so an event
+    # loop can check for input between the steps, and cancel the job or start another one:
+    #
+    #     job = renderJob(myRenderer.renderPageSteps(fileName, pages, pageNumber))
+    #     while job.run(timeBudgetMs=10):
+    #         checkButtons() # may call job.cancel()
+    #
+    # A step draws one group of words, or one line of a word that is hard wrapped, so the longest pause is
+    # the time to draw about one line of text.
+    #
+    # With a time budget, the job stops before a step that would probably end after the deadline: the next
+    # step is expected to take as long as the longest recent step, plus half.  The estimate drops by 1/8 at each call
+    # to run, so one slow step (a font file being opened) does not shorten the runs for long.
+    def __init__(self, steps):
+        self._steps = steps
+        self.done = False
+        self.glyphs = 0 # characters drawn so far
+        self._stepNs = 0 # expected time of the next step
+
+    def run(self, glyphBudget=None, timeBudgetMs=None):
+        # Renders until glyphBudget characters are drawn or the next step would end after timeBudgetMs
+        # milliseconds (at least one step, with no budget it runs to the end).  Returns True while there is
+        # more to render.
+        if self.done:
+            return False
+        if timeBudgetMs is not None:
+            stepStart = time.monotonic_ns()
+            deadline = stepStart + timeBudgetMs * 1000000
+            self._stepNs -= self._stepNs >> 3
+        glyphs = 0
+        for glyphCount in self._steps:
+            glyphs += glyphCount
+            if timeBudgetMs is not None:
+                now = time.monotonic_ns()
+                if now - stepStart > self._stepNs:
+                    self._stepNs = now - stepStart
+                stepStart = now
+            if ((glyphBudget is not None) and (glyphs >= glyphBudget)) or \
+               ((timeBudgetMs is not None) and (now + self._stepNs + (self._stepNs >> 1) >= deadline)):
+                self.glyphs += glyphs
+                return True
+        self.glyphs += glyphs
+        self.done = True
+        return False
+
+    def cancel(self): # stop rendering, the bitmap keeps what was drawn so far
+        if not self.done:
+            self._steps.close()
+        self.done = True
@@ -48,14 +48,195 @@ Implementation Notes
 """
 
 # imports
+from array import array
+import tracelog
+from tracelog import log, levelError
+import profiler
+from profiler import stageBoundingBox, stagePlaceText, stageGlyphLookup
+
+try:
+    import bitmaptools # CircuitPython, fills a rectangle of a displayio.Bitmap in one call
+except ImportError:
+    bitmaptools = None
 
 __version__ = "0.0.0-auto.0"
 __repo__ = "https://github.com/kmatch98/CircuitPython_textMap.git"
 
+
+# nullBitmap: a bitmap with zero height, everything placed in it is clipped.  Used to lay out text
+# (cursor positions, wrapping) without drawing anything.
+
+class nullBitmap:
+    def __init__(self, width):
+        self.width = width
+        self.height = 0
+
+    def __getitem__(self, index):
+        return 0
+
+    def __setitem__(self, index, value):
+        pass
+
+    def fill(self, value):
+        pass
+
+
+# Font metrics
+# ============
+# Measuring and placing text only needs a handful of integers per glyph.  Instead of calling
+# font.get_glyph for every character (and again for the 'M' glyph on every call), each font gets a
+# fontMetrics table the first time it is used.  Glyphs are added to the table the first time their
+# codepoint is seen, and the metrics are held in integer arrays indexed by a slot number.  The table does
+# not keep the glyph objects, so a font can drop glyph bitmaps that are not in use (see fontregistry.py).
+#
+#   advance: shift_x, the cursor movement after the glyph
+#   width, height: size of the glyph bounding box
+#   dx, dy: offset of the glyph bounding box
+#
+# Font-wide values:
+#   fontHeight: height of the 'M' glyph, used for the line spacing and the baseline
+#   ascent, descent: extent above and below the baseline, measured on 'M g'
+#   textLineHeight: height of a line with ascenders and descenders, same as bounding_box('M g')
+#   glyphTop, glyphBottom: rows covered by the glyphs in the table, relative to the top of the 'M' glyph
+#
+# Fixed-advance fonts:
+# Code fonts (Terminus, Hack) move the cursor by the same amount for every character.  When the table is
+# built, the printable ASCII characters (' ' to '~') are checked, starting with a few narrow and wide
+# ones so a proportional font is rejected after two or three glyphs.  For a fixed-advance font:
+#   fixedAdvance: the advance of every printable ASCII character, None for other fonts
+#   fixedDepth: the largest height of a printable ASCII glyph below the top of the 'M' glyph
+#   asciiGlyphs: the glyph objects of the printable ASCII characters, indexed by codepoint - 32
+# Printable ASCII text in such a font is measured as the number of characters times fixedAdvance, and
+# placeText takes its glyphs from asciiGlyphs, without the slot and get_glyph lookups for each character.
+# The 95 glyphs are kept in memory, also when the font limits its resident glyphs.
+#   asciiPlacements: for each ASCII glyph drawn so far (built by asciiPlacement on first use), a tuple
+#       (glyph, dx, yOffset, width, height, ink, inCell).  ink holds 4 bytes (row, start, length, value)
+#       for each run of the glyph with a value other than 0, so placeText writes only the pixels of the
+#       characters, without clipping each run or reading the row runs of the glyph.  inCell is True if
+#       the glyph box is within the text box of its character (the advance by textLineHeight) and no
+#       ASCII glyph reaches into the next character: on a text background that was filled first, the
+#       background pixels of such a glyph are already drawn.
+
+class fontMetrics:
+    def __init__(self, font):
+        self.font = font
+        self._slots = {} # codepoint -> slot, -1 if the font has no glyph for this codepoint
+        self.advance = array('h')
+        self.width = array('h')
+        self.height = array('h')
+        self.dx = array('h')
+        self.dy = array('h')
+
+        self.fontHeight = font.get_glyph(ord('M')).height
+        self.glyphTop = 0
+        self.glyphBottom = self.fontHeight
+        self.textLineHeight = 0
+        for char in 'M g': # check height with ascender and descender
+            slot = self.slot(ord(char))
+            if slot >= 0:
+                self.textLineHeight = max(self.textLineHeight, self.fontHeight - self.dy[slot])
+        self.ascent = self.fontHeight
+        self.descent = self.textLineHeight - self.fontHeight
+        self.fixedAdvance = None
+        self.fixedDepth = 0
+        self.asciiGlyphs = None
+        self.asciiPlacements = None
+        self._checkFixedAdvance()
+
+    def _checkFixedAdvance(self):
+        advance = None
+        for char in 'iMW.': # narrow and wide glyphs first
+            slot = self.slot(ord(char))
+            if slot < 0:
+                return
+            if advance is None:
+                advance = self.advance[slot]
+            elif self.advance[slot] != advance:
+                return
+        if advance <= 0:
+            return
+        glyphs = []
+        depth = 0
+        columns = True # no glyph reaches into the next character
+        for codePoint in range(32, 127):
+            slot = self.slot(codePoint)
+            if slot < 0 or self.advance[slot] != advance:
+                return
+            glyphs.append(self.font.get_glyph(codePoint))
+            depth = max(depth, self.fontHeight - self.dy[slot])
+            if self.dx[slot] < 0 or self.dx[slot] + self.width[slot] > advance:
+                columns = False
+        self.fixedAdvance = advance
+        self.fixedDepth = depth
+        self.asciiGlyphs = glyphs
+        self.asciiPlacements = [None] * len(glyphs)
+        self._asciiColumns = columns
+
+    def asciiPlacement(self, index): # builds the entry of asciiPlacements for character index + 32
+        glyph = self.asciiGlyphs[index]
+        yOffset = self.fontHeight - glyph.height - glyph.dy
+        runs = _buildGlyphRuns(glyph)
+        ink = bytearray()
+        i = 0
+        for y in range(glyph.height):
+            runCount = runs[i]
+            i += 1
+            for r in range(runCount):
+                if runs[i + 2]:
+                    ink.extend((y, runs[i], runs[i + 1] - runs[i], runs[i + 2]))
+                i += 3
+        inCell = (self._asciiColumns and yOffset >= 0 and yOffset + glyph.height <= self.textLineHeight)
+        placement = (glyph, glyph.dx, yOffset, glyph.width, glyph.height, bytes(ink), inCell)
+        self.asciiPlacements[index] = placement
+        return placement
+
+    def slot(self, codePoint): # returns the slot for this codepoint, or -1 if there is no glyph
+        slot = self._slots.get(codePoint)
+        if slot is None:
+            if profiler.enabled:
+                profiler.begin(stageGlyphLookup)
+            glyph = self.font.get_glyph(codePoint)
+            if profiler.enabled:
+                profiler.end(stageGlyphLookup)
+            if glyph is None:
+                slot = -1
+            else:
+                slot = len(self.advance)
+                self.advance.append(glyph.shift_x)
+                self.width.append(glyph.width)
+                self.height.append(glyph.height)
+                self.dx.append(glyph.dx)
+                self.dy.append(glyph.dy)
+                self.glyphTop = min(self.glyphTop, self.fontHeight - glyph.height - glyph.dy)
+                self.glyphBottom = max(self.glyphBottom, self.fontHeight - glyph.dy)
+            self._slots[codePoint] = slot
+        return slot
+
+    def lineHeight(self, lineSpacing):
+        return int(lineSpacing * self.fontHeight)
+
+
+_fontMetricsTable = {} # id(font) -> fontMetrics, the metrics keep a reference to the font
+
+def getFontMetrics(font):
+    # Returns the fontMetrics for this font, building the table on first use.
+    metrics = _fontMetricsTable.get(id(font))
+    if metrics is None or metrics.font is not font:
+        metrics = fontMetrics(font)
+        _fontMetricsTable[id(font)] = metrics
+    return metrics
+
+def clearFontMetrics():
+    _fontMetricsTable.clear()
+
+
+def isPrintableAscii(text): # True if text only holds the characters ' ' to '~' (no newline), False if empty
+    return text != '' and ' ' <= min(text) and max(text) <= '~'
+
+
 def lineSpacingY(font, lineSpacing, scale=1):
     # Note: Scale is not implemented at this time
-    fontHeight = font.get_glyph(ord('M')).height
-    returnValue = int(lineSpacing * fontHeight)
+    returnValue = int(lineSpacing * getFontMetrics(font).fontHeight)
     return returnValue
 
 def bounding_box(text, font, lineSpacing, scale=1):
@@ -64,51 +245,302 @@ def bounding_box(text, font, lineSpacing, scale=1):
     #   This function can used to determine character-wrapping or word-wrapping for a
     #   text terminal box, prior to actually printing the text in the bitmap.
     #
+    # The glyph metrics come from the fontMetrics table. Each glyph extends fontHeight-dy below the
+    # top of the 'M' glyph, which sets the height of the box.
+    #
     # Note: Scale is not implemented at this time
 
     #print('bounding_box text: {}'.format(text))
+    if profiler.enabled:
+        profiler.begin(stageBoundingBox)
+    metrics = getFontMetrics(font)
+    slots = metrics._slots
+    advance = metrics.advance
+    dy = metrics.dy
+    fontHeight = metrics.fontHeight
+
     boxHeight = boxWidth = 0
-    fontHeight = font.get_glyph(ord("M")).height
     thisLineWidth = 0
 
     for char in text:
         if char == '\n': # newline    
             boxWidth = max(boxWidth, thisLineWidth) # check to see if the last line is wider than any others.
             thisLineWidth = 0 # new line, so restart thislineWidth at 0
-            boxHeight = boxHeight + lineSpacingY(font, lineSpacing, scale) # add a lineSpacing to the boxHeight
+            boxHeight = boxHeight + metrics.lineHeight(lineSpacing) # add a lineSpacing to the boxHeight
 
         else: 
-            myGlyph = font.get_glyph(ord(char))
-            if myGlyph == None: # Error checking: no glyph found
-                print('Glyph not found: {}'.format(repr(char)))
+            codePoint = ord(char)
+            slot = slots.get(codePoint)
+            if slot is None:
+                slot = metrics.slot(codePoint)
+            if slot < 0: # Error checking: no glyph found
+                if tracelog.level >= levelError:
+                    log(levelError, 'Glyph not found: {}', repr(char))
             else:
-                width = myGlyph.width
-                height = myGlyph.height
-                dx = myGlyph.dx
-                dy = myGlyph.dy
-                shift_x = myGlyph.shift_x
-                shift_y = myGlyph.shift_x
-
-                # Not working yet***
-                # This offset is used to match the label.py function from Adafruit_Display_Text library
-                # y_offset = int(
-                #     (
-                #         self._font.get_glyph(ord("M")).height
-                #         - new_text.count("\n") * self.height * self.line_spacing
-                #     )
-                #     / 2 )
-
-                # yOffset = int( (fontHeight-height*lineSpacing)/2 )
-                yOffset = fontHeight - height
-
-                thisLineWidth = thisLineWidth + shift_x
-                boxHeight = max(boxHeight, height - dy + yOffset)
+                thisLineWidth = thisLineWidth + advance[slot]
+                boxHeight = max(boxHeight, fontHeight - dy[slot])
 
     boxWidth = max(boxWidth, thisLineWidth)
 
+    if profiler.enabled:
+        profiler.end(stageBoundingBox)
     return (boxWidth, boxHeight)
 
 
+# Word width cache
+# ================
+# The same words ("the ", "and ", list bullets, leftMatter) are measured over and over while wrapping a
+# document.  measureText returns the bounding_box of a text string through a small LRU cache keyed on
+# (id(font), text, lineSpacing).  Each entry keeps a reference to its font, like the fontMetrics table,
+# so a font that is freed cannot be replaced by another font with the same id.  The cache is bounded to maxSize entries, the least recently used entry is
+# dropped when it is full.  The hits and misses counters can be used to tune maxSize against the free
+# memory reported by gc.mem_free().
+#
+# Note: a cached measurement does not repeat the 'Glyph not found' message for missing glyphs.
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    OrderedDict = dict
+
+class textWidthCache:
+    def __init__(self, maxSize=64):
+        self.maxSize = maxSize
+        self._entries = OrderedDict() # oldest entry first
+        self.hits = 0
+        self.misses = 0
+
+    def measure(self, text, font, lineSpacing, scale=1):
+        key = (id(font), text, lineSpacing)
+        entries = self._entries
+        entry = entries.pop(key, None) # (font, box)
+        if entry is None or entry[0] is not font:
+            self.misses += 1
+            entry = (font, bounding_box(text, font, lineSpacing, scale))
+            if len(entries) >= self.maxSize > 0:
+                entries.pop(next(iter(entries))) # evict the least recently used
+        else:
+            self.hits += 1
+        if self.maxSize > 0:
+            entries[key] = entry # (re)insert as the most recently used
+        return entry[1]
+
+    def resize(self, maxSize):
+        self.maxSize = maxSize
+        while len(self._entries) > max(maxSize, 0):
+            self._entries.pop(next(iter(self._entries)))
+
+    def clear(self):
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self): # returns (entries, hits, misses)
+        return (len(self._entries), self.hits, self.misses)
+
+
+wordWidthCache = textWidthCache()
+
+def measureText(text, font, lineSpacing, scale=1):
+    # Same result as bounding_box, through the shared wordWidthCache.
+    return wordWidthCache.measure(text, font, lineSpacing, scale)
+
+
+# Dirty tracking
+# ==============
+# If a dirty tracker is set (see dirtyrect.renderSession), placeText reports the rectangle it wrote to
+# with tracker.markDirty(x0, y0, x1, y1).  The tracker clips the rectangle to the bitmap.
+
+dirtyTracker = None
+
+def setDirtyTracker(tracker):
+    global dirtyTracker
+    dirtyTracker = tracker
+
+
+# Glyph row runs
+# ==============
+# The blitter does not walk a glyph pixel by pixel.  Each glyph bitmap is converted once into row runs:
+# for every row a count followed by (start, end, value) triplets covering the full glyph width.  A run is
+# a stretch of pixels with the same glyph value, so a whole run can be clipped and written in one step.
+# The runs are packed into a bytearray to keep the RAM cost per glyph small.
+#
+# glyphRunCacheSize: the maximum number of glyphs whose runs are held in memory.
+
+glyphRunCacheSize = 128
+_glyphRunCache = {} # id(glyph) -> (glyph, runs), the glyph is kept to prevent reuse of the id
+
+def _buildGlyphRuns(glyph):
+    width = glyph.width
+    glyphBitmap = glyph.bitmap
+    glyph_offset_x = glyph.tile_index * width # for type BuiltinFont, this creates the x-offset in the glyph bitmap.
+                                              # for BDF loaded fonts, this should equal 0
+    runs = bytearray()
+    for y in range(glyph.height):
+        countIndex = len(runs)
+        runs.append(0)
+        rowStart = y * width + glyph_offset_x
+        runStart = 0
+        runValue = None
+        for x in range(width):
+            value = glyphBitmap[rowStart + x]
+            if value != runValue:
+                if runValue is not None:
+                    runs.extend((runStart, x, runValue))
+                    runs[countIndex] += 1
+                runStart = x
+                runValue = value
+        if runValue is not None:
+            runs.extend((runStart, width, runValue))
+            runs[countIndex] += 1
+    return runs
+
+def glyphRuns(glyph):
+    # Returns the packed row runs for this glyph, building them on first use.
+    entry = _glyphRunCache.get(id(glyph))
+    if entry is not None and entry[0] is glyph:
+        return entry[1]
+    runs = _buildGlyphRuns(glyph)
+    if len(_glyphRunCache) >= glyphRunCacheSize:
+        _glyphRunCache.pop(next(iter(_glyphRunCache))) # drop one entry to make room
+    _glyphRunCache[id(glyph)] = (glyph, runs)
+    return runs
+
+def dropGlyphRuns(glyph):
+    # Forgets the row runs of a glyph that its font has dropped (see fontregistry.lazyFont), so the
+    # cache does not keep the glyph alive.
+    entry = _glyphRunCache.get(id(glyph))
+    if entry is not None and entry[0] is glyph:
+        del _glyphRunCache[id(glyph)]
+
+def clearGlyphRunCache():
+    _glyphRunCache.clear()
+
+
+# Bulk writes
+# ===========
+# displayio.Bitmap only accepts single pixel reads and writes.  Framebuffers backed by a bytearray (or
+# anything else that accepts slice assignment of bytes) can take a whole run at once.  Reading a slice is
+# a separate capability: a bitmap may accept one and not the other.  Each bitmap type is probed once.
+
+_sliceCapableTypes = {}
+_sliceReadableTypes = {}
+sliceRunLength = 4 # shorter runs are cheaper to write pixel by pixel
+
+def supportsSliceWrite(bitmap):
+    bitmapType = type(bitmap)
+    capable = _sliceCapableTypes.get(bitmapType)
+    if capable is None:
+        try:
+            bitmap[0:1] = bytes((bitmap[0],)) # rewrite the first pixel with its own value
+            capable = True
+        except Exception:
+            capable = False
+        _sliceCapableTypes[bitmapType] = capable
+    return capable
+
+def supportsSliceRead(bitmap):
+    bitmapType = type(bitmap)
+    capable = _sliceReadableTypes.get(bitmapType)
+    if capable is None:
+        try:
+            capable = len(bitmap[0:1]) == 1
+        except Exception:
+            capable = False
+        _sliceReadableTypes[bitmapType] = capable
+    return capable
+
+
+def fillRect(bitmap, x0, y0, x1, y1, value):
+    # fillRect - Fills the rectangle from (x0, y0) up to, but not including, (x1, y1) with value.
+    #
+    # The rectangle is clipped once, then filled row by row.  If it covers the whole bitmap the bitmap's
+    # native fill is used.  Slice assignment is used for whole rows where the bitmap supports it.  A
+    # displayio.Bitmap only takes single pixel writes from Python, it is filled with
+    # bitmaptools.fill_region if it is available, otherwise pixel by pixel.
+    bitmapWidth = bitmap.width
+    x0 = max(x0, 0)
+    y0 = max(y0, 0)
+    x1 = min(x1, bitmapWidth)
+    y1 = min(y1, bitmap.height)
+    if x0 >= x1 or y0 >= y1: # nothing visible
+        return
+
+    if x0 == 0 and y0 == 0 and x1 == bitmapWidth and y1 == bitmap.height:
+        bitmap.fill(value)
+    elif supportsSliceWrite(bitmap):
+        if x0 == 0 and x1 == bitmapWidth: # full rows are contiguous, fill them in one step
+            bitmap[y0 * bitmapWidth : y1 * bitmapWidth] = bytes((value,)) * ((y1 - y0) * bitmapWidth)
+        else:
+            row = bytes((value,)) * (x1 - x0)
+            for rowBase in range(y0 * bitmapWidth, y1 * bitmapWidth, bitmapWidth):
+                bitmap[rowBase + x0 : rowBase + x1] = row
+    elif bitmaptools is not None and hasattr(bitmaptools, 'fill_region'):
+        bitmaptools.fill_region(bitmap, x0, y0, x1, y1, value)
+    else:
+        for rowBase in range(y0 * bitmapWidth, y1 * bitmapWidth, bitmapWidth):
+            for index in range(rowBase + x0, rowBase + x1):
+                bitmap[index] = value
+
+
+def blitGlyph(bitmap, glyph, xOrigin, yOrigin, paletteIndexes, printOnlyPixels=True, sliceWrite=False, fills=None):
+    # blitGlyph - Writes a single glyph into the bitmap with the glyph pixel (0,0) placed at (xOrigin, yOrigin).
+    #
+    # The glyph is clipped once against the bitmap, then each row is written run by run.
+    # paletteIndexes: (backgroundPaletteIndex, textPaletteIndex), maps the glyph pixel values to bitmap colors
+    # printOnlyPixels: only update the bitmap where the mapped color is > 0
+    # sliceWrite: set True if the bitmap accepts slice assignment (see supportsSliceWrite)
+    # fills: dict of color -> bytes used for slice writes, reused between calls to avoid allocations
+
+    bitmapWidth = bitmap.width
+    width = glyph.width
+
+    # clip the glyph to the bitmap
+    xMin = max(0, -xOrigin)
+    xMax = min(width, bitmapWidth - xOrigin)
+    yMin = max(0, -yOrigin)
+    yMax = min(glyph.height, bitmap.height - yOrigin)
+    if xMin >= xMax or yMin >= yMax: # nothing visible
+        return
+
+    runs = glyphRuns(glyph)
+
+    # skip over the rows above the visible region
+    i = 0
+    for y in range(yMin):
+        i += 1 + 3 * runs[i]
+
+    for y in range(yMin, yMax):
+        runCount = runs[i]
+        i += 1
+        rowBase = (yOrigin + y) * bitmapWidth + xOrigin
+        for r in range(runCount):
+            a = runs[i]
+            b = runs[i + 1]
+            color = paletteIndexes[runs[i + 2]]
+            i += 3
+            if printOnlyPixels and color <= 0:
+                continue
+            if a < xMin:
+                a = xMin
+            if b > xMax:
+                b = xMax
+            if a >= b:
+                continue
+            if sliceWrite and b - a >= sliceRunLength:
+                fill = fills.get(color)
+                if fill is None or len(fill) < b - a:
+                    fill = bytes((color,)) * max(b - a, width)
+                    fills[color] = fill
+                bitmap[rowBase + a : rowBase + b] = fill[: b - a]
+            else:
+                for index in range(rowBase + a, rowBase + b):
+                    bitmap[index] = color
+
+
 def placeText(
     bitmap, text, font, lineSpacing, xPosition, yPosition, 
     textPaletteIndex=1, 
@@ -124,100 +556,159 @@ def placeText(
     #   the current "label" function
     # Verify paletteIndex is working properly with * operator, especially if accommodating multicolored fonts
     #
+    # Each glyph is drawn with blitGlyph, which clips once and writes whole rows.  Text that is entirely
+    # above or below the bitmap (layout with a nullBitmap, lines outside the strip drawn when scrolling)
+    # is only measured.  Printable ASCII text in a fixed-advance font (see fontMetrics) is measured from
+    # its length, and its glyphs are placed from metrics.asciiPlacements: only their ink runs are written
+    # where that gives the same pixels, otherwise they are drawn with blitGlyph.
+    #
     # Note: Scale is not implemented at this time
-    import terminalio
 
-    fontHeight = font.get_glyph(ord("M")).height
+    if profiler.enabled:
+        profiler.begin(stagePlaceText)
+    metrics = getFontMetrics(font)
+    slots = metrics._slots
+    fontHeight = metrics.fontHeight
 
     bitmapWidth = bitmap.width
     bitmapHeight = bitmap.height
 
+    fixedAdvance = metrics.fixedAdvance
+    if fixedAdvance is not None and not isPrintableAscii(text):
+        fixedAdvance = None
+
+    if (yPosition < 0 or yPosition >= bitmapHeight) and backgroundPaletteIndex == 0 and '\n' not in text:
+        if fixedAdvance is not None: # the ASCII glyphs are already in the metrics
+            boxX = len(text) * fixedAdvance
+        else:
+            boxX = measureText(text, font, lineSpacing, scale)[0] # adds the glyphs of the text to the metrics
+        if yPosition + metrics.glyphBottom <= 0 or yPosition + metrics.glyphTop >= bitmapHeight: # nothing visible
+            if profiler.enabled:
+                profiler.end(stagePlaceText)
+            return (xPosition + boxX, yPosition)
+
     xStart=xPosition # starting x position (left margin)
 
 
     if backgroundPaletteIndex != 0: # the textbackground is different from the bitmap background
         # draw a bounding box where the text will go
 
-        (ignore, fontLineHeight)=bounding_box('M g', font, lineSpacing, scale) # check height with ascender and descender.
-        (boxX, boxY) = bounding_box(text, font, lineSpacing, scale)
-        boxY=max(fontLineHeight, boxY)
-
-        for y in range(boxY):
-            for x in range(boxX):
-                if (xPosition+x < bitmapWidth) and (yPosition+y < bitmapHeight): # check boundaries
-                    #bitmap[xPosition+x, yPosition+y]=backgroundPaletteIndex
-                    bitmap[(yPosition+y)*bitmapWidth + (xPosition + x)]=backgroundPaletteIndex
+        fontLineHeight = metrics.textLineHeight # height with ascender and descender, measured once per font
+        if fixedAdvance is not None and metrics.fixedDepth <= fontLineHeight: # no ASCII glyph reaches lower
+            (boxX, boxY) = (len(text) * fixedAdvance, fontLineHeight)
+        else:
+            (boxX, boxY) = measureText(text, font, lineSpacing, scale)
+            boxY=max(fontLineHeight, boxY)
 
-    for char in text:
+        fillRect(bitmap, xPosition, yPosition, xPosition+boxX, yPosition+boxY, backgroundPaletteIndex)
 
-        if char == '\n': # newline
-            xPosition=xStart # reset to left column
-            yPosition = yPosition + lineSpacingY(font, lineSpacing, scale) # Add a newline
+    paletteIndexes=(backgroundPaletteIndex, textPaletteIndex)
+    sliceWrite = supportsSliceWrite(bitmap)
+    fills = {}
 
+    tracker = dirtyTracker
+    if tracker is not None: # start the dirty rectangle with the background box
+        if backgroundPaletteIndex != 0:
+            dirty = [xPosition, yPosition, xPosition + boxX, yPosition + boxY]
         else:
-
-            myGlyph = font.get_glyph(ord(char))
-
-            if myGlyph == None: # Error checking: no glyph found
-                print('Glyph not found: {}'.format(repr(char)))
+            dirty = [bitmapWidth, bitmapHeight, 0, 0] # empty
+
+    if fixedAdvance is not None:
+        placements = metrics.asciiPlacements
+        inkOnly = printOnlyPixels and backgroundPaletteIndex == 0 # the background pixels are not drawn
+        for char in text:
+            index = ord(char) - 32
+            placement = placements[index]
+            if placement is None:
+                placement = metrics.asciiPlacement(index)
+            (myGlyph, dx, yOffset, width, height, ink, inCell) = placement
+            glyphX = xPosition + dx
+            glyphY = yPosition + yOffset
+            if ((inkOnly or (inCell and backgroundPaletteIndex != 0)) and glyphX >= 0 and glyphY >= 0 and
+                    glyphX + width <= bitmapWidth and glyphY + height <= bitmapHeight): # not clipped
+                glyphBase = glyphY * bitmapWidth + glyphX
+                for i in range(0, len(ink), 4):
+                    color = paletteIndexes[ink[i + 3]]
+                    if printOnlyPixels and color <= 0:
+                        continue
+                    start = glyphBase + ink[i] * bitmapWidth + ink[i + 1]
+                    length = ink[i + 2]
+                    if sliceWrite and length >= sliceRunLength:
+                        fill = fills.get(color)
+                        if fill is None or len(fill) < length:
+                            fill = bytes((color,)) * max(length, width)
+                            fills[color] = fill
+                        bitmap[start : start + length] = fill[:length]
+                    else:
+                        for pixel in range(start, start + length):
+                            bitmap[pixel] = color
             else:
+                blitGlyph(bitmap, myGlyph, glyphX, glyphY,
+                            paletteIndexes, printOnlyPixels, sliceWrite, fills)
+            if tracker is not None:
+                if glyphX < dirty[0]:
+                    dirty[0] = glyphX
+                if glyphY < dirty[1]:
+                    dirty[1] = glyphY
+                if glyphX + width > dirty[2]:
+                    dirty[2] = glyphX + width
+                if glyphY + height > dirty[3]:
+                    dirty[3] = glyphY + height
+            xPosition = xPosition + fixedAdvance
+    else:
+        for char in text:
+
+            if char == '\n': # newline
+                xPosition=xStart # reset to left column
+                yPosition = yPosition + metrics.lineHeight(lineSpacing) # Add a newline
 
-                width = myGlyph.width
-                height = myGlyph.height
-                # print('glyph width: {}, height: {}'.format(width, height))
-                dx = myGlyph.dx
-                dy = myGlyph.dy
-                shift_x = myGlyph.shift_x
-                shift_y = myGlyph.shift_x
-                glyph_offset_x = myGlyph.tile_index * width # for type BuiltinFont, this creates the x-offset in the glyph bitmap.
-                                                            # for BDF loaded fonts, this should equal 0
-
-                # Not working yet***
-                # This offset is used to match the label.py function from Adafruit_Display_Text library
-                # y_offset = int(
-                #     (
-                #         self._font.get_glyph(ord("M")).height
-                #         - new_text.count("\n") * self.height * self.line_spacing
-                #     )
-                #     / 2 )
-
-                # position_y = y - glyph.height - glyph.dy + y_offset
-
-                # yOffset = int( (fontHeight-height*lineSpacing)/2 )
-                yOffset = fontHeight - height
-                for y in range(height):
-                    for x in range(width):
-                        xPlacement = x + xPosition + dx
-                        # yPlacement=y+yPosition-height-dy+yOffset
-                        yPlacement = y + yPosition - dy + yOffset
-
-                        if (
-                            (xPlacement >= 0)
-                            and (yPlacement >= 0)
-                            and (xPlacement < bitmapWidth)
-                            and (yPlacement < bitmapHeight)
-                        ):
-
-                            paletteIndexes=(backgroundPaletteIndex, textPaletteIndex)
-                            # print('x: {}, y: {}, value: {}'.format(xPlacement, yPlacement, myGlyph.bitmap[x,y]))
-                            #bitmap[xPlacement, yPlacement] = (
-                            #    myGlyph.bitmap[x, y] * paletteIndex
-                            #)
-                            
-                            # Allows for different paletteIndex for background and text.
-                            #bitmap[xPlacement, yPlacement] = paletteIndexes[myGlyph.bitmap[x+glyph_offset_x,y]]
-
-                            thisPixelColor=paletteIndexes[myGlyph.bitmap[y*width + x+glyph_offset_x]]
-                            if not printOnlyPixels or thisPixelColor > 0: 
-                                # write all characters if printOnlyPixels = False, or if thisPixelColor is 1
-                                bitmap[yPlacement*bitmapWidth + xPlacement] = thisPixelColor
-                        elif (yPlacement > bitmapHeight):
-                            break
-
-                
-                xPosition = xPosition + shift_x
-
-
+            else:
+                codePoint = ord(char)
+                slot = slots.get(codePoint)
+                if slot is None:
+                    slot = metrics.slot(codePoint)
+
+                if slot < 0: # Error checking: no glyph found
+                    if tracelog.level >= levelError:
+                        log(levelError, 'Glyph not found: {}', repr(char))
+                else:
+                    if profiler.enabled:
+                        profiler.begin(stageGlyphLookup)
+                    myGlyph = font.get_glyph(codePoint) # the glyph bitmap, the font may load it on demand
+                    if profiler.enabled:
+                        profiler.end(stageGlyphLookup)
+                    # Not working yet***
+                    # This offset is used to match the label.py function from Adafruit_Display_Text library
+                    # y_offset = int(
+                    #     (
+                    #         self._font.get_glyph(ord("M")).height
+                    #         - new_text.count("\n") * self.height * self.line_spacing
+                    #     )
+                    #     / 2 )
+
+                    # yOffset = int( (fontHeight-height*lineSpacing)/2 )
+                    yOffset = fontHeight - myGlyph.height
+                    glyphX = xPosition + myGlyph.dx
+                    glyphY = yPosition - myGlyph.dy + yOffset
+                    blitGlyph(bitmap, myGlyph, glyphX, glyphY,
+                                paletteIndexes, printOnlyPixels, sliceWrite, fills)
+                    if tracker is not None:
+                        if glyphX < dirty[0]:
+                            dirty[0] = glyphX
+                        if glyphY < dirty[1]:
+                            dirty[1] = glyphY
+                        if glyphX + myGlyph.width > dirty[2]:
+                            dirty[2] = glyphX + myGlyph.width
+                        if glyphY + myGlyph.height > dirty[3]:
+                            dirty[3] = glyphY + myGlyph.height
+
+                    xPosition = xPosition + myGlyph.shift_x
+
+    if tracker is not None:
+        tracker.markDirty(dirty[0], dirty[1], min(dirty[2], bitmapWidth), min(dirty[3], bitmapHeight))
+
+    if profiler.enabled:
+        profiler.end(stagePlaceText)
     return (xPosition, yPosition)
 
 
@@ -238,7 +729,7 @@ class textBox:
             self._text = text  # text on the display
         self._font = font
         self._lineSpacing = lineSpacing
-        self._fontHeight = self._font.get_glyph(ord("M")).height
+        self._fontHeight = getFontMetrics(self._font).fontHeight
 
         self._width = width  # in pixels
         self._height = height  # in pixels
@@ -268,7 +759,7 @@ class textBox:
         import gc
 
         for char in newText:
-            (charWidth, charHeight) = bounding_box(char, self._font, self._lineSpacing)
+            (charWidth, charHeight) = measureText(char, self._font, self._lineSpacing)
             if (self._cursorX + charWidth >= self._width - 1) or (char == "\n"):
                 # make a newline
                 self.setCursor(
@@ -0,0 +1,92 @@
+# tracelog.py
+# Kevin Matocha - Copyright (C) 2020
+# Written for CircuitPython
+#
+# Leveled debug output for smackDown.
+#
+# The renderer used to print a debug line for every chunk, wrapped character and text line.  On a serial
+# console that costs more than drawing the text.  Messages now have a level and are only written when
+# the level is enabled.
+#
+# In the render loop, check the level before calling log, so a disabled message costs one comparison:
+#
+#     if tracelog.level >= levelTrace:
+#         log(levelTrace, 'chunk: \'{}\'', chunk)
+#
+# The message is only formatted when it is written, never when it is disabled.
+#
+# Messages go to the serial console (print), or to a ring buffer that keeps the most recent messages in
+# memory.  The ring buffer stores the format string and its arguments, and formats them when read.
+
+levelOff = 0
+levelError = 1 # something is wrong, such as a missing glyph
+levelInfo = 2 # progress messages, such as building the page index
+levelDebug = 3 # one message for each text line
+levelTrace = 4 # messages for each chunk and each wrapped character
+
+level = levelInfo # messages with a level above this are not written
+
+_ring = None # list of (message, args), None when writing to the serial console
+_ringIndex = 0 # next slot to write
+_ringCount = 0 # messages written to the ring since it was cleared
+
+
+def setLevel(newLevel):
+    global level
+    level = newLevel
+
+
+def useRingBuffer(size): # keep the last "size" messages in memory instead of printing them
+    global _ring
+    _ring = [None] * size
+    clearRing()
+
+
+def useSerial(): # print messages to the serial console
+    global _ring
+    _ring = None
+
+
+def clearRing():
+    global _ringIndex, _ringCount
+    if _ring is not None:
+        for i in range(len(_ring)):
+            _ring[i] = None
+    _ringIndex = 0
+    _ringCount = 0
+
+
+def log(messageLevel, message, *args):
+    # message: a format string, formatted with args only when the message is written
+    global _ringIndex, _ringCount
+    if messageLevel > level:
+        return
+    if _ring is None:
+        if args:
+            message = message.format(*args)
+        print(message)
+    else:
+        _ring[_ringIndex] = (message, args)
+        _ringIndex += 1
+        if _ringIndex == len(_ring):
+            _ringIndex = 0
+        _ringCount += 1
+
+
+def ringMessages(): # the messages in the ring buffer, oldest first
+    if _ring is None:
+        return []
+    messages = []
+    size = len(_ring)
+    start = _ringIndex if _ringCount >= size else 0
+    for i in range(min(_ringCount, size)):
+        (message, args) = _ring[(start + i) % size]
+        messages.append(message.format(*args) if args else message)
+    return messages
+
+
+def dumpRing(): # prints the ring buffer contents to the serial console
+    if _ringCount > len(_ring or ()):
+        print('({} older messages dropped)'.format(_ringCount - len(_ring)))
+    for message in ringMessages():
+        print(message)